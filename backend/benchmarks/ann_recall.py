@@ -0,0 +1,178 @@
+"""
+ANN indeks tiplerinin (HNSW / IVF-PQ) kesin (flat) indekse göre recall ve gecikmesini ölçer.
+Varsayılan olarak DOCSAGE_DATA_DIR altındaki kayıtlı doküman vektörleri kullanılır.
+
+Kullanım (backend/ dizininden):
+    python -m benchmarks.ann_recall --k 10 --ef-search 16,32,64,128 --nprobe 1,4,16,64
+    python -m benchmarks.ann_recall --synthetic 200000 --dim 384 --output ann.json
+
+Sorgular: kayıtlı vektörlerden örneklenip hafif gürültü eklenmiş (normalize) vektörler.
+Ayrıca her ANN tipi için EXACT_SEARCH_MAX'tan büyük bir doküman seçimiyle filtreli arama
+yapılır; seçilmeyen dokümandan sonuç dönerse çıkış kodu 1 olur.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from services.document_store import DATA_DIR, VECTORS_FILE
+from services.vector_index import (
+    EXACT_SEARCH_MAX,
+    HNSW_EF_SEARCH,
+    IVF_NPROBE,
+    IVFPQ_MAX_TRAIN,
+    GlobalVectorIndex,
+    build_faiss_index,
+    search_parameters
+)
+
+
+def load_vectors(root: str) -> np.ndarray:
+    """
+    Diskte kayıtlı tüm dokümanların vektörlerini tek matriste birleştirir.
+    """
+    matrices = []
+    for doc_id in sorted(os.listdir(root)):
+        path = os.path.join(root, doc_id, VECTORS_FILE)
+        if not doc_id.startswith(".") and os.path.isfile(path):
+            matrices.append(np.load(path))
+    if not matrices:
+        raise SystemExit(f"{root} altında vektör bulunamadı; --synthetic ile deneyin.")
+    return np.concatenate(matrices).astype(np.float32)
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, rng) -> np.ndarray:
+    picks = rng.choice(len(vectors), min(count, len(vectors)), replace=False)
+    noisy = vectors[picks] + rng.normal(scale=noise, size=(len(picks), vectors.shape[1])).astype(np.float32)
+    return normalize(noisy).astype(np.float32)
+
+
+def timed_search(index, queries: np.ndarray, k: int, params) -> Dict:
+    """
+    Sorguları tek tek arar (çevrimiçi kullanım gibi); sonuç ID'lerini ve gecikme dağılımını döndürür.
+    """
+    ids, latencies = [], []
+    for q in queries:
+        start = time.perf_counter()
+        _, row = index.search(q[None, :], k, params=params)
+        latencies.append(time.perf_counter() - start)
+        ids.append(row[0])
+    latencies = np.array(latencies) * 1000
+    return {
+        "ids": np.array(ids),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "mean_ms": round(float(latencies.mean()), 4),
+    }
+
+
+def recall_at_k(truth: np.ndarray, found: np.ndarray) -> float:
+    hits = sum(len(set(t) & set(f[f >= 0])) for t, f in zip(truth, found))
+    return round(hits / truth.size, 4)
+
+
+def build(kind: str, vectors: np.ndarray, rng) -> Dict:
+    start = time.perf_counter()
+    train = None
+    if kind == "ivfpq":
+        sample = rng.choice(len(vectors), min(len(vectors), IVFPQ_MAX_TRAIN), replace=False)
+        train = vectors[np.sort(sample)]
+    index = build_faiss_index(kind, vectors.shape[1], train, len(vectors))
+    index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+    return {"index": index, "build_s": round(time.perf_counter() - start, 3)}
+
+
+def filtered_leaks(kind: str, dim: int, queries: int, k: int, rng) -> int:
+    """
+    Seçilen doküman EXACT_SEARCH_MAX'tan fazla vektör tuttuğunda arama kesin yola değil
+    ANN indeksine ID-selector ile gider; seçilmeyen dokümandan dönen sonuç sayısını döndürür.
+    """
+    index = GlobalVectorIndex(index_type=kind)
+    selected = normalize(rng.normal(size=(EXACT_SEARCH_MAX + 1000, dim)).astype(np.float32))
+    other = normalize(rng.normal(size=(1000, dim)).astype(np.float32))
+    index.add_document("selected", selected)
+    index.add_document("other", other)
+    # Sorgular seçilmeyen dokümana yakın: filtre çalışmazsa ilk sonuçlar oradan gelir
+    hits = index.search(make_queries(other, queries, 0.05, rng), k=k, doc_ids=["selected"])
+    return sum(h["doc_id"] != "selected" for row in hits for h in row)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ANN indeks recall / gecikme raporu")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--synthetic", type=int, default=0, help="Kayıtlı veri yerine bu sayıda rastgele vektör")
+    parser.add_argument("--dim", type=int, default=384, help="--synthetic için vektör boyutu")
+    parser.add_argument("--types", default="hnsw,ivfpq")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", default=f"16,32,{HNSW_EF_SEARCH},128,256")
+    parser.add_argument("--nprobe", default=f"1,4,{IVF_NPROBE},64")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    if args.synthetic:
+        vectors = normalize(rng.normal(size=(args.synthetic, args.dim)).astype(np.float32))
+    else:
+        vectors = load_vectors(args.data_dir)
+    queries = make_queries(vectors, args.queries, args.noise, rng)
+    k = min(args.k, len(vectors))
+
+    exact = build("flat", vectors, rng)
+    truth = timed_search(exact["index"], queries, k, None)
+    report: List[Dict] = [{
+        "type": "flat", "params": {}, "recall_at_k": 1.0, "build_s": exact["build_s"],
+        **{key: truth[key] for key in ("p50_ms", "p99_ms", "mean_ms")},
+    }]
+
+    sweeps = {
+        "hnsw": [{"ef_search": int(v)} for v in args.ef_search.split(",") if v],
+        "ivfpq": [{"nprobe": int(v)} for v in args.nprobe.split(",") if v],
+    }
+    for kind in [t.strip() for t in args.types.split(",") if t.strip()]:
+        built = build(kind, vectors, rng)
+        for params in sweeps[kind]:
+            run = timed_search(built["index"], queries, k, search_parameters(kind, **params))
+            report.append({
+                "type": kind,
+                "params": params,
+                "recall_at_k": recall_at_k(truth["ids"], run["ids"]),
+                "build_s": built["build_s"],
+                **{key: run[key] for key in ("p50_ms", "p99_ms", "mean_ms")},
+            })
+        del built
+        leaks = filtered_leaks(kind, vectors.shape[1], min(args.queries, 50), k, rng)
+        report.append({"type": kind, "check": "filtered_search", "leaked_hits": leaks})
+
+    failed = [row for row in report if row.get("leaked_hits")]
+    for row in report:
+        if "check" in row:
+            print(f"{row['type']:>6} filtreli arama: seçilmeyen dokümandan {row['leaked_hits']} sonuç", file=sys.stderr)
+            continue
+        print(
+            f"{row['type']:>6} {json.dumps(row['params']):>20}  recall@{k} {row['recall_at_k']:.4f}  "
+            f"p50 {row['p50_ms']:.3f} ms  p99 {row['p99_ms']:.3f} ms",
+            file=sys.stderr
+        )
+
+    result = {"vectors": len(vectors), "dim": int(vectors.shape[1]), "queries": len(queries), "k": k, "results": report}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Embedding saklama modlarının (float32 / float16 / sq8) 1000 chunk başına bellek kullanımını
+ve float32 kesin aramaya göre recall kaybını raporlar.
+Varsayılan olarak DOCSAGE_DATA_DIR altındaki kayıtlı dokümanlar kullanılır.
+flat indeks ayrı kod tutmaz (arama doküman vektörleri üzerinde yapılır), bu yüzden sq8'in
+8-bit kodları yalnızca --index-type hnsw ile ölçülür; flat'te sq8 float16 ile aynı sonucu verir.
+
+Kullanım (backend/ dizininden):
+    python -m benchmarks.compact_storage --k 10
+    python -m benchmarks.compact_storage --synthetic 50000 --dim 384 --index-type hnsw --output storage.json
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.ann_recall import load_vectors, make_queries, normalize, recall_at_k
+from services.compact_storage import STORAGE_MODES, ChunkTexts, compact_vectors, texts_nbytes
+from services.document_store import DATA_DIR, OFFSETS_FILE, TEXTS_FILE
+from services.vector_index import GlobalVectorIndex
+
+
+def load_texts(root: str) -> List[str]:
+    texts = []
+    for doc_id in sorted(os.listdir(root)):
+        doc_dir = os.path.join(root, doc_id)
+        if doc_id.startswith(".") or not os.path.isfile(os.path.join(doc_dir, TEXTS_FILE)):
+            continue
+        offsets = np.load(os.path.join(doc_dir, OFFSETS_FILE))
+        with open(os.path.join(doc_dir, TEXTS_FILE), "rb") as f:
+            texts.extend(ChunkTexts(f.read(), offsets))
+    return texts
+
+
+def synthetic_texts(count: int, rng, chars: int = 480) -> List[str]:
+    words = ["belge", "sözleşme", "madde", "garanti", "süre", "document", "warranty", "period", "device", "service"]
+    texts = []
+    for _ in range(count):
+        text = " ".join(rng.choice(words, chars // 7))
+        texts.append(text[:chars])
+    return texts
+
+
+def measure(mode: str, vectors: np.ndarray, texts: List[str], queries: np.ndarray,
+            truth: np.ndarray, k: int, index_type: str) -> Dict:
+    """
+    Tek bir saklama modu için bellek (1000 chunk başına) ve recall@k ölçer.
+    Recall hem indeks aramasının kendisi hem de adayların doküman vektörleriyle
+    yeniden skorlanması (retrieval'daki gibi) için raporlanır.
+    """
+    stored = compact_vectors(vectors, mode)
+    index = GlobalVectorIndex(index_type=index_type, storage=mode)
+    index.add_document("bench", stored)
+    stats = index.stats()
+    hits = index.search(queries, k=k)
+    found = np.array([[h["chunk_id"] for h in row] + [-1] * (k - len(row)) for row in hits])
+
+    # Adaylar (indeksin döndürdüğü ilk k) saklanan vektörlerle yeniden skorlanınca skor hatası
+    exact_scores = np.take_along_axis(queries @ vectors.T, np.maximum(found, 0), axis=1)
+    stored_scores = np.take_along_axis(queries @ np.asarray(stored, dtype=np.float32).T, np.maximum(found, 0), axis=1)
+
+    packed = ChunkTexts.from_texts(texts) if mode != "float32" else texts
+    per_1k = 1000 / len(vectors)
+    text_bytes = texts_nbytes(packed)
+    return {
+        "storage": mode,
+        "index_type": stats["type"],
+        "index_codes": stats["index_codes"],
+        # Toplam: doküman vektörleri + indeksin ayrı kodları (flat'te 0) + metinler
+        "total_bytes_per_1k": int((stats["total_bytes"] + text_bytes) * per_1k),
+        "index_code_bytes_per_1k": int(stats["index_code_bytes"] * per_1k),
+        "doc_vector_bytes_per_1k": int(stats["vector_bytes"] * per_1k),
+        "text_bytes_per_1k": int(text_bytes * per_1k),
+        "recall_at_k": recall_at_k(truth, found),
+        "max_rescore_error": round(float(np.abs(exact_scores - stored_scores).max()), 6),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Kompakt embedding saklama bellek / recall raporu")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--synthetic", type=int, default=0, help="Kayıtlı veri yerine bu sayıda rastgele chunk")
+    parser.add_argument("--dim", type=int, default=384, help="--synthetic için vektör boyutu")
+    parser.add_argument("--modes", default=",".join(STORAGE_MODES))
+    parser.add_argument("--index-type", default="flat", help="flat, hnsw, ivfpq veya auto")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    if args.synthetic:
+        vectors = normalize(rng.normal(size=(args.synthetic, args.dim)).astype(np.float32))
+        texts = synthetic_texts(args.synthetic, rng)
+    else:
+        vectors = load_vectors(args.data_dir)
+        texts = load_texts(args.data_dir)
+    queries = make_queries(vectors, args.queries, args.noise, rng)
+    k = min(args.k, len(vectors))
+
+    # Referans: float32 vektörlerle kesin arama
+    scores = queries @ vectors.T
+    truth = np.argsort(-scores, axis=1)[:, :k]
+
+    report = [
+        measure(mode.strip(), vectors, texts, queries, truth, k, args.index_type)
+        for mode in args.modes.split(",") if mode.strip()
+    ]
+    for row in report:
+        print(
+            f"{row['storage']:>8} ({row['index_type']}, kodlar: {row['index_codes'] or 'yok'})  "
+            f"{row['total_bytes_per_1k'] / 2**20:.2f} MB / 1k chunk  "
+            f"recall@{k} {row['recall_at_k']:.4f}  max skor hatası {row['max_rescore_error']:.6f}",
+            file=sys.stderr
+        )
+
+    result = {"chunks": len(vectors), "dim": int(vectors.shape[1]), "queries": len(queries), "k": k, "results": report}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Cevap modelinin farklı çıkarım hassasiyetlerini (fp32 / bf16 / int8 / prequantized)
+doğruluk ve gecikme açısından fp32 referansına göre karşılaştırır.
+
+Kullanım (backend/ dizininden):
+    python -m benchmarks.compare_precision --precisions fp32,bf16,int8 --output precision.json
+    python -m benchmarks.compare_precision --cases cases.json --min-agreement 0.9
+
+cases.json: [{"question": "...", "contexts": ["...", "..."]}, ...]
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+from typing import Dict, List
+
+import torch
+
+from services.llm_loader import load_llm, model_size_bytes, self_check
+from services.prompts import build_messages
+
+DEFAULT_CASES = [
+    {
+        "question": "What is the capital of France?",
+        "contexts": ["France is a country in Western Europe. Its capital and largest city is Paris."],
+    },
+    {
+        "question": "How long is the warranty period?",
+        "contexts": [
+            "All devices come with a limited warranty. The warranty period is 24 months from the date of purchase.",
+            "Batteries are consumables and are covered for 6 months only.",
+        ],
+    },
+    {
+        "question": "Which protocol does the service use for streaming?",
+        "contexts": [
+            "The API exposes a REST interface for uploads.",
+            "Answers are streamed to the client using Server-Sent Events over a single HTTP connection.",
+        ],
+    },
+]
+
+
+def run_cases(tokenizer, model, cases: List[Dict], max_new_tokens: int) -> List[Dict]:
+    """
+    Her vaka için greedy üretim yapar; üretilen token'ları, ilk adım logitlerini ve süreleri döndürür.
+    """
+    results = []
+    for case in cases:
+        prompt = tokenizer.apply_chat_template(
+            build_messages(case["question"], case["contexts"]),
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+
+        with torch.no_grad():
+            start = time.perf_counter()
+            first_logits = model(**inputs).logits[0, -1].float()
+            prefill_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id
+            )
+            total_s = time.perf_counter() - start
+
+        tokens = outputs[0][inputs.input_ids.shape[1]:].tolist()
+        results.append({
+            "tokens": tokens,
+            "text": tokenizer.decode(tokens, skip_special_tokens=True).strip(),
+            "first_logits": first_logits,
+            "prefill_s": prefill_s,
+            "total_s": total_s,
+        })
+    return results
+
+
+def agreement(reference: List[int], candidate: List[int]) -> float:
+    """
+    Referansla ortak önek uzunluğunun daha uzun diziye oranı (1.0 = birebir aynı).
+    """
+    longest = max(len(reference), len(candidate))
+    if longest == 0:
+        return 1.0
+    prefix = 0
+    for a, b in zip(reference, candidate):
+        if a != b:
+            break
+        prefix += 1
+    return prefix / longest
+
+
+def summarize(precision: str, model, runs: List[Dict], reference: List[Dict]) -> Dict:
+    n_tokens = sum(len(r["tokens"]) for r in runs)
+    total_s = sum(r["total_s"] for r in runs)
+    agreements = [agreement(ref["tokens"], r["tokens"]) for ref, r in zip(reference, runs)]
+    logit_diffs = [
+        float((ref["first_logits"] - r["first_logits"]).abs().max())
+        for ref, r in zip(reference, runs)
+    ]
+    top1_same = [
+        int(ref["first_logits"].argmax() == r["first_logits"].argmax())
+        for ref, r in zip(reference, runs)
+    ]
+    return {
+        "precision": precision,
+        "model_mb": round(model_size_bytes(model) / 2**20, 1),
+        "mean_prefill_ms": round(1000 * sum(r["prefill_s"] for r in runs) / len(runs), 1),
+        "tokens_per_s": round(n_tokens / total_s, 2) if total_s else 0.0,
+        "exact_match": sum(a == 1.0 for a in agreements) / len(agreements),
+        "mean_token_agreement": round(sum(agreements) / len(agreements), 4),
+        "first_token_top1_match": sum(top1_same) / len(top1_same),
+        "max_first_logit_diff": round(max(logit_diffs), 4),
+        "answers": [r["text"] for r in runs],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="LLM hassasiyet karşılaştırması (doğruluk / gecikme)")
+    parser.add_argument("--precisions", default="fp32,bf16,int8",
+                        help="Virgülle ayrılmış liste; fp32 referans olarak her zaman önce çalışır")
+    parser.add_argument("--cases", help="Soru/bağlam vakalarını içeren JSON dosyası")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--min-agreement", type=float, default=0.0,
+                        help="Ortalama token uyumu bu değerin altındaysa çıkış kodu 1 olur")
+    parser.add_argument("--output", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args(argv)
+
+    cases = DEFAULT_CASES
+    if args.cases:
+        with open(args.cases, encoding="utf-8") as f:
+            cases = json.load(f)
+
+    precisions = [p.strip() for p in args.precisions.split(",") if p.strip()]
+    precisions = ["fp32"] + [p for p in precisions if p != "fp32"]
+
+    reference = None
+    report = []
+    for precision in precisions:
+        tokenizer, model = load_llm(precision)
+        check = self_check(tokenizer, model)
+        runs = run_cases(tokenizer, model, cases, args.max_new_tokens)
+        if reference is None:
+            reference = runs
+
+        summary = summarize(precision, model, runs, reference)
+        summary["self_check_s"] = check["latency_s"]
+        report.append(summary)
+        print(
+            f"{precision:>12}  {summary['model_mb']:>8} MB  {summary['tokens_per_s']:>7} tok/s  "
+            f"prefill {summary['mean_prefill_ms']:>7} ms  agreement {summary['mean_token_agreement']:.3f}",
+            file=sys.stderr
+        )
+
+        # Bir sonraki hassasiyete geçmeden belleği serbest bırak
+        del tokenizer, model
+        gc.collect()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    failing = [r["precision"] for r in report if r["mean_token_agreement"] < args.min_agreement]
+    if failing:
+        print(f"Tolerans aşıldı: {', '.join(failing)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
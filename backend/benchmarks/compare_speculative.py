@@ -0,0 +1,109 @@
+"""
+Spekülatif (taslak modelle assisted) üretimi normal greedy üretimle karşılaştırır:
+çıktıların birebir aynı olduğunu doğrular, token/saniye ve taslak kabul oranını raporlar.
+
+Kullanım (backend/ dizininden):
+    python -m benchmarks.compare_speculative --draft-model Qwen/Qwen2.5-0.5B-Instruct --output speculative.json
+    python -m benchmarks.compare_speculative --cases cases.json --max-new-tokens 256
+
+cases.json: [{"question": "...", "contexts": ["...", "..."]}, ...]
+"""
+import argparse
+import json
+import sys
+from typing import Dict, List
+
+import torch
+
+from benchmarks.compare_precision import DEFAULT_CASES
+from services.llm_loader import LLM_PRECISION, load_llm
+from services.prompts import build_messages
+from services.speculative import DRAFT_MODEL_NAME, DecodeStats, count_forwards
+
+
+def run_cases(tokenizer, model, cases: List[Dict], max_new_tokens: int, stats: DecodeStats,
+              mode: str, assistant_model=None) -> List[List[int]]:
+    """
+    Her vaka için greedy üretim yapar ve üretilen token'ları döndürür.
+    """
+    outputs = []
+    for case in cases:
+        prompt = tokenizer.apply_chat_template(
+            build_messages(case["question"], case["contexts"]),
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+        extra = {"assistant_model": assistant_model} if assistant_model is not None else {}
+
+        with torch.no_grad(), stats.track(mode) as tracked:
+            sequences = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id,
+                **extra
+            )
+            tokens = sequences[0][inputs.input_ids.shape[1]:].tolist()
+            tracked["new_tokens"] = len(tokens)
+        outputs.append(tokens)
+    return outputs
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Spekülatif üretim karşılaştırması (greedy eşdeğerlik / hız)")
+    parser.add_argument("--precision", default=LLM_PRECISION)
+    parser.add_argument("--draft-model", default=DRAFT_MODEL_NAME)
+    parser.add_argument("--cases", help="Soru/bağlam vakalarını içeren JSON dosyası")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--output", help="Sonuçların yazılacağı JSON dosyası")
+    args = parser.parse_args(argv)
+
+    cases = DEFAULT_CASES
+    if args.cases:
+        with open(args.cases, encoding="utf-8") as f:
+            cases = json.load(f)
+
+    tokenizer, model = load_llm(args.precision)
+    _, draft = load_llm("fp32" if args.precision == "prequantized" else args.precision, args.draft_model, checkpoint=None)
+    count_forwards(model)
+    count_forwards(draft, draft=True)
+
+    stats = DecodeStats()
+    # Isınma: ilk çağrıların tek seferlik maliyeti ölçüme girmesin
+    run_cases(tokenizer, model, cases[:1], 4, DecodeStats(), "warmup", draft)
+
+    greedy = run_cases(tokenizer, model, cases, args.max_new_tokens, stats, "greedy")
+    speculative = run_cases(tokenizer, model, cases, args.max_new_tokens, stats, "speculative", draft)
+
+    identical = [a == b for a, b in zip(greedy, speculative)]
+    report = stats.stats()
+    # Sunucu ayarı (DOCSAGE_SPECULATIVE) bu karşılaştırmayı etkilemez
+    report.pop("enabled")
+    report.update({
+        "draft_model": args.draft_model,
+        "precision": args.precision,
+        "identical_outputs": sum(identical) / len(identical),
+    })
+    modes = report["modes"]
+    if modes.get("greedy", {}).get("tokens_per_s"):
+        report["speedup"] = round(modes["speculative"]["tokens_per_s"] / modes["greedy"]["tokens_per_s"], 3)
+
+    print(
+        f"greedy {modes['greedy']['tokens_per_s']} tok/s  speculative {modes['speculative']['tokens_per_s']} tok/s  "
+        f"acceptance {modes['speculative'].get('acceptance_rate')}  identical {report['identical_outputs']:.2f}",
+        file=sys.stderr
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    # Greedy üretimde çıktılar birebir aynı olmalı
+    return 0 if all(identical) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
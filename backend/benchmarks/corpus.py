@@ -0,0 +1,132 @@
+"""
+Benchmark'lar için tekrarlanabilir (seed'li) sentetik PDF / DOCX dokümanları.
+Her doküman, soru-cevap ölçümünde aranacak benzersiz bir "gerçek" (fact) cümlesi içerir.
+"""
+from io import BytesIO
+from typing import List, NamedTuple
+
+import numpy as np
+import docx
+from docx.enum.text import WD_BREAK
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
+WORDS = (
+    "device warranty battery service contract period customer support repair replacement "
+    "policy document section clause payment invoice delivery shipping return refund account "
+    "network server storage backup security access license update release version module "
+    "report quarter revenue budget project schedule milestone risk review approval team"
+).split()
+CONNECTORS = ("is", "covers", "requires", "includes", "describes", "affects", "supports", "limits")
+
+LINE_CHARS = 90
+LINES_PER_PAGE = 45
+
+
+class SyntheticDocument(NamedTuple):
+    filename: str
+    ext: str
+    content: bytes
+    pages: int
+    # Dokümana özgü soru ve cevabı içeren cümle
+    question: str
+    fact: str
+
+
+def _sentence(rng: np.random.Generator) -> str:
+    words = list(rng.choice(WORDS, rng.integers(6, 18)))
+    words.insert(int(rng.integers(1, len(words))), str(rng.choice(CONNECTORS)))
+    return " ".join(words).capitalize() + "."
+
+
+def synthetic_pages(num_pages: int, rng: np.random.Generator, fact: str) -> List[str]:
+    """
+    Sayfa başına ~LINES_PER_PAGE satır, paragraflar halinde metin üretir; fact rastgele bir sayfaya yerleşir.
+    """
+    pages = []
+    fact_page = int(rng.integers(0, num_pages))
+    for number in range(num_pages):
+        paragraphs, length = [], 0
+        while length < LINE_CHARS * LINES_PER_PAGE * 0.8:
+            paragraph = " ".join(_sentence(rng) for _ in range(int(rng.integers(2, 6))))
+            paragraphs.append(paragraph)
+            length += len(paragraph)
+        if number == fact_page:
+            paragraphs.insert(int(rng.integers(0, len(paragraphs) + 1)), fact)
+        pages.append("\n\n".join(paragraphs))
+    return pages
+
+
+def _wrap(text: str) -> List[str]:
+    lines = []
+    for paragraph in text.split("\n\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > LINE_CHARS:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.extend([line, ""])
+    return lines
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for text in pages:
+        page = writer.add_blank_page(612, 792)
+        commands = ["BT /F1 9 Tf 36 760 Td 11 TL"]
+        commands.extend(f"({_pdf_escape(line)}) Tj T*" for line in _wrap(text))
+        commands.append("ET")
+        stream = DecodedStreamObject()
+        stream.set_data("\n".join(commands).encode("latin-1", "replace"))
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def make_docx(pages: List[str]) -> bytes:
+    document = docx.Document()
+    for i, text in enumerate(pages):
+        paragraphs = text.split("\n\n")
+        for j, paragraph in enumerate(paragraphs):
+            para = document.add_paragraph(paragraph)
+            if j == len(paragraphs) - 1 and i < len(pages) - 1:
+                # iter_docx_pages sayfa numarasını açık sayfa sonlarından belirler
+                para.add_run().add_break(WD_BREAK.PAGE)
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_corpus(num_docs: int, pages_per_doc: int, formats: List[str], seed: int = 0) -> List[SyntheticDocument]:
+    """
+    Formatlar sırayla dönüşümlü kullanılarak num_docs adet doküman üretir.
+    """
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for i in range(num_docs):
+        ext = formats[i % len(formats)]
+        code = f"DX{i:04d}"
+        months = int(rng.integers(6, 61))
+        fact = f"The {code} unit has a warranty period of {months} months."
+        pages = synthetic_pages(pages_per_doc, rng, fact)
+        content = make_pdf(pages) if ext == "pdf" else make_docx(pages)
+        corpus.append(SyntheticDocument(
+            f"synthetic_{i:04d}.{ext}", ext, content, pages_per_doc,
+            f"What is the warranty period of the {code} unit?", fact
+        ))
+    return corpus
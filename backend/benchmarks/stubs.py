@@ -0,0 +1,118 @@
+"""
+Benchmark'ların model indirmeden ve CI sınıfı bir CPU'da çalışabilmesi için küçük stub backend'ler.
+Gerçek modellerin hızını değil, DocSage'in kendi işlem hattının (ayıklama, parçalama,
+indeksleme, retrieval) maliyetini ölçmek içindir.
+"""
+import re
+import zlib
+from typing import Dict, List, Union
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_WORD_RE = re.compile(r"\w+")
+
+
+class _Encoding(dict):
+    # HF BatchEncoding gibi hem enc["input_ids"] hem enc.input_ids ile erişilebilir
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class StubTokenizer:
+    """
+    Kelime / noktalama düzeyinde çalışan, HF tokenizer arayüzünün DocSage'in kullandığı
+    kısmını (çağrı, offset_mapping, decode, chat şablonu) sağlayan tokenizer.
+    """
+    SPECIAL_TOKENS = ("<|endoftext|>", "<|im_end|>", "<|im_start|>")
+
+    def __init__(self):
+        self._vocab: Dict[str, int] = {t: i for i, t in enumerate(self.SPECIAL_TOKENS)}
+        self._tokens: List[str] = list(self.SPECIAL_TOKENS)
+        self.eos_token_id = 0
+        self.pad_token_id = 0
+        self.padding_side = "left"
+
+    def convert_tokens_to_ids(self, token: str) -> int:
+        token_id = self._vocab.get(token)
+        if token_id is None:
+            token_id = self._vocab.setdefault(token, len(self._tokens))
+            if token_id == len(self._tokens):
+                self._tokens.append(token)
+        return token_id
+
+    def _encode(self, text: str, offsets: bool):
+        matches = list(_TOKEN_RE.finditer(text))
+        ids = [self.convert_tokens_to_ids(m.group()) for m in matches]
+        return ids, [m.span() for m in matches] if offsets else None
+
+    def __call__(self, text: Union[str, List[str]], add_special_tokens: bool = False,
+                 return_offsets_mapping: bool = False, **kwargs) -> _Encoding:
+        texts = [text] if isinstance(text, str) else list(text)
+        encoded = [self._encode(t, return_offsets_mapping) for t in texts]
+        result = _Encoding(input_ids=[ids for ids, _ in encoded])
+        if return_offsets_mapping:
+            result["offset_mapping"] = [offsets for _, offsets in encoded]
+        if isinstance(text, str):
+            result = _Encoding({key: value[0] for key, value in result.items()})
+        return result
+
+    def decode(self, ids, skip_special_tokens: bool = False) -> str:
+        tokens = [self._tokens[i] for i in ids]
+        if skip_special_tokens:
+            tokens = [t for t in tokens if t not in self.SPECIAL_TOKENS]
+        return " ".join(tokens)
+
+    def get_vocab(self) -> Dict[str, int]:
+        return dict(self._vocab)
+
+    def apply_chat_template(self, messages, tokenize: bool = False, add_generation_prompt: bool = True):
+        # Qwen'in ChatML şablonuyla aynı yapı
+        text = "".join(f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in messages)
+        if add_generation_prompt:
+            text += "<|im_start|>assistant\n"
+        return self(text)["input_ids"] if tokenize else text
+
+
+class HashingEmbedder:
+    """
+    Kelime ve kelime ikililerini (bigram) sabit boyutlu bir vektöre hash'leyen, normalize
+    vektör döndüren embedding modeli. SentenceTransformer.encode arayüzünü taklit eder;
+    aynı kelimeleri paylaşan metinler benzer vektörler alır, böylece retrieval anlamlı kalır.
+    """
+    def __init__(self, dim: int = 384, max_seq_length: int = 256):
+        self.dim = dim
+        self.max_seq_length = max_seq_length
+        self.tokenizer = StubTokenizer()
+
+    def eval(self):
+        return self
+
+    def parameters(self):
+        return []
+
+    def buffers(self):
+        return []
+
+    def _vector(self, text: str) -> np.ndarray:
+        words = _WORD_RE.findall(text.lower())[:self.max_seq_length]
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if not features:
+            vector[0] = 1.0
+            return vector
+        hashes = np.array([zlib.crc32(f.encode("utf-8")) for f in features], dtype=np.uint64)
+        signs = np.where(hashes & np.uint64(1 << 31), -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, (hashes % np.uint64(self.dim)).astype(np.int64), signs)
+        return vector
+
+    def encode(self, texts: List[str], convert_to_numpy: bool = True,
+               normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        vectors = np.stack([self._vector(t) for t in texts]) if texts else np.zeros((0, self.dim), np.float32)
+        if normalize_embeddings and len(vectors):
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.maximum(norms, 1e-12)
+        return vectors.astype(np.float32)
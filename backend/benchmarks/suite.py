@@ -0,0 +1,324 @@
+"""
+Çevrimdışı, tekrarlanabilir benchmark paketi: sentetik PDF/DOCX korpusu üzerinde
+sayfa ayıklama (sayfa/s), parçalama ve embedding (chunk/s), uçtan uca yükleme,
+doküman sayısına göre retrieval gecikmesi (p50/p99) ve doküman başına bellek ölçülür.
+Varsayılan olarak stub embedding modeli ve stub tokenizer kullanılır (model indirmez).
+
+Kullanım (backend/ dizininden):
+    python -m benchmarks.suite --docs 20 --pages 8 --output bench.json
+    python -m benchmarks.suite --embedding sentence-transformers/all-MiniLM-L6-v2 --llm Qwen/Qwen2.5-0.5B-Instruct
+    python -m benchmarks.suite --baseline bench.json --max-regression 0.2
+
+--baseline verilirse sonuçlar önceki JSON ile karşılaştırılır; herhangi bir metrik
+--max-regression oranından fazla kötüleşmişse çıkış kodu 1 olur. Yükleme aşama süreleri
+toplam süreyle tutarsızsa (ingestion.stage_time_errors) da çıkış kodu 1 olur.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from itertools import islice
+from typing import Dict, List
+
+import numpy as np
+
+from benchmarks.corpus import make_corpus
+from benchmarks.stubs import HashingEmbedder, StubTokenizer
+from services import chunker, compact_storage, vector_index
+from services.document_service import iter_pages
+from services.document_store import DocumentStore
+from services.documents import iter_document_chunks
+from services.embedding_cache import EMBEDDING_CACHE
+from services.embedding_service import ENCODE_BATCH_SIZE, EmbeddingStore
+from services.ingestion import IngestionJob, ingest_document
+from services.llm_loader import LLM_PRECISION, load_llm, use_llm
+from services.metrics import request_timings, rss_bytes
+from services.model_registry import DEFAULT_EMBEDDING_MODEL, register_embedding_model
+from services.qa_service import generate_answer_from_contexts, retrieve_packed_contexts
+from services.speculative import DECODE_STATS
+
+
+def _lower_is_better(name: str) -> bool:
+    # Süreler ve bellek küçüldükçe, diğerleri (ör. *_per_s, hit_rate) büyüdükçe iyidir
+    return name.endswith("_ms") or "bytes" in name or ".stage_seconds." in name
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, float]:
+    ms = np.array(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+def setup_backends(embedding: str, llm: str):
+    """
+    Embedding modeli ve LLM'i (stub veya gerçek model adı) paylaşılan kopya olarak kaydeder.
+    Stub olmayan embedding modeli varsayılan model adı altında kullanılır.
+    """
+    if embedding == "stub":
+        register_embedding_model(DEFAULT_EMBEDDING_MODEL, HashingEmbedder())
+    elif embedding != DEFAULT_EMBEDDING_MODEL:
+        from sentence_transformers import SentenceTransformer
+        register_embedding_model(DEFAULT_EMBEDDING_MODEL, SentenceTransformer(embedding).eval())
+
+    if llm == "stub":
+        use_llm(StubTokenizer())
+    else:
+        use_llm(*load_llm(LLM_PRECISION, llm, checkpoint=None))
+
+
+def bench_extraction(corpus) -> Dict:
+    results = {}
+    for ext in sorted({doc.ext for doc in corpus}):
+        docs = [doc for doc in corpus if doc.ext == ext]
+        start = time.perf_counter()
+        pages = sum(1 for doc in docs for _ in iter_pages(doc.content, ext))
+        elapsed = time.perf_counter() - start
+        results[ext] = {"documents": len(docs), "pages": pages, "pages_per_s": round(pages / elapsed, 2)}
+    return results
+
+
+def bench_chunking_and_embedding(corpus) -> Dict:
+    """
+    Parçalama ve embedding ayrı ayrı ölçülür (sayfalar önceden ayıklanır).
+    """
+    all_pages = [list(iter_pages(doc.content, doc.ext)) for doc in corpus]
+
+    start = time.perf_counter()
+    chunks = [chunk.text for pages in all_pages for chunk in iter_document_chunks(pages)]
+    chunk_seconds = time.perf_counter() - start
+
+    encoder = EmbeddingStore("benchmark")
+    start = time.perf_counter()
+    it = iter(chunks)
+    while True:
+        batch = list(islice(it, ENCODE_BATCH_SIZE))
+        if not batch:
+            break
+        encoder.encode_chunks(batch)
+    embed_seconds = time.perf_counter() - start
+
+    return {
+        "chunker": chunker.CHUNKER,
+        "chunks": len(chunks),
+        "mean_chunk_chars": round(float(np.mean([len(c) for c in chunks])), 1) if chunks else 0.0,
+        "chunking_chunks_per_s": round(len(chunks) / chunk_seconds, 2),
+        "embedding_chunks_per_s": round(len(chunks) / embed_seconds, 2),
+    }
+
+
+def bench_ingestion(corpus, store: DocumentStore) -> Dict:
+    """
+    Dokümanları uçtan uca (ayıkla, parçala, embed et, indeksle, kaydet) yükler
+    ve aşama sürelerini raporlar. Aşama süreleri toplam süreyle tutarsızsa
+    (bir süre birden fazla aşamaya yazılmış) sorunlu aşamalar stage_time_errors'a eklenir.
+    """
+    stages: Dict[str, float] = {}
+    start = time.perf_counter()
+    doc_ids = []
+    for doc in corpus:
+        job = IngestionJob(doc.filename)
+        with request_timings() as timings:
+            ingest_document(job, doc.content, doc.ext, store)
+        for stage, seconds in timings.items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        doc_ids.append(job.doc_id)
+    elapsed = time.perf_counter() - start
+
+    pages = sum(doc.pages for doc in corpus)
+    stages.pop("total", None)
+    # Aşamalar ayrık ölçülür; toplamları duvar saatini aşıyorsa bir süre iki aşamaya birden yazılmıştır
+    errors = [
+        f"{stage}: {seconds:.4f} s toplam süreyi ({elapsed:.4f} s) aşıyor"
+        for stage, seconds in sorted(stages.items()) if seconds > elapsed
+    ]
+    if not errors and sum(stages.values()) > elapsed:
+        largest = ", ".join(f"{k} {v:.4f} s" for k, v in sorted(stages.items(), key=lambda kv: -kv[1])[:3])
+        errors.append(f"aşama süreleri toplamı ({sum(stages.values()):.4f} s) toplam süreyi ({elapsed:.4f} s) aşıyor; en büyükler: {largest}")
+    return {
+        "doc_ids": doc_ids,
+        "report": {
+            "documents": len(corpus),
+            "pages_per_s": round(pages / elapsed, 2),
+            "documents_per_s": round(len(corpus) / elapsed, 3),
+            "stage_seconds": {k: round(v, 4) for k, v in sorted(stages.items())},
+            "stage_time_errors": errors,
+        },
+    }
+
+
+def bench_memory(store: DocumentStore, doc_ids: List[str]) -> Dict:
+    """
+    Kayıtlı dokümanları boş bir store'a diskten yeniden yükleyerek doküman başına bellek artışını ölçer.
+    tracemalloc Python heap'ini (numpy dahil) görür; Faiss indeksinin C++ belleği yalnızca RSS'te görünür.
+    Yeniden yüklenen store döndürülür (sonraki ölçümler bunu kullanır).
+    """
+    for doc_id in doc_ids:
+        store[doc_id].remove()
+    root = store.root
+    del store
+    gc.collect()
+
+    tracemalloc.start()
+    base_traced = tracemalloc.get_traced_memory()[0]
+    base_rss = rss_bytes()
+    reloaded = DocumentStore(root, max_mb=0)
+    for doc_id in doc_ids:
+        reloaded[doc_id]
+    traced = tracemalloc.get_traced_memory()[0] - base_traced
+    tracemalloc.stop()
+    rss = rss_bytes()
+
+    chunks = reloaded.resident()["chunks"]
+    return {
+        "store": reloaded,
+        "report": {
+            "chunks_per_doc": round(chunks / len(doc_ids), 2),
+            "traced_bytes_per_doc": int(traced / len(doc_ids)),
+            "rss_bytes_per_doc": int((rss - base_rss) / len(doc_ids)) if rss is not None and base_rss is not None else None,
+        },
+    }
+
+
+def bench_retrieval(corpus, store: DocumentStore, doc_ids: List[str], doc_counts: List[int], queries: int) -> Dict:
+    """
+    İlk n doküman seçiliyken o dokümanlara ait sorular için retrieval + bağlam paketleme gecikmesi.
+    hit_rate: sorunun cevabını içeren cümlenin seçilen bağlamlarda bulunma oranı.
+    """
+    results = {}
+    for n in doc_counts:
+        n = min(n, len(doc_ids))
+        documents = [store[d] for d in doc_ids[:n]]
+        seconds, hits = [], 0
+        for i in range(queries):
+            doc = corpus[i % n]
+            start = time.perf_counter()
+            packed = retrieve_packed_contexts(doc.question, documents, k_per_doc=5, max_chunks=5)
+            seconds.append(time.perf_counter() - start)
+            hits += any(doc.fact in context for context in packed.contexts)
+        results[str(n)] = {**_percentiles(seconds), "hit_rate": round(hits / queries, 4)}
+    return results
+
+
+def bench_generation(corpus, store: DocumentStore, doc_ids: List[str], questions: int) -> Dict:
+    seconds = []
+    for i in range(questions):
+        doc = corpus[i % len(corpus)]
+        packed = retrieve_packed_contexts(doc.question, [store[doc_ids[i % len(corpus)]]])
+        start = time.perf_counter()
+        generate_answer_from_contexts(doc.question, packed.contexts)
+        seconds.append(time.perf_counter() - start)
+    return {**_percentiles(seconds), "decode": DECODE_STATS.stats()["modes"]}
+
+
+def flatten(report: Dict, prefix: str = "") -> Dict[str, float]:
+    """
+    Karşılaştırma için iç içe sonuçları "a.b.c" anahtarlı sayısal değerlere düzleştirir.
+    """
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(current: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """
+    Önceki sonuca göre max_regression oranından fazla kötüleşen metrikleri döndürür.
+    """
+    regressions = []
+    old = flatten(baseline.get("results", {}))
+    for name, value in flatten(current["results"]).items():
+        if name not in old or old[name] == 0 or name.endswith((".documents", ".pages", ".chunks")):
+            continue
+        change = (value - old[name]) / abs(old[name])
+        if (change if _lower_is_better(name) else -change) > max_regression:
+            regressions.append(f"{name}: {old[name]:g} -> {value:g} ({change:+.1%})")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="DocSage çevrimdışı benchmark paketi")
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=8, help="Doküman başına sayfa")
+    parser.add_argument("--formats", default="pdf,docx")
+    parser.add_argument("--doc-counts", default="1,5,20", help="Retrieval'ın ölçüleceği seçili doküman sayıları")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--embedding", default="stub", help="stub veya sentence-transformers model adı")
+    parser.add_argument("--llm", default="stub", help="stub (üretim ölçülmez) veya HF model adı")
+    parser.add_argument("--generation-questions", type=int, default=5)
+    parser.add_argument("--embedding-cache", action="store_true", help="Embedding önbelleğini açık bırak")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Sonuçların yazılacağı JSON dosyası")
+    parser.add_argument("--baseline", help="Karşılaştırılacak önceki sonuç JSON'u")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    setup_backends(args.embedding, args.llm)
+    if not args.embedding_cache:
+        # Aynı chunk'ın önbellekten gelmesi embedding hızını olduğundan yüksek gösterir
+        EMBEDDING_CACHE.max_bytes = 0
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    start = time.perf_counter()
+    corpus = make_corpus(args.docs, args.pages, formats, args.seed)
+    print(f"Korpus: {len(corpus)} doküman, {time.perf_counter() - start:.1f} s", file=sys.stderr)
+
+    results = {"extraction": bench_extraction(corpus)}
+    results["chunking_embedding"] = bench_chunking_and_embedding(corpus)
+
+    with tempfile.TemporaryDirectory(prefix="docsage-bench-") as root:
+        # Ölçümler tüm dokümanlar bellekteyken yapılır (bellek bütçesi kapalı)
+        store = DocumentStore(root, max_mb=0)
+        ingestion = bench_ingestion(corpus, store)
+        results["ingestion"] = ingestion["report"]
+        memory = bench_memory(store, ingestion["doc_ids"])
+        store = memory["store"]
+        results["memory"] = memory["report"]
+        doc_counts = [int(n) for n in args.doc_counts.split(",") if n.strip()]
+        results["retrieval"] = bench_retrieval(corpus, store, ingestion["doc_ids"], doc_counts, args.queries)
+        if args.llm != "stub":
+            results["generation"] = bench_generation(corpus, store, ingestion["doc_ids"], args.generation_questions)
+
+    report = {
+        "config": {
+            "docs": args.docs, "pages_per_doc": args.pages, "formats": formats, "seed": args.seed,
+            "embedding": args.embedding, "llm": args.llm,
+            "chunker": chunker.CHUNKER, "storage": compact_storage.STORAGE_MODE, "index_type": vector_index.INDEX_TYPE,
+        },
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    errors = results["ingestion"]["stage_time_errors"]
+    for line in errors:
+        print(f"TUTARSIZ AŞAMA SÜRESİ {line}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"REGRESYON {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
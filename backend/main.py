@@ -1,8 +1,44 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from routers.documents import router as documents_router
-from routers.qa import router as qa_router 
+from routers.qa import router as qa_router
+from services.lifecycle import MODEL_LIFECYCLE, PRELOAD_MODELS
+from services.metrics import REGISTRY
+from services.model_registry import model_memory_report
+from services.uploads import (
+    BULK_MAX_UPLOAD_BYTES,
+    MAX_UPLOAD_BYTES,
+    MULTIPART_OVERHEAD_BYTES,
+    bulk_too_large_message,
+    too_large_message
+)
 
-app = FastAPI(title="Document QA API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Modeller import sırasında değil, uygulama başlarken arka planda yüklenir
+    if PRELOAD_MODELS:
+        MODEL_LIFECYCLE.start()
+    yield
+
+app = FastAPI(title="Document QA API", lifespan=lifespan)
+
+# Yükleme yolu -> (istek gövdesi sınırı, hata mesajı)
+UPLOAD_LIMITS = {
+    "/documents/upload": (MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES, too_large_message),
+    "/documents/upload/bulk": (BULK_MAX_UPLOAD_BYTES, bulk_too_large_message),
+}
+
+# Boyutu baştan belli olan (Content-Length) büyük yüklemeler gövde okunmadan reddedilir
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    limit = UPLOAD_LIMITS.get(request.url.path) if request.method == "POST" else None
+    if limit is not None:
+        max_bytes, message = limit
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > max_bytes:
+            return JSONResponse(status_code=413, content={"detail": message()})
+    return await call_next(request)
 
 # Router'ları ana uygulamaya ekliyoruz
 app.include_router(documents_router)
@@ -11,4 +47,29 @@ app.include_router(qa_router)
 # Sağlık kontrolü için basit bir ana sayfa endpoint'i
 @app.get("/")
 def read_root():
-    return {"message": "DocSage API is running correctly!"}
\ No newline at end of file
+    return {"message": "DocSage API is running correctly!"}
+
+# Liveness: süreç ayakta mı (modellerin durumundan bağımsız)
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+# Readiness: modeller yüklendi (veya lazy modda ilk istekte yüklenecek) ve istek almaya hazır mı
+@app.get("/readyz")
+def readyz():
+    components = MODEL_LIFECYCLE.status()
+    ready = MODEL_LIFECYCLE.ready(components)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "components": components}
+    )
+
+# Yüklü modellerin bellek kullanımı (byte)
+@app.get("/models")
+def read_models():
+    return {"memory_bytes": model_memory_report()}
+
+# Prometheus metrikleri (aşama süre histogramları, token/saniye, kuyruk derinlikleri, bellekteki doküman/chunk sayıları)
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,52 +1,220 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Dict
-import uuid
+from typing import List
+from fastapi import APIRouter, UploadFile, File, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 
-from services.document_service import extract_text_from_file
-from services.documents import DocumentObject
-from services.documents import split_into_chunks
+from services.document_store import DocumentStore
+from services.embedding_cache import EMBEDDING_CACHE
+from services.ingestion import (
+    BULK_MAX_ARCHIVE_BYTES,
+    BULK_MAX_FILES,
+    SUPPORTED_EXTENSIONS,
+    IngestionQueue,
+    QueueFullError,
+    Upload,
+    file_extension,
+    discard_upload,
+    unpack_archive
+)
+from services.metrics import REGISTRY, timed
+from services.uploads import (
+    BULK_MAX_UPLOAD_BYTES,
+    MAX_UPLOAD_BYTES,
+    UploadTooLargeError,
+    bulk_too_large_message,
+    discard,
+    spool,
+    too_large_message
+)
+from services.vector_index import get_vector_index
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 
-# Dokümanları bellekte tutmak için store
-DOCUMENT_STORE: Dict[str, DocumentObject] = {}
+# Dokümanları diskte kalıcı tutan, bellekte ihtiyaç halinde yükleyen store
+DOCUMENT_STORE = DocumentStore()
 
-@router.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+# Yükleme işleri arka planda, sınırlı bir worker havuzunda çalışır
+INGESTION_QUEUE = IngestionQueue(DOCUMENT_STORE)
+
+REGISTRY.gauge(
+    "docsage_ingestion_jobs", "Bekleyen ve işlenmekte olan yükleme işleri",
+    lambda: {(state,): count for state, count in INGESTION_QUEUE.depth().items()}, ("state",)
+)
+REGISTRY.gauge("docsage_resident_documents", "Bellekte yüklü doküman sayısı", lambda: DOCUMENT_STORE.resident()["documents"])
+REGISTRY.gauge("docsage_resident_chunks", "Bellekte yüklü chunk sayısı", lambda: DOCUMENT_STORE.resident()["chunks"])
+REGISTRY.gauge("docsage_resident_document_bytes", "Bellekteki dokümanların toplam boyutu (byte)", lambda: DOCUMENT_STORE.resident()["bytes"])
+REGISTRY.gauge("docsage_document_evictions", "Bellek bütçesi nedeniyle bellekten çıkarılan doküman sayısı", lambda: DOCUMENT_STORE.evictions)
+REGISTRY.gauge("docsage_index_vectors", "Global vektör indeksindeki vektör sayısı", lambda: len(get_vector_index()))
+
+@router.post("/upload", status_code=202)
+async def upload_document(response: Response, file: UploadFile = File(...)):
     """
-    Tek bir dosya yükler (PDF/DOCX), metni ayıklar ve store'a kaydeder.
+    Tek bir dosya yükler (PDF/DOCX) ve işlenmesi için kuyruğa alır.
+    Dosya belleğe okunmadan parça parça diske yazılır; MAX_UPLOAD_MB'ı aşan dosyalar 413 ile reddedilir.
+    Hemen job_id ve doc_id döner; ilerleme /documents/jobs/{job_id} ile takip edilir.
+    Aynı dosya daha önce yüklendiyse mevcut doküman "done" durumunda (200) döner.
     """
     filename = file.filename or "document"
     
     # Dosya uzantısını güvenli şekilde kontrol et
-    parts = filename.split(".")
-    ext = parts[-1].lower() if len(parts) > 1 else ""
+    ext = file_extension(filename)
 
-    if ext not in ["pdf", "docx"]:
+    if ext not in SUPPORTED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Sadece PDF ve DOCX dosyaları destekleniyor.")
 
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=too_large_message())
+
+    with timed("upload_read"):
+        try:
+            spooled = await run_in_threadpool(spool, file.file, f".{ext}")
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+    try:
+        job = INGESTION_QUEUE.submit(filename, spooled.path, ext, spooled.content_hash)
+    except QueueFullError as e:
+        # Kuyruk doluysa istemci daha sonra tekrar denemeli
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+
+    if job.duplicate:
+        response.status_code = 200
+    return job.to_dict()
+
+@router.post("/upload/bulk", status_code=202)
+async def upload_documents(files: List[UploadFile] = File(...)):
+    """
+    Birden fazla PDF / DOCX dosyasını veya bunları içeren zip arşivlerini tek istekte yükler.
+    Dosyalar (ve zip içerikleri) parça parça diske yazılır, paralel ayıklanır ve parçaları
+    ortak embedding batch'lerinde encode edilir. MAX_UPLOAD_MB'ı aşan dosyalar failures'a eklenir;
+    isteğin toplamı BULK_MAX_UPLOAD_MB'ı aşarsa tüm yükleme 413 ile reddedilir.
+    Dosya başına iş (job_id, doc_id) ve reddedilen dosyalar (failures) döner;
+    ilerleme /documents/batches/{batch_id} ile takip edilir.
+    """
+    uploads, failures = [], []
+    # Content-Length'siz (chunked) istekler middleware'e takılmaz; toplam burada da sınırlanır
+    received = 0
+    try:
+        for file in files:
+            filename = file.filename or "document"
+            ext = file_extension(filename)
+            if ext != "zip" and ext not in SUPPORTED_EXTENSIONS:
+                failures.append({"filename": filename, "error": "Sadece PDF, DOCX ve ZIP dosyaları destekleniyor."})
+                continue
+
+            with timed("upload_read"):
+                try:
+                    # Arşivin kendisi açılmış boyut sınırına, içindeki her dosya MAX_UPLOAD_MB'a tabidir
+                    max_bytes = BULK_MAX_ARCHIVE_BYTES if ext == "zip" else MAX_UPLOAD_BYTES
+                    remaining = BULK_MAX_UPLOAD_BYTES - received
+                    spooled = await run_in_threadpool(spool, file.file, f".{ext}", min(max_bytes, remaining))
+                except UploadTooLargeError as e:
+                    if remaining < max_bytes:
+                        raise HTTPException(status_code=413, detail=bulk_too_large_message())
+                    failures.append({"filename": filename, "error": str(e)})
+                    continue
+            received += spooled.size
+
+            if ext != "zip":
+                uploads.append(Upload(filename, spooled.path, ext, spooled.content_hash))
+                continue
+            try:
+                members, skipped = await run_in_threadpool(unpack_archive, filename, spooled.path)
+            except ValueError as e:
+                failures.append({"filename": filename, "error": str(e)})
+                continue
+            finally:
+                discard(spooled.path)
+            uploads.extend(members)
+            failures.extend(skipped)
+
+        if len(uploads) > BULK_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"Tek istekte en fazla {BULK_MAX_FILES} dosya yüklenebilir.")
+    except BaseException:
+        for upload in uploads:
+            discard_upload(upload)
+        raise
+
+    try:
+        batch = INGESTION_QUEUE.submit_many(uploads, failures)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return batch.to_dict()
+
+@router.get("/batches/{batch_id}")
+def get_batch_status(batch_id: str):
+    """
+    Toplu yüklemedeki tüm dosyaların durumunu ve özet sayaçlarını döndürür.
+    """
+    batch = INGESTION_QUEUE.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Toplu yükleme bulunamadı: {batch_id}")
+    return batch.to_dict()
+
+@router.get("/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """
+    Yükleme işinin durumunu ve ilerlemesini (ayıklanan sayfa, embed edilen chunk) döndürür.
+    Ayıklama sürerken chunks_total, ayıklanan sayfa oranından tahmin edilir.
+    """
+    job = INGESTION_QUEUE.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"İş bulunamadı: {job_id}")
+    return job.to_dict()
+
+@router.get("/embedding-cache/stats")
+def embedding_cache_stats():
+    """
+    Chunk embedding önbelleğinin isabet/ıskalama sayaçları.
+    """
+    return EMBEDDING_CACHE.stats()
+
+@router.get("/index/stats")
+def index_stats():
+    """
+    Global vektör indeksinin tipi, vektör sayısı ve silinmiş (tombstone) vektör sayısı.
+    """
+    return get_vector_index().stats()
+
+@router.get("")
+def list_documents():
+    """
+    Diskte kayıtlı tüm dokümanları (en yeni önce) metadata'sı ve bellekte olup olmadıkları ile listeler.
+    Dokümanlar bu sırada belleğe yüklenmez.
+    """
+    documents = []
+    for doc_id in DOCUMENT_STORE.ids():
+        try:
+            documents.append(DOCUMENT_STORE.info(doc_id))
+        except KeyError:
+            continue
+    documents.sort(key=lambda d: d.get("created_at") or 0, reverse=True)
+    return {"count": len(documents), "documents": documents}
+
+@router.get("/memory")
+def document_memory_stats():
+    """
+    Bellekteki dokümanların toplam boyutu, bellek bütçesi ve diskten yükleme / bellekten çıkarma sayaçları.
+    """
+    return DOCUMENT_STORE.stats()
+
+@router.get("/{doc_id}")
+def get_document(doc_id: str):
+    """
+    Dokümanın metadata'sını ve bellekteyse bileşen bazında bellek kullanımını
+    (vektörler, indeks kodları, metinler, keyword indeksi, chunk metadata'sı) döndürür.
+    """
+    try:
+        return DOCUMENT_STORE.info(doc_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Doküman bulunamadı: {doc_id}")
+
+@router.delete("/{doc_id}")
+def delete_document(doc_id: str):
+    """
+    Dokümanı diskten, bellekten ve vektör indeksinden siler; ona dayanan önbellekteki cevaplar da temizlenir.
+    """
     try:
-        content = await file.read()
-        
-        # 1. Metni ayıkla
-        text = extract_text_from_file(content, ext)
-
-        # 2. Metni parçalara böl
-        chunks = split_into_chunks(text)
-        
-        # 3. DocumentObject oluştur
-        doc_obj = DocumentObject(chunks=chunks)
-
-        # 4. ID oluştur ve sakla
-        doc_id = str(uuid.uuid4())
-        DOCUMENT_STORE[doc_id] = doc_obj
-        
-        return {
-            "doc_id": doc_id,
-            "filename": filename,
-            "num_chars": len(chunks)
-        }
-
-    except Exception as e:
-        # Hata detayını kullanıcıya/frontend'e dön
-        raise HTTPException(status_code=500, detail=f"Dosya işlenirken hata oluştu: {str(e)}")
\ No newline at end of file
+        del DOCUMENT_STORE[doc_id]
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Doküman bulunamadı: {doc_id}")
+    return {"doc_id": doc_id, "deleted": True}
@@ -1,49 +1,410 @@
+import json
+import time
+from contextlib import contextmanager
+import numpy as np
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional
 from routers.documents import DOCUMENT_STORE
-from services.qa_service import generate_answer_from_contexts, retrieve_globally_relevant_chunks
+from services.answer_cache import ANSWER_CACHE, CacheEntry
+from services.generation_scheduler import GENERATION_SCHEDULER
+from services.metrics import REGISTRY, observe_stage, request_timings, timed, timings_ms
+from services.prefix_cache import PROMPT_CACHE
+from services.speculative import DECODE_STATS
+from services.qa_service import (
+    QA_BATCH_MAX_QUESTIONS,
+    QA_BATCH_SIZE,
+    generate_answer_from_contexts,
+    retrieve_packed_contexts,
+    retrieve_packed_contexts_batch,
+    stream_answer_from_contexts
+)
 
 router = APIRouter(prefix="/qa", tags=["qa"])
 
 class QuestionRequest(BaseModel):
     doc_ids: List[str]
     question: str
+    # Aynı konuşmadaki takip soruları önceki turların KV cache'ini yeniden kullanır
+    conversation_id: Optional[str] = None
+    # Cevaba aşama bazında süre dökümü (ms) eklenir
+    include_timings: bool = False
+
+class BatchQuestionRequest(BaseModel):
+    doc_ids: List[str]
+    questions: List[str]
 
 class QAResponse(BaseModel):
     answer: str
     context_chunks: List[str]
+    cached: bool = False
+    # Bağlam paketlemenin kullandığı token sayıları (context_tokens, prompt_tokens, budget, ...)
+    token_usage: Optional[Dict[str, int]] = None
+    timings_ms: Optional[Dict[str, float]] = None
+
+NO_CONTEXT_MSG = "I am sorry, but I could not find relevant information in the uploaded documents."
+
+# Silinen dokümanlara dayanan cevaplar önbellekten çıkarılır
+DOCUMENT_STORE.add_remove_listener(ANSWER_CACHE.invalidate_document)
+
+REGISTRY.gauge("docsage_generation_queue_depth", "Üretim kuyruğunda bekleyen istek sayısı", lambda: GENERATION_SCHEDULER.stats()["queue_depth"])
+REGISTRY.gauge("docsage_generation_in_flight", "Şu anda üretilen batch'teki istek sayısı", lambda: GENERATION_SCHEDULER.in_flight)
+
+class _Lookup:
+    """
+    Retrieval ve önbellek aramasının sonucu.
+    """
+    def __init__(self, contexts: List[str], cache_key: Optional[str] = None,
+                 q_vec: Optional[np.ndarray] = None, cached: Optional[CacheEntry] = None,
+                 token_usage: Optional[Dict[str, int]] = None):
+        self.contexts = contexts
+        self.cache_key = cache_key
+        self.q_vec = q_vec
+        self.cached = cached
+        self.token_usage = token_usage
+
+@contextmanager
+def _load_documents(doc_ids: List[str]) -> Iterator[list]:
+    # Dokümanlar blok boyunca sabitlenir: bellek bütçesi aşılsa da kullanılırken bellekten çıkarılmaz
+    with timed("document_load"):
+        try:
+            documents = DOCUMENT_STORE.pin(doc_ids)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=f"Doküman bulunamadı: {e.args[0]}")
+    try:
+        yield documents
+    finally:
+        DOCUMENT_STORE.unpin(doc_ids)
+
+def _has_context(contexts: List[str]) -> bool:
+    return bool(contexts) and len(" ".join(contexts).strip()) >= 50
+
+def _lookup(request: QuestionRequest) -> _Lookup:
+    """
+    İstenen dokümanları yükler, önce önbelleğe bakar, sonra soruya en alakalı parçaları bulur.
+    Bağlam yetersizse contexts boş döner.
+    """
+    with _load_documents(request.doc_ids) as documents:
+        # Konuşma geçmişi cevabı etkilediği için konuşmalı istekler cevap önbelleğini kullanmaz
+        use_cache = request.conversation_id is None
+
+        # Yakın-tekrar soru araması (açıksa): soru bir kez encode edilir ve retrieval'da da kullanılır
+        q_vec = None
+        if use_cache and ANSWER_CACHE.semantic_enabled and documents:
+            with timed("query_encode"):
+                q_vec = documents[0].embedding_store.encode([request.question])[0]
+            with timed("cache_lookup"):
+                cached = ANSWER_CACHE.get_similar(q_vec, request.doc_ids)
+            if cached is not None:
+                return _Lookup(cached.contexts, q_vec=q_vec, cached=cached)
+
+        # 1. Semantik Arama (Retrieval) + token bütçesine göre bağlam paketleme
+        packed = retrieve_packed_contexts(
+            question=request.question,
+            documents=documents,
+            k_per_doc=5,
+            max_chunks=5,
+            q_vec=q_vec
+        )
+        contexts = packed.contexts
+        token_usage = packed.to_dict()
+
+        if not _has_context(contexts):
+            return _Lookup([], q_vec=q_vec)
+
+        if not use_cache:
+            return _Lookup(contexts, q_vec=q_vec, token_usage=token_usage)
+
+        # Tam eşleşme: normalize soru + doc_ids + seçilen bağlamlar
+        with timed("cache_lookup"):
+            key = ANSWER_CACHE.make_key(request.question, request.doc_ids, contexts)
+            cached = ANSWER_CACHE.get(key)
+        return _Lookup(contexts, key, q_vec, cached, token_usage)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 @router.post("/", response_model=QAResponse)
 def qa_endpoint(request: QuestionRequest):
-    documents = []
-    for doc_id in request.doc_ids:
-        if doc_id not in DOCUMENT_STORE:
-            raise HTTPException(status_code=404, detail=f"Doküman bulunamadı: {doc_id}")
-        documents.append(DOCUMENT_STORE[doc_id])
-
-    # 1. Semantik Arama (Retrieval)
-    contexts = retrieve_globally_relevant_chunks(
-        question=request.question,
-        documents=documents,
-        k_per_doc=5,
-        max_chunks=5
-    )
+    with request_timings() as timings:
+        response = _answer(request)
+    observe_stage("qa_total", timings["total"])
+    if request.include_timings:
+        response.timings_ms = timings_ms(timings)
+    return response
+
+def _answer(request: QuestionRequest) -> QAResponse:
+    lookup = _lookup(request)
+    contexts = lookup.contexts
+
+    if lookup.cached is not None:
+        return QAResponse(
+            answer=lookup.cached.answer,
+            context_chunks=contexts,
+            cached=True,
+            token_usage=lookup.token_usage
+        )
 
     # Bağlam yetersizse veya boşsa erken dönüş yap
-    if not contexts or len(" ".join(contexts).strip()) < 50:
+    if not contexts:
         return QAResponse(
-            answer="I am sorry, but I could not find relevant information in the uploaded documents.",
+            answer=NO_CONTEXT_MSG,
             context_chunks=[]
         )
 
-    # 2. LLM ile Cevap Üretme
-    answer = generate_answer_from_contexts(
-        question=request.question,
-        contexts=contexts
-    )
+    # 2. LLM ile Cevap Üretme (eşzamanlı istekler micro-batch halinde üretilir;
+    # konuşmalı istekler kendi KV cache'leriyle tek başına üretilir)
+    with timed("generation"):
+        if request.conversation_id:
+            answer = generate_answer_from_contexts(request.question, contexts, request.conversation_id)
+        else:
+            answer = GENERATION_SCHEDULER.generate(
+                question=request.question,
+                contexts=contexts
+            )
+    if lookup.cache_key is not None:
+        ANSWER_CACHE.put(lookup.cache_key, answer, contexts, request.doc_ids, lookup.q_vec)
 
     return QAResponse(
         answer=answer,
-        context_chunks=contexts
-    )
\ No newline at end of file
+        context_chunks=contexts,
+        token_usage=lookup.token_usage
+    )
+
+@router.post("/stream")
+def qa_stream_endpoint(request: QuestionRequest):
+    """
+    Cevabı Server-Sent Events olarak akıtır. Önce bağlam parçaları ("context"),
+    ardından üretilen metin parçaları ("token") ve en sonda temizlenmiş tam cevap ("done") gönderilir.
+    Cevap üretim sırasında geçersiz sayılırsa "replace" olayı ile değiştirilir.
+    Üretim hata verirse veya takılırsa akış "done" yerine "error" olayıyla biter.
+    include_timings istenirse "done" olayı retrieval aşamalarının ve ilk token / toplam
+    üretim sürelerinin dökümünü (ms) içerir.
+    """
+    started = time.perf_counter()
+    with request_timings() as timings:
+        lookup = _lookup(request)
+    contexts = lookup.contexts
+
+    def done(data: dict) -> str:
+        if request.include_timings:
+            data["timings_ms"] = timings_ms({**timings, "total": time.perf_counter() - started})
+        return _sse("done", data)
+
+    def event_stream():
+        yield _sse("context", {"context_chunks": contexts, "token_usage": lookup.token_usage})
+
+        if lookup.cached is not None:
+            # Önbellekteki cevap tek parça halinde gönderilir
+            yield _sse("token", {"text": lookup.cached.answer})
+            yield done({"answer": lookup.cached.answer, "cached": True})
+            return
+
+        if not contexts:
+            yield done({"answer": NO_CONTEXT_MSG})
+            return
+
+        # Üretim ayrı bir thread'de akar; süreler burada, olaylar geldikçe ölçülür
+        start = time.perf_counter()
+        for event in stream_answer_from_contexts(request.question, contexts, request.conversation_id):
+            event_type = event.pop("type")
+            if "time_to_first_token" not in timings:
+                timings["time_to_first_token"] = time.perf_counter() - start
+                observe_stage("time_to_first_token", timings["time_to_first_token"])
+            if event_type == "done":
+                timings["generation"] = time.perf_counter() - start
+                observe_stage("generation", timings["generation"])
+                if lookup.cache_key is not None:
+                    ANSWER_CACHE.put(lookup.cache_key, event["answer"], contexts, request.doc_ids, lookup.q_vec)
+                yield done(event)
+                continue
+            yield _sse(event_type, event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _lookup_batch(questions: List[str], doc_ids: List[str], documents: list) -> List[_Lookup]:
+    """
+    _lookup'un çok soruluk hali: sorular tek seferde encode edilir, önbellekte olmayanlar
+    için retrieval ve bağlam paketleme birlikte yapılır.
+    """
+    with timed("query_encode"):
+        q_vecs = documents[0].embedding_store.encode(questions)
+
+    lookups: List[Optional[_Lookup]] = [None] * len(questions)
+    if ANSWER_CACHE.semantic_enabled:
+        with timed("cache_lookup"):
+            for i, q_vec in enumerate(q_vecs):
+                cached = ANSWER_CACHE.get_similar(q_vec, doc_ids)
+                if cached is not None:
+                    lookups[i] = _Lookup(cached.contexts, q_vec=q_vec, cached=cached)
+
+    pending = [i for i, lookup in enumerate(lookups) if lookup is None]
+    packed = retrieve_packed_contexts_batch(
+        [questions[i] for i in pending],
+        documents,
+        k_per_doc=5,
+        max_chunks=5,
+        q_vecs=q_vecs[pending]
+    )
+    for i, item in zip(pending, packed):
+        if not _has_context(item.contexts):
+            lookups[i] = _Lookup([], q_vec=q_vecs[i])
+            continue
+        with timed("cache_lookup"):
+            key = ANSWER_CACHE.make_key(questions[i], doc_ids, item.contexts)
+            cached = ANSWER_CACHE.get(key)
+        lookups[i] = _Lookup(item.contexts, key, q_vecs[i], cached, item.to_dict())
+    return lookups
+
+class _BatchItem:
+    """
+    Toplu QA'da bir sorunun durumu: hazır cevap, bekleyen üretim (Future) veya hata.
+    """
+    def __init__(self, index: int, question: str, lookup: Optional[_Lookup] = None,
+                 future: Optional[Future] = None, error: Optional[str] = None):
+        self.index = index
+        self.question = question
+        self.lookup = lookup
+        self.future = future
+        self.error = error
+
+    def result(self, doc_ids: List[str]) -> dict:
+        data = {"index": self.index, "question": self.question}
+        if self.error is None and self.future is not None:
+            try:
+                answer = self.future.result()
+            except Exception as e:
+                self.error = f"Cevap üretilemedi: {e}"
+        if self.error is not None:
+            return {**data, "error": self.error}
+
+        lookup = self.lookup
+        if self.future is not None:
+            ANSWER_CACHE.put(lookup.cache_key, answer, lookup.contexts, doc_ids, lookup.q_vec)
+            response = QAResponse(answer=answer, context_chunks=lookup.contexts, token_usage=lookup.token_usage)
+        elif lookup.cached is not None:
+            response = QAResponse(answer=lookup.cached.answer, context_chunks=lookup.contexts,
+                                  cached=True, token_usage=lookup.token_usage)
+        else:
+            response = QAResponse(answer=NO_CONTEXT_MSG, context_chunks=[])
+        return {**data, **response.model_dump(exclude={"timings_ms"})}
+
+def _start_batch_group(request: BatchQuestionRequest, indexes: range) -> List[_BatchItem]:
+    """
+    Soru grubunun retrieval'ını yapar ve bağlamı bulunan soruların üretimini zamanlayıcıya verir.
+    Dokümanlar her grupta yeniden alınıp retrieval boyunca sabitlenir: gruplar arasında
+    bellekten çıkarılan dokümanlar diskten geri yüklenir.
+    """
+    items = [_BatchItem(i, request.questions[i]) for i in indexes]
+    valid = []
+    for item in items:
+        if item.question.strip():
+            valid.append(item)
+        else:
+            item.error = "Soru boş."
+    if not valid:
+        return items
+
+    # doc_ids istek başında doğrulanır; burada yalnızca akış sırasında oluşabilecek hatalar
+    # (doküman bu arada silindi, retrieval/encode hatası) o grubun sorularına yazılır
+    try:
+        with _load_documents(request.doc_ids) as documents:
+            lookups = _lookup_batch([item.question for item in valid], request.doc_ids, documents)
+    except HTTPException as e:
+        error = e.detail
+    except (ValueError, RuntimeError) as e:
+        error = f"Bağlam bulunamadı: {e}"
+    else:
+        error = None
+    if error is not None:
+        for item in valid:
+            item.error = error
+        return items
+
+    for item, lookup in zip(valid, lookups):
+        item.lookup = lookup
+        if lookup.cached is None and lookup.contexts:
+            item.future = GENERATION_SCHEDULER.submit(item.question, lookup.contexts)
+    return items
+
+@router.post("/batch")
+def qa_batch_endpoint(request: BatchQuestionRequest):
+    """
+    Aynı doküman kümesi üzerinde çok sayıda soruyu tek çağrıda cevaplar. Sonuçlar soru sırasıyla
+    NDJSON (satır başına bir JSON) olarak akar: {"index", "question", "answer", "context_chunks",
+    "cached", "token_usage"} veya yalnızca o soru başarısız olduysa {"index", "question", "error"}.
+    Sorular QA_BATCH_SIZE'lık gruplar halinde tek encode ve tek indeks aramasıyla işlenir; cevaplar
+    üretim zamanlayıcısında batch'ler halinde üretilirken sonraki grubun retrieval'ı yapılır.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="En az bir soru gönderilmeli.")
+    if len(request.questions) > QA_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tek istekte en fazla {QA_BATCH_MAX_QUESTIONS} soru gönderilebilir."
+        )
+    # Eksik veya bilinmeyen doküman ID'leri akış başlamadan 400 / 404 ile reddedilir
+    if not request.doc_ids:
+        raise HTTPException(status_code=400, detail="En az bir doküman seçilmeli.")
+    with _load_documents(request.doc_ids):
+        pass
+
+    def results() -> Iterator[str]:
+        started = time.perf_counter()
+        pending: List[_BatchItem] = []
+        try:
+            for start in range(0, len(request.questions), QA_BATCH_SIZE):
+                group = _start_batch_group(
+                    request, range(start, min(start + QA_BATCH_SIZE, len(request.questions)))
+                )
+                for item in pending:
+                    yield json.dumps(item.result(request.doc_ids), ensure_ascii=False) + "\n"
+                pending = group
+            for item in pending:
+                yield json.dumps(item.result(request.doc_ids), ensure_ascii=False) + "\n"
+            pending = []
+            observe_stage("qa_batch_total", time.perf_counter() - started)
+        finally:
+            # İstemci bağlantıyı kapattıysa henüz başlamamış üretimler iptal edilir
+            for item in pending:
+                if item.future is not None:
+                    item.future.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.get("/cache/stats")
+def cache_stats():
+    """
+    Cevap önbelleğinin isabet/ıskalama sayaçları.
+    """
+    return ANSWER_CACHE.stats()
+
+
+@router.get("/scheduler/stats")
+def scheduler_stats():
+    """
+    Üretim zamanlayıcısının kuyruk derinliği ve batch istatistikleri.
+    """
+    return GENERATION_SCHEDULER.stats()
+
+
+@router.get("/prompt-cache/stats")
+def prompt_cache_stats():
+    """
+    System prompt ve konuşma KV cache'lerinin kullanım istatistikleri.
+    """
+    return PROMPT_CACHE.stats()
+
+
+@router.get("/decode/stats")
+def decode_stats():
+    """
+    Üretim modlarına göre token/saniye ve (spekülatif üretimde) taslak token kabul oranı.
+    """
+    return DECODE_STATS.stats()
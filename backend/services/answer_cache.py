@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+
+# --- AYARLAR ---
+# Bellekte tutulan en fazla cevap sayısı (LRU)
+ANSWER_CACHE_SIZE = int(os.getenv("DOCSAGE_ANSWER_CACHE_SIZE", "1024"))
+# Cevabın geçerli kaldığı süre (saniye)
+ANSWER_CACHE_TTL = float(os.getenv("DOCSAGE_ANSWER_CACHE_TTL", "3600"))
+# Yakın-tekrar sorular için soru embedding benzerlik eşiği (0 = kapalı)
+ANSWER_CACHE_SIMILARITY = float(os.getenv("DOCSAGE_ANSWER_CACHE_SIMILARITY", "0"))
+
+
+def normalize_question(question: str) -> str:
+    """
+    Büyük/küçük harf, fazla boşluk ve sondaki noktalama farklarını yok sayar.
+    """
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+class CacheEntry:
+    def __init__(self, answer: str, contexts: List[str], doc_ids: Tuple[str, ...], q_vec: Optional[np.ndarray]):
+        self.answer = answer
+        self.contexts = contexts
+        self.doc_ids = doc_ids
+        self.q_vec = q_vec
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """
+    generate_answer_from_contexts önünde duran cevap önbelleği.
+    Tam eşleşme anahtarı: normalize soru + sıralı doc_ids + seçilen bağlamların hash'i.
+    İsteğe bağlı olarak aynı doküman kümesinde, soru embedding'i eşiğin üzerinde benzer
+    olan önceki cevaplar da kullanılır. LRU + TTL ile sınırlıdır.
+    """
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl: float = ANSWER_CACHE_TTL,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        # doc_id -> o dokümanı kullanan anahtarlar (silme sırasında geçersiz kılmak için)
+        self._by_doc: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.similarity_threshold > 0
+
+    @staticmethod
+    def make_key(question: str, doc_ids: List[str], contexts: List[str]) -> str:
+        contexts_hash = hashlib.sha256("\x1e".join(contexts).encode("utf-8")).hexdigest()
+        raw = "\x1f".join([normalize_question(question), ",".join(sorted(set(doc_ids))), contexts_hash])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _expired(self, entry: CacheEntry) -> bool:
+        return self.ttl > 0 and time.time() - entry.created_at > self.ttl
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for doc_id in entry.doc_ids:
+            keys = self._by_doc.get(doc_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_doc[doc_id]
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Tam eşleşme araması. Bulunamazsa miss sayılır.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get_similar(self, q_vec: np.ndarray, doc_ids: List[str]) -> Optional[CacheEntry]:
+        """
+        Aynı doküman kümesi için, soru embedding'i eşiğin üzerinde benzer olan en yakın cevabı döndürür.
+        Bulunamazsa sayaç değişmez (ardından tam eşleşme denenir).
+        """
+        if not self.semantic_enabled:
+            return None
+
+        doc_set = tuple(sorted(set(doc_ids)))
+        with self._lock:
+            keys = [
+                key for key, entry in self._entries.items()
+                if entry.doc_ids == doc_set and entry.q_vec is not None and not self._expired(entry)
+            ]
+            if not keys:
+                return None
+
+            vectors = np.stack([self._entries[key].q_vec for key in keys])
+            scores = vectors @ np.asarray(q_vec, dtype=np.float32)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+
+            self._entries.move_to_end(keys[best])
+            self.semantic_hits += 1
+            return self._entries[keys[best]]
+
+    def put(
+        self,
+        key: str,
+        answer: str,
+        contexts: List[str],
+        doc_ids: List[str],
+        q_vec: Optional[np.ndarray] = None
+    ):
+        doc_set = tuple(sorted(set(doc_ids)))
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = CacheEntry(answer, contexts, doc_set, q_vec)
+            for doc_id in doc_set:
+                self._by_doc.setdefault(doc_id, set()).add(key)
+
+            # En az kullanılan cevapları at (LRU)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_document(self, doc_id: str):
+        """
+        Doküman silindiğinde ona dayanan tüm cevapları önbellekten çıkarır.
+        """
+        with self._lock:
+            for key in list(self._by_doc.get(doc_id, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+ANSWER_CACHE = AnswerCache()
@@ -0,0 +1,169 @@
+import os
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+from services.document_service import PageText
+
+# --- AYARLAR ---
+# Parçalama yöntemi: sentence (cümle/paragraf sınırlarında, token bütçeli) veya fixed (500 karakterlik pencereler)
+CHUNKERS = ("sentence", "fixed")
+CHUNKER = os.getenv("DOCSAGE_CHUNKER", "sentence").lower()
+if CHUNKER not in CHUNKERS:
+    raise ValueError(f"Desteklenmeyen parçalama yöntemi: {CHUNKER} (seçenekler: {', '.join(CHUNKERS)})")
+# Bir parçadaki en fazla embedding-model token'ı ve parçalar arası örtüşme (token)
+CHUNK_TOKENS = int(os.getenv("DOCSAGE_CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("DOCSAGE_CHUNK_OVERLAP_TOKENS", "32"))
+# Parça bu orana dolduysa yeni paragraf yeni parçada başlar
+PARAGRAPH_MIN_FILL = 0.5
+# Cümle sonu bulunamayan metin (ör. noktalama içermeyen tablolar) bu uzunlukta zorla bölünür
+MAX_SENTENCE_CHARS = 4000
+
+# Cümle sonu (noktalama + kapanış tırnağı/parantezi + boşluk) veya paragraf arası (boş satır)
+_BOUNDARY_RE = re.compile(r"[.!?…]+[\"'”’»)\]]*(?P<ws>\s+)|(?P<para>\n[ \t]*\n\s*)")
+
+
+class Chunk(NamedTuple):
+    text: str
+    # Parçanın başladığı sayfa (1'den başlar, 0 = bilinmiyor)
+    page: int
+    # Sayfaların birleştirilmiş metnindeki [start, end) karakter aralığı
+    start: int
+    end: int
+
+
+class _Sentence(NamedTuple):
+    start: int
+    end: int
+    tokens: int
+    # Cümle yeni bir paragrafın başında mı
+    paragraph: bool
+
+
+def iter_sentence_chunks(
+    pages: Iterable[PageText],
+    tokenizer,
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> Iterator[Chunk]:
+    """
+    Sayfa metinlerini cümle ve paragraf sınırlarına göre, her biri en fazla max_tokens
+    (embedding modelinin tokenizer'ı ile) olan parçalara böler (generator).
+    Ardışık parçalar sondaki tam cümlelerle en fazla overlap_tokens kadar örtüşür;
+    tek başına sınırı aşan cümleler token sınırlarından bölünür.
+    Sayfalar birleştirilirken split_into_chunks'taki gibi boş sayfalar atlanır ve her sayfadan sonra "\\n" eklenir.
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens pozitif olmalı.")
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+
+    buffer = ""
+    # buffer[0]'ın birleştirilmiş metindeki konumu; scan: henüz cümlelere ayrılmamış ilk konum
+    buffer_start = 0
+    scan = 0
+    page_starts: List[Tuple[int, int]] = []
+    current: List[_Sentence] = []
+    current_tokens = 0
+    next_paragraph = True
+
+    def page_at(offset: int) -> int:
+        number = page_starts[0][1] if page_starts else 0
+        for page_start, page_number in page_starts:
+            if page_start > offset:
+                break
+            number = page_number
+        return number
+
+    def make_chunk(sentences: List[_Sentence]) -> Chunk:
+        start, end = sentences[0].start, sentences[-1].end
+        return Chunk(buffer[start - buffer_start:end - buffer_start], page_at(start), start, end)
+
+    def measure(spans: List[Tuple[int, int, bool]]) -> List[_Sentence]:
+        # Token sayıları tek bir batch tokenizer çağrısıyla ölçülür
+        texts = [buffer[s - buffer_start:e - buffer_start] for s, e, _ in spans]
+        counts = [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]] if texts else []
+        sentences = []
+        for (start, end, paragraph), tokens, text in zip(spans, counts, texts):
+            if tokens <= max_tokens:
+                sentences.append(_Sentence(start, end, tokens, paragraph))
+                continue
+            # Tek başına sınırı aşan cümle token sınırlarından parçalara bölünür
+            offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+            for i in range(0, len(offsets), max_tokens):
+                window = offsets[i:i + max_tokens]
+                sentences.append(_Sentence(
+                    start + window[0][0], start + window[-1][1], len(window), paragraph and i == 0
+                ))
+        return sentences
+
+    def split(stop: int, final: bool) -> List[Tuple[int, int, bool]]:
+        # [scan, stop) aralığındaki tamamlanmış cümleleri (boşluklar kırpılmış) çıkarır
+        nonlocal scan, next_paragraph
+        spans = []
+        local_stop = stop - buffer_start
+        for match in _BOUNDARY_RE.finditer(buffer, scan - buffer_start, local_stop):
+            if match.end() == local_stop and not final:
+                # Boşluk bir sonraki sayfada devam ediyor olabilir; sınır henüz kesin değil
+                break
+            end = buffer_start + (match.start("ws") if match.group("ws") is not None else match.start("para"))
+            spans.append((scan, end, next_paragraph))
+            whitespace = match.group("ws") if match.group("ws") is not None else match.group("para")
+            next_paragraph = match.group("para") is not None or whitespace.count("\n") >= 2
+            scan = buffer_start + match.end()
+        if final or stop - scan > MAX_SENTENCE_CHARS:
+            # Kalan metin (son cümle veya sınırsız uzun metin) tek cümle sayılır
+            cut = stop if final else buffer.rfind(" ", scan - buffer_start, local_stop) + buffer_start
+            if cut <= scan:
+                cut = stop
+            spans.append((scan, cut, next_paragraph))
+            next_paragraph = False
+            scan = cut
+        # Kenarlardaki boşlukları at; boş kalan cümleleri atla
+        trimmed = []
+        for start, end, paragraph in spans:
+            text = buffer[start - buffer_start:end - buffer_start]
+            left = len(text) - len(text.lstrip())
+            right = len(text.rstrip())
+            if right > left:
+                trimmed.append((start + left, start + right, paragraph))
+        return trimmed
+
+    def add(sentence: _Sentence) -> Iterator[Chunk]:
+        nonlocal current, current_tokens
+        full = current_tokens + sentence.tokens > max_tokens
+        new_paragraph = sentence.paragraph and current_tokens >= PARAGRAPH_MIN_FILL * max_tokens
+        if current and (full or new_paragraph):
+            yield make_chunk(current)
+            # Örtüşme: sondaki tam cümleler (paragraf değişiminde taşınmaz)
+            tail: List[_Sentence] = []
+            tail_tokens = 0
+            if not new_paragraph:
+                for previous in reversed(current[1:]):
+                    if tail_tokens + previous.tokens > overlap_tokens:
+                        break
+                    tail.insert(0, previous)
+                    tail_tokens += previous.tokens
+            while tail and tail_tokens + sentence.tokens > max_tokens:
+                tail_tokens -= tail.pop(0).tokens
+            current, current_tokens = tail, tail_tokens
+        current.append(sentence)
+        current_tokens += sentence.tokens
+
+    for page in pages:
+        if not page.text:
+            continue
+        page_starts.append((buffer_start + len(buffer), page.number))
+        buffer += page.text + "\n"
+
+        for sentence in measure(split(buffer_start + len(buffer), final=False)):
+            yield from add(sentence)
+
+        # Mevcut parçada veya henüz işlenmemiş metinde olmayan kısmı bırak
+        keep = min(current[0].start, scan) if current else scan
+        buffer = buffer[keep - buffer_start:]
+        buffer_start = keep
+        while len(page_starts) > 1 and page_starts[1][0] <= keep:
+            page_starts.pop(0)
+
+    for sentence in measure(split(buffer_start + len(buffer), final=True)):
+        yield from add(sentence)
+    if current:
+        yield make_chunk(current)
@@ -0,0 +1,90 @@
+import os
+import sys
+from typing import Iterator, List, Sequence, Union
+import numpy as np
+
+# --- AYARLAR ---
+# Embedding saklama modu: float32 (tam), float16 (yarım hassasiyet) veya
+# sq8 (doküman vektörleri float16, HNSW indeksinin kodları 8-bit scalar quantization;
+# flat indekste ayrı kod tutulmadığından sq8 float16 ile aynıdır)
+STORAGE_MODES = ("float32", "float16", "sq8")
+STORAGE_MODE = os.getenv("DOCSAGE_EMBEDDING_STORAGE", "float32").lower()
+if STORAGE_MODE not in STORAGE_MODES:
+    raise ValueError(f"Desteklenmeyen embedding saklama modu: {STORAGE_MODE} (seçenekler: {', '.join(STORAGE_MODES)})")
+# float32 dışındaki modlarda chunk metinleri de tek bir buffer'da tutulur
+COMPACT_STORAGE = STORAGE_MODE != "float32"
+
+
+def storage_dtype(mode: str = STORAGE_MODE) -> np.dtype:
+    """
+    Doküman vektörlerinin bellekte (ve diskte) tutulduğu veri tipi.
+    """
+    return np.dtype(np.float32 if mode == "float32" else np.float16)
+
+
+def compact_vectors(vectors: np.ndarray, mode: str = STORAGE_MODE) -> np.ndarray:
+    """
+    Vektörleri saklama tipine çevirir; tip zaten uygunsa (ör. memory-map) kopyalamaz.
+    """
+    dtype = storage_dtype(mode)
+    return vectors if vectors.dtype == dtype else vectors.astype(dtype)
+
+
+class ChunkTexts(Sequence[str]):
+    """
+    Chunk metinlerini tek bir UTF-8 buffer (bytes veya diskteki dosyanın mmap'i) ve offset dizisi olarak tutar.
+    Binlerce küçük str nesnesinin (her biri ~50 byte ek yük) yerine tek bir bytes nesnesi;
+    metin yalnızca erişildiğinde decode edilir.
+    """
+    def __init__(self, buffer: bytes, offsets: np.ndarray):
+        if len(offsets) == 0 or offsets[-1] != len(buffer):
+            raise ValueError("Offset dizisi buffer ile uyuşmuyor.")
+        self.buffer = buffer
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_texts(cls, texts: Sequence[str]) -> "ChunkTexts":
+        encoded = [t.encode("utf-8") for t in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self) -> int:
+        # Buffer bytes veya diskten memory-map edilmiş dosya (mmap) olabilir
+        buffer_bytes = sys.getsizeof(self.buffer) if isinstance(self.buffer, bytes) else len(self.buffer)
+        return buffer_bytes + self.offsets.nbytes
+
+
+def pack_texts(texts: Sequence[str]) -> Sequence[str]:
+    """
+    Kompakt modda metinleri ChunkTexts'e paketler, aksi halde listeyi olduğu gibi döndürür.
+    """
+    if COMPACT_STORAGE and not isinstance(texts, ChunkTexts):
+        return ChunkTexts.from_texts(texts)
+    return texts
+
+
+def texts_nbytes(texts: Sequence[str]) -> int:
+    """
+    Metin koleksiyonunun yaklaşık bellek kullanımı (liste ve str nesnelerinin ek yükü dahil).
+    """
+    if isinstance(texts, ChunkTexts):
+        return texts.nbytes
+    return sys.getsizeof(texts) + sum(sys.getsizeof(t) for t in texts)
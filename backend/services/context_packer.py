@@ -0,0 +1,122 @@
+import os
+from typing import List, Optional, Sequence
+import numpy as np
+
+from services.llm_loader import get_llm_tokenizer
+from services.prompts import MAX_PROMPT_TOKENS, build_messages
+
+# --- AYARLAR ---
+# Bağlam parçalarına ayrılan en fazla token sayısı
+CONTEXT_TOKEN_BUDGET = int(os.getenv("DOCSAGE_CONTEXT_TOKEN_BUDGET", "1536"))
+# Bütçeye sığmayan parça, en az bu kadar token'lık yer kaldıysa kırpılarak eklenir
+MIN_TRIM_TOKENS = 64
+# Parçalar birleştirilirken token sınırlarında oluşabilecek sapma payı
+SAFETY_TOKENS = 16
+# Parçalar arasındaki ayırıcının ("\n\n") token maliyeti
+SEPARATOR_TOKENS = 1
+
+
+def count_tokens(texts: Sequence[str]) -> np.ndarray:
+    """
+    Her metnin cevap modelinin tokenizer'ına göre token sayısı.
+    """
+    if not texts:
+        return np.zeros(0, dtype=np.int32)
+    tokenizer = get_llm_tokenizer()
+    ids = tokenizer(list(texts), add_special_tokens=False).input_ids
+    return np.array([len(x) for x in ids], dtype=np.int32)
+
+
+def prompt_overhead_tokens(question: str) -> int:
+    """
+    Bağlam hariç prompt'un (system prompt, soru ve asistan başlangıcı) token sayısı.
+    """
+    return int(prompt_overhead_tokens_batch([question])[0])
+
+
+def prompt_overhead_tokens_batch(questions: Sequence[str]) -> np.ndarray:
+    """
+    Birden fazla soru için prompt_overhead_tokens; tüm prompt'lar tek tokenizer çağrısıyla ölçülür.
+    """
+    if not questions:
+        return np.zeros(0, dtype=np.int32)
+    tokenizer = get_llm_tokenizer()
+    texts = [
+        tokenizer.apply_chat_template(build_messages(q, []), tokenize=False, add_generation_prompt=True)
+        for q in questions
+    ]
+    ids = tokenizer(texts, add_special_tokens=False).input_ids
+    return np.array([len(x) for x in ids], dtype=np.int32)
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    tokenizer = get_llm_tokenizer()
+    ids = tokenizer(text, add_special_tokens=False).input_ids
+    return tokenizer.decode(ids[:max_tokens]).strip()
+
+
+class PackedContext:
+    """
+    Token bütçesine göre seçilmiş bağlam parçaları ve kullanılan token sayıları.
+    """
+    def __init__(self, contexts: List[str], context_tokens: int, prompt_tokens: int,
+                 budget: int, dropped: int = 0, trimmed: int = 0):
+        self.contexts = contexts
+        self.context_tokens = context_tokens
+        self.prompt_tokens = prompt_tokens
+        self.budget = budget
+        self.dropped = dropped
+        self.trimmed = trimmed
+
+    def to_dict(self) -> dict:
+        return {
+            "context_tokens": self.context_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "budget": self.budget,
+            "dropped": self.dropped,
+            "trimmed": self.trimmed,
+        }
+
+
+def pack_contexts(
+    question: str,
+    contexts: List[str],
+    token_counts: Optional[Sequence[int]] = None,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    max_chunks: Optional[int] = None,
+    overhead: Optional[int] = None
+) -> PackedContext:
+    """
+    Skora göre sıralı bağlam parçalarını token bütçesini dolduracak şekilde seçer.
+    Soru ve prompt şablonu her zaman eksiksiz kalır; bütçe, prompt sınırından (MAX_PROMPT_TOKENS)
+    geriye kalan yerle de sınırlanır. Sığmayan parça ya kırpılır ya da atlanıp sıradakine geçilir.
+    token_counts verilmezse (ör. ingestion'da ölçülmemişse) burada hesaplanır;
+    overhead (prompt_overhead_tokens) önceden ölçüldüyse verilebilir.
+    """
+    if overhead is None:
+        overhead = prompt_overhead_tokens(question)
+    budget = max(0, min(budget, MAX_PROMPT_TOKENS - overhead - SAFETY_TOKENS))
+    if token_counts is None:
+        token_counts = count_tokens(contexts)
+
+    selected, used, dropped, trimmed = [], 0, 0, 0
+    for text, count in zip(contexts, token_counts):
+        if max_chunks is not None and len(selected) >= max_chunks:
+            break
+
+        cost = int(count) + (SEPARATOR_TOKENS if selected else 0)
+        remaining = budget - used
+        if cost <= remaining:
+            selected.append(text)
+            used += cost
+        elif remaining - SEPARATOR_TOKENS >= MIN_TRIM_TOKENS:
+            # Bütçenin kalanını en alakalı sığmayan parçanın başıyla doldur
+            keep = remaining - (SEPARATOR_TOKENS if selected else 0)
+            selected.append(trim_to_tokens(text, keep))
+            used += remaining
+            trimmed += 1
+            break
+        else:
+            dropped += 1
+
+    return PackedContext(selected, used, overhead + used, budget, dropped, trimmed)
@@ -1,30 +1,198 @@
+import mmap
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from io import BytesIO
+from typing import Callable, Iterator, List, NamedTuple, Optional, Union
 from pypdf import PdfReader
 import docx
 
-def extract_text_from_file(content: bytes, ext: str) -> str:
+# --- AYARLAR ---
+# Bu sayıda ve daha fazla sayfası olan PDF'ler süreç havuzunda paralel ayıklanır
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("DOCSAGE_PDF_PARALLEL_MIN_PAGES", "64"))
+# Sayfa ayıklama süreç sayısı (varsayılan: çekirdek sayısı)
+EXTRACT_PROCESSES = int(os.getenv("DOCSAGE_EXTRACT_PROCESSES", str(os.cpu_count() or 1)))
+# Bir sürece tek seferde verilen sayfa aralığı uzunluğu
+PAGES_PER_TASK = 16
+
+# İlerleme bildirimi: (işlenen sayfa, toplam sayfa)
+ProgressCallback = Callable[[int, int], None]
+# Dosya içeriği (bytes) veya diskteki dosyanın yolu
+Source = Union[bytes, str]
+
+
+class PageText(NamedTuple):
+    # Sayfa numarası 1'den başlar
+    number: int
+    text: str
+
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        with _POOL_LOCK:
+            if _POOL is None:
+                # spawn: alt süreçler yalnızca bu modülü (pypdf) yükler, torch/model belleğini kopyalamaz
+                _POOL = ProcessPoolExecutor(
+                    max_workers=max(1, EXTRACT_PROCESSES),
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _POOL
+
+
+def map_file(path: str) -> mmap.mmap:
+    """
+    Dosyayı salt okunur memory-map olarak açar; yalnızca okunan kısımlar belleğe gelir
+    ve bellek baskısında işletim sistemi bu sayfaları diskten yeniden okuyabilir.
+    """
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _open_pdf(source: Source) -> PdfReader:
+    # pypdf yol verilince dosyanın tamamını belleğe okur; bu yüzden dosya memory-map ile verilir
+    return PdfReader(map_file(source) if isinstance(source, str) else BytesIO(source))
+
+
+def _extract_pdf_range(path: str, start: int, stop: int) -> List[str]:
+    # Süreç havuzunda çalışır: PDF yalnızca xref tablosuyla açılır, sadece istenen sayfalar ayrıştırılır
+    reader = _open_pdf(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def iter_pdf_pages(source: Source, progress: Optional[ProgressCallback] = None) -> Iterator[PageText]:
+    """
+    PDF sayfalarının metnini sırayla üretir (generator). Büyük PDF'lerde sayfa aralıkları
+    süreç havuzuna dağıtılır; aynı anda yalnızca sınırlı sayıda aralık bellekte tutulur.
+    """
+    reader = _open_pdf(source)
+    total = len(reader.pages)
+
+    if total < PDF_PARALLEL_MIN_PAGES or EXTRACT_PROCESSES <= 1:
+        for i, page in enumerate(reader.pages, start=1):
+            yield PageText(i, page.extract_text() or "")
+            if progress:
+                progress(i, total)
+        return
+    del reader
+
+    # Alt süreçler dosyayı yoldan okur; bellekteki içerik bir kez geçici dosyaya yazılır
+    tmp_path = None
+    if not isinstance(source, str):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+            tmp.write(source)
+            tmp_path = tmp.name
+    path = source if isinstance(source, str) else tmp_path
+
+    pool = _pool()
+    ranges = iter(range(0, total, PAGES_PER_TASK))
+    pending = deque()
+    done = 0
+    try:
+        # Süreç başına en fazla iki aralık beklemede: hem tüm çekirdekler çalışır hem bellek sınırlı kalır
+        for _ in range(2 * max(1, EXTRACT_PROCESSES)):
+            start = next(ranges, None)
+            if start is None:
+                break
+            pending.append((start, pool.submit(_extract_pdf_range, path, start, min(start + PAGES_PER_TASK, total))))
+
+        while pending:
+            start, future = pending.popleft()
+            texts = future.result()
+            next_start = next(ranges, None)
+            if next_start is not None:
+                pending.append((next_start, pool.submit(
+                    _extract_pdf_range, path, next_start, min(next_start + PAGES_PER_TASK, total)
+                )))
+
+            for offset, text in enumerate(texts):
+                yield PageText(start + offset + 1, text)
+            done += len(texts)
+            if progress:
+                progress(done, total)
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if tmp_path is not None:
+            os.unlink(tmp_path)
+
+
+def iter_docx_pages(source: Source) -> Iterator[PageText]:
+    """
+    DOCX paragraflarını sayfa sayfa üretir. Sayfa numarası belgedeki açık sayfa sonlarına göre belirlenir.
+    """
+    document = docx.Document(source if isinstance(source, str) else BytesIO(source))
+    number, paragraphs = 1, []
+    for para in document.paragraphs:
+        paragraphs.append(para.text)
+        if para._p.xpath('.//w:br[@w:type="page"]'):
+            yield PageText(number, "\n".join(paragraphs))
+            number, paragraphs = number + 1, []
+    if paragraphs:
+        yield PageText(number, "\n".join(paragraphs))
+
+
+def iter_pages(source: Source, ext: str, progress: Optional[ProgressCallback] = None) -> Iterator[PageText]:
+    """
+    Dosyanın sayfalarını (sayfa numarası, metin) olarak sırayla üretir.
+    Desteklenen uzantılar: pdf, docx.
+    """
+    ext = ext.lower()
+    if ext == "pdf":
+        yield from iter_pdf_pages(source, progress)
+    elif ext == "docx":
+        yield from iter_docx_pages(source)
+        if progress:
+            progress(1, 1)
+    else:
+        raise ValueError(f"Desteklenmeyen dosya formatı: {ext}")
+
+
+def extract_pages(source: Source, ext: str) -> List[PageText]:
+    """
+    Dosyanın tüm sayfalarını tek süreçte, sayfa aralıklarına bölmeden ayıklar.
+    Toplu yüklemede süreç havuzuna dosya başına bir görev olarak verilir.
+    """
+    if ext.lower() == "pdf":
+        return [PageText(i, page.extract_text() or "") for i, page in enumerate(_open_pdf(source).pages, start=1)]
+    return list(iter_pages(source, ext))
+
+
+def submit_extraction(source: Source, ext: str) -> Future:
+    """
+    Dosyanın ayıklanmasını süreç havuzuna verir; Future sonucu PageText listesidir.
+    """
+    return _pool().submit(extract_pages, source, ext)
+
+
+def extract_text_from_file(content: Source, ext: str, progress: Optional[ProgressCallback] = None) -> str:
     """
     Verilen dosya içeriğinden (bytes) metin ayıklar.
     Desteklenen uzantılar: pdf, docx.
     """
     ext = ext.lower()
     if ext == "pdf":
-        return extract_text_from_pdf(content)
+        return extract_text_from_pdf(content, progress)
     elif ext == "docx":
-        return extract_text_from_docx(content)
+        text = extract_text_from_docx(content)
+        if progress:
+            progress(1, 1)
+        return text
     else:
         raise ValueError(f"Desteklenmeyen dosya formatı: {ext}")
 
-def extract_text_from_pdf(content: bytes) -> str:
-    text = ""
-    reader = PdfReader(BytesIO(content))
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text
-
-def extract_text_from_docx(content: bytes) -> str:
-    file_stream = BytesIO(content)
-    doc = docx.Document(file_stream)
-    return "\n".join([para.text for para in doc.paragraphs])
\ No newline at end of file
+
+def extract_text_from_pdf(content: Source, progress: Optional[ProgressCallback] = None) -> str:
+    # Parçalar listede toplanıp tek seferde birleştirilir (tekrarlı += kopyalamasını önler)
+    return "".join(page.text + "\n" for page in iter_pdf_pages(content, progress) if page.text)
+
+
+def extract_text_from_docx(content: Source) -> str:
+    return "\n".join(page.text for page in iter_docx_pages(content))
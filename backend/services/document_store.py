@@ -0,0 +1,366 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional
+import numpy as np
+from services.compact_storage import ChunkTexts
+from services.document_service import map_file
+from services.documents import DocumentObject
+from services.keyword_index import KeywordIndex
+
+# --- AYARLAR ---
+# Dokümanların kalıcı olarak saklandığı dizin
+DATA_DIR = os.getenv("DOCSAGE_DATA_DIR", "data/documents")
+# Bellekte tutulan dokümanların toplam bellek bütçesi (MB, 0 = sınırsız);
+# aşılınca en uzun süredir sorgulanmayan dokümanlar bellekten çıkarılır (diskte kalır)
+DOCUMENT_MEMORY_MB = float(os.getenv("DOCSAGE_DOCUMENT_MEMORY_MB", "2048"))
+
+VECTORS_FILE = "vectors.npy"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+TOKEN_COUNTS_FILE = "token_counts.npy"
+PAGES_FILE = "pages.npy"
+SPANS_FILE = "spans.npy"
+META_FILE = "meta.json"
+# Keyword (BM25) indeksinin postings dizileri ve terim ID'si sırasıyla sözlük (satır başına bir terim)
+KEYWORD_TERMS_FILE = "keyword_terms.txt"
+KEYWORD_ARRAY_FILES = {
+    "chunk_ids": "keyword_chunk_ids.npy",
+    "counts": "keyword_counts.npy",
+    "indptr": "keyword_indptr.npy",
+    "chunk_lengths": "keyword_chunk_lengths.npy",
+}
+
+
+def write_document(root: str, doc: DocumentObject):
+    """
+    Dokümanın chunk'larını, metadata'sını ve embedding matrisini diske yazar.
+    Metinler tek bir UTF-8 buffer + offset dizisi olarak, vektörler saklama tipinde .npy olarak saklanır.
+    Yazma önce geçici dizine yapılır, ardından atomik olarak yerine taşınır.
+    """
+    # Kompakt modda metinler zaten paketli; değilse burada paketlenir
+    texts = doc.chunks if isinstance(doc.chunks, ChunkTexts) else ChunkTexts.from_texts(doc.chunks)
+    vectors = np.asarray(doc.embedding_store.vectors)
+
+    meta = dict(doc.metadata)
+    meta.update({
+        "doc_id": doc.doc_id,
+        "model_name": doc.embedding_store.model_name,
+        "num_chunks": len(doc.chunks),
+        "dim": int(vectors.shape[1]),
+        "vector_dtype": str(vectors.dtype),
+    })
+    meta.setdefault("created_at", time.time())
+
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{doc.doc_id}.", dir=root)
+    try:
+        np.save(os.path.join(tmp_dir, VECTORS_FILE), vectors)
+        np.save(os.path.join(tmp_dir, OFFSETS_FILE), texts.offsets)
+        np.save(os.path.join(tmp_dir, TOKEN_COUNTS_FILE), doc.token_counts)
+        np.save(os.path.join(tmp_dir, PAGES_FILE), doc.pages)
+        np.save(os.path.join(tmp_dir, SPANS_FILE), doc.spans)
+        keyword_index = doc.keyword_index
+        for attr, name in KEYWORD_ARRAY_FILES.items():
+            np.save(os.path.join(tmp_dir, name), getattr(keyword_index, attr))
+        with open(os.path.join(tmp_dir, KEYWORD_TERMS_FILE), "w", encoding="utf-8") as f:
+            f.write("\n".join(keyword_index.terms()))
+        with open(os.path.join(tmp_dir, TEXTS_FILE), "wb") as f:
+            f.write(texts.buffer)
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_dir, os.path.join(root, doc.doc_id))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def read_meta(root: str, doc_id: str) -> Dict:
+    with open(os.path.join(root, doc_id, META_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_keyword_index(doc_dir: str) -> Optional[KeywordIndex]:
+    """
+    Kayıtlı keyword postings'i memory-map ile açar; eski kayıtlarda yoksa None (yüklemede yeniden kurulur).
+    """
+    terms_path = os.path.join(doc_dir, KEYWORD_TERMS_FILE)
+    if not os.path.isfile(terms_path):
+        return None
+    with open(terms_path, encoding="utf-8") as f:
+        text = f.read()
+    arrays = {attr: np.load(os.path.join(doc_dir, name), mmap_mode="r") for attr, name in KEYWORD_ARRAY_FILES.items()}
+    return KeywordIndex.from_arrays(text.split("\n") if text else [], **arrays)
+
+
+def read_document(root: str, doc_id: str) -> DocumentObject:
+    """
+    Diskteki dokümanı yeniden encode etmeden yükler. Vektörler, chunk metinleri (texts.bin) ve
+    keyword postings memory-map ile açılır: aynı dosyayı okuyan worker süreçleri bu sayfaları
+    page cache'te paylaşır (flat indeks vektörlerin ayrı kopyasını tutmaz). Worker başına özel kalanlar:
+    keyword sözlüğü (dict), hnsw / ivfpq indekslerinin Faiss kodları ve kayıttaki tip saklama
+    modundan farklıysa bellekte dönüştürülen vektörler.
+    """
+    doc_dir = os.path.join(root, doc_id)
+    meta = read_meta(root, doc_id)
+
+    vectors = np.load(os.path.join(doc_dir, VECTORS_FILE), mmap_mode="r")
+    offsets = np.load(os.path.join(doc_dir, OFFSETS_FILE), mmap_mode="r")
+    # Metinler decode edilmez; ChunkTexts yalnızca erişilen parçayı dosyadan okur
+    chunks = ChunkTexts(map_file(os.path.join(doc_dir, TEXTS_FILE)), offsets)
+
+    # Eski kayıtlarda token sayıları yoksa yükleme sırasında yeniden ölçülür
+    token_counts_path = os.path.join(doc_dir, TOKEN_COUNTS_FILE)
+    token_counts = np.load(token_counts_path) if os.path.isfile(token_counts_path) else None
+    pages_path = os.path.join(doc_dir, PAGES_FILE)
+    pages = np.load(pages_path) if os.path.isfile(pages_path) else None
+    spans_path = os.path.join(doc_dir, SPANS_FILE)
+    spans = np.load(spans_path) if os.path.isfile(spans_path) else None
+
+    return DocumentObject(
+        chunks=chunks,
+        doc_id=doc_id,
+        model_name=meta["model_name"],
+        metadata=meta,
+        vectors=vectors,
+        token_counts=token_counts,
+        pages=pages,
+        spans=spans,
+        keyword_index=read_keyword_index(doc_dir)
+    )
+
+
+class DocumentStore:
+    """
+    Diskte kalıcı, bellekte tembel (lazy) yüklenen doküman deposu.
+    Başlangıçta yalnızca dizin listelenir; bir doküman ilk erişildiğinde diskten okunur.
+    Başka bir worker'ın yüklediği dokümanlar da ilk erişimde diskten bulunur.
+    Bellekteki dokümanlar bellek bütçesiyle sınırlıdır: bütçe aşılınca en uzun süredir
+    erişilmeyenler (LRU) bellekten ve vektör indeksinden çıkarılır, sonraki erişimde diskten yeniden yüklenir.
+    Bir isteğin kullandığı dokümanlar pin / unpin ile sabitlenir ve bu sürede çıkarılmaz.
+    Başka bir worker'ın sildiği dokümanlar erişimde diskte bulunamayınca bellekten de atılır.
+    Kök dizin ilk yazmada oluşturulur.
+    """
+    def __init__(self, root: str = DATA_DIR, max_mb: float = DOCUMENT_MEMORY_MB):
+        self.root = root
+        self.max_bytes = int(max_mb * 2**20)
+        # Erişim sırasına göre (en eski başta) bellekteki dokümanlar
+        self._docs: "OrderedDict[str, DocumentObject]" = OrderedDict()
+        # doc_id -> bellekteki boyut (byte) ve son erişim zamanı
+        self._sizes: Dict[str, int] = {}
+        self._accessed: Dict[str, float] = {}
+        # doc_id -> dokümanı kullanmakta olan istek sayısı
+        self._pins: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        # Doküman silindiğinde çağrılacak fonksiyonlar (ör. cevap önbelleğini temizlemek için)
+        self._remove_listeners: List[Callable[[str], None]] = []
+        # Dosya içeriği hash'i -> doc_id (aynı dosya tekrar yüklendiğinde yeniden işlenmez)
+        self._by_hash: Optional[Dict[str, str]] = None
+        self.loads = 0
+        self.evictions = 0
+
+    def add_remove_listener(self, listener: Callable[[str], None]):
+        self._remove_listeners.append(listener)
+
+    def _on_disk(self, doc_id: str) -> bool:
+        # Geçici dizinler "." ile başlar, ID'ler ise dizin ayıracı içeremez
+        if not doc_id or doc_id.startswith(".") or os.sep in doc_id or "/" in doc_id:
+            return False
+        return os.path.isfile(os.path.join(self.root, doc_id, META_FILE))
+
+    def _hash_index(self) -> Dict[str, str]:
+        # İlk kullanımda diskteki metadata dosyalarından bir kez kurulur
+        if self._by_hash is None:
+            with self._lock:
+                if self._by_hash is None:
+                    index = {}
+                    for doc_id in self.ids():
+                        content_hash = read_meta(self.root, doc_id).get("content_hash")
+                        if content_hash:
+                            index[content_hash] = doc_id
+                    self._by_hash = index
+        return self._by_hash
+
+    def find_by_hash(self, content_hash: str) -> Optional[str]:
+        """
+        Aynı içeriğe (dosya byte'larının SHA-256'sı) sahip kayıtlı dokümanın ID'si.
+        """
+        doc_id = self._hash_index().get(content_hash)
+        if doc_id is not None and doc_id not in self:
+            # Başka bir worker silmiş olabilir
+            self._by_hash.pop(content_hash, None)
+            return None
+        return doc_id
+
+    def __contains__(self, doc_id: str) -> bool:
+        # Bellekteki dokümanlar da hep diskte yazılıdır; silinip silinmediği diskten anlaşılır
+        return self._on_disk(doc_id)
+
+    def __getitem__(self, doc_id: str) -> DocumentObject:
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            on_disk = self._on_disk(doc_id)
+            if doc is None:
+                if not on_disk:
+                    raise KeyError(doc_id)
+                doc = read_document(self.root, doc_id)
+                self.loads += 1
+                self._keep(doc)
+                return doc
+            if on_disk:
+                self._accessed[doc_id] = time.time()
+                self._docs.move_to_end(doc_id)
+                return doc
+            # Başka bir worker silmiş: bellekteki kopya ve indeksteki vektörleri atılır
+            self._forget(doc_id).remove()
+        for listener in self._remove_listeners:
+            listener(doc_id)
+        raise KeyError(doc_id)
+
+    def pin(self, doc_ids: List[str]) -> List[DocumentObject]:
+        """
+        Dokümanları yükler ve unpin çağrılana kadar bellekten çıkarılmamaları için sabitler.
+        Biri bulunamazsa hiçbiri sabitlenmez ve KeyError fırlatılır.
+        """
+        documents = []
+        with self._lock:
+            try:
+                for doc_id in doc_ids:
+                    documents.append(self[doc_id])
+                    self._pins[doc_id] = self._pins.get(doc_id, 0) + 1
+            except KeyError:
+                self.unpin([doc.doc_id for doc in documents])
+                raise
+        return documents
+
+    def unpin(self, doc_ids: List[str]):
+        """
+        pin ile sabitlenen dokümanları bırakır; bütçe aşılmışsa ertelenen çıkarmalar yapılır.
+        """
+        with self._lock:
+            for doc_id in doc_ids:
+                count = self._pins.get(doc_id, 0) - 1
+                if count > 0:
+                    self._pins[doc_id] = count
+                else:
+                    self._pins.pop(doc_id, None)
+            self._evict()
+
+    def __setitem__(self, doc_id: str, doc: DocumentObject):
+        if doc_id != doc.doc_id:
+            raise ValueError("doc_id, DocumentObject.doc_id ile aynı olmalı.")
+        with self._lock:
+            write_document(self.root, doc)
+            self._keep(doc)
+            content_hash = doc.metadata.get("content_hash")
+            if content_hash and self._by_hash is not None:
+                self._by_hash[content_hash] = doc_id
+
+    def __delitem__(self, doc_id: str):
+        with self._lock:
+            if doc_id not in self:
+                raise KeyError(doc_id)
+            doc = self._forget(doc_id)
+            if doc is not None:
+                doc.remove()
+            shutil.rmtree(os.path.join(self.root, doc_id), ignore_errors=True)
+            if self._by_hash is not None:
+                for content_hash in [h for h, d in self._by_hash.items() if d == doc_id]:
+                    del self._by_hash[content_hash]
+        for listener in self._remove_listeners:
+            listener(doc_id)
+
+    def _keep(self, doc: DocumentObject):
+        # Dokümanı en son erişilen olarak belleğe alır ve bütçe aşıldıysa eskileri çıkarır.
+        # Aynı ID'nin eski nesnesinin vektörleri indekste zaten yenisiyle değiştirilmiştir.
+        self._forget(doc.doc_id)
+        size = doc.memory_bytes()["total"]
+        self._docs[doc.doc_id] = doc
+        self._sizes[doc.doc_id] = size
+        self._accessed[doc.doc_id] = time.time()
+        self._bytes += size
+        self._evict()
+
+    def _forget(self, doc_id: str) -> Optional[DocumentObject]:
+        doc = self._docs.pop(doc_id, None)
+        self._bytes -= self._sizes.pop(doc_id, 0)
+        self._accessed.pop(doc_id, None)
+        return doc
+
+    def _evict(self):
+        if self.max_bytes <= 0 or self._bytes <= self.max_bytes:
+            return
+        # En son erişilen doküman bütçeden büyük olsa bile bellekte kalır; kullanımdakiler atlanır
+        for doc_id in list(self._docs)[:-1]:
+            if self._bytes <= self.max_bytes:
+                break
+            if self._pins.get(doc_id):
+                continue
+            # Dosyalar diskte kalır; silme dinleyicileri (cevap önbelleği) çağrılmaz
+            self._forget(doc_id).remove()
+            self.evictions += 1
+
+    def info(self, doc_id: str) -> Dict:
+        """
+        Diskteki metadata ile bellekte olup olmadığı, bileşen bazında bellek kullanımı ve
+        son erişim zamanı. Dokümanı yüklemez ve erişim sırasını değiştirmez. Yoksa KeyError.
+        """
+        try:
+            meta = read_meta(self.root, doc_id) if self._on_disk(doc_id) else None
+        except FileNotFoundError:
+            # Bu arada silinmiş olabilir
+            meta = None
+        if meta is None:
+            raise KeyError(doc_id)
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            return {
+                **meta,
+                "resident": doc is not None,
+                "memory_bytes": doc.memory_bytes() if doc is not None else None,
+                "last_accessed_at": self._accessed.get(doc_id) if doc is not None else None,
+            }
+
+    def resident(self) -> Dict[str, int]:
+        """
+        Bellekte yüklü doküman ve chunk sayıları ile toplam bellek kullanımı (byte).
+        """
+        with self._lock:
+            docs = list(self._docs.values())
+            total = self._bytes
+        return {
+            "documents": len(docs),
+            "chunks": sum(len(doc.chunks) for doc in docs),
+            "bytes": total
+        }
+
+    def stats(self) -> Dict:
+        """
+        Bellek bütçesi, kullanım ve diskten yükleme / bellekten çıkarma sayaçları.
+        """
+        with self._lock:
+            return {
+                **self.resident(),
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+    def ids(self) -> List[str]:
+        """
+        Diskte kayıtlı tüm doküman ID'lerini döndürür.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return [d for d in os.listdir(self.root) if self._on_disk(d)]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids())
+
+    def __len__(self) -> int:
+        return len(self.ids())
@@ -1,5 +1,13 @@
-from typing import List
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import uuid
+import numpy as np
+from services.chunker import CHUNK_TOKENS, CHUNKER, Chunk, iter_sentence_chunks
+from services.compact_storage import ChunkTexts, pack_texts, texts_nbytes
+from services.context_packer import count_tokens
+from services.document_service import PageText
 from services.embedding_service import EmbeddingStore
+from services.keyword_index import KeywordIndex
+from services.model_registry import DEFAULT_EMBEDDING_MODEL, get_embedding_model
 
 def split_into_chunks(
     text: str,
@@ -30,23 +38,161 @@ def split_into_chunks(
 
     return chunks
 
+def iter_chunks(
+    pages: Iterable[PageText],
+    max_chars: int = 500,
+    overlap: int = 100
+) -> Iterator[Chunk]:
+    """
+    split_into_chunks'ın akış (generator) hali: sayfalar geldikçe aynı pencerelerle
+    parçaları (başladığı sayfa ve pencerenin karakter aralığıyla) üretir.
+    Bellekte yalnızca henüz işlenmemiş metin tutulur.
+    """
+    step = max_chars - overlap if 0 < overlap < max_chars else max_chars
+    buffer = ""
+    # buffer[0]'ın tüm metindeki konumu ve (sayfanın başladığı konum, sayfa numarası) listesi
+    buffer_start = 0
+    page_starts: List[Tuple[int, int]] = []
+    start = 0
+
+    def page_at(offset: int) -> int:
+        number = page_starts[0][1]
+        for page_start, page_number in page_starts:
+            if page_start > offset:
+                break
+            number = page_number
+        return number
+
+    for page in pages:
+        # split_into_chunks'a verilen metinde olduğu gibi boş sayfalar atlanır
+        if not page.text:
+            continue
+        page_starts.append((buffer_start + len(buffer), page.number))
+        buffer += page.text + "\n"
+
+        # Pencere tamamen dolduysa parçayı üret
+        while start + max_chars <= buffer_start + len(buffer):
+            local = start - buffer_start
+            yield Chunk(buffer[local:local + max_chars].strip(), page_at(start), start, start + max_chars)
+            start += step
+
+        # İşlenen metni ve artık gerekmeyen sayfa başlangıçlarını bırak
+        buffer = buffer[start - buffer_start:]
+        buffer_start = start
+        while len(page_starts) > 1 and page_starts[1][0] <= start:
+            page_starts.pop(0)
+
+    # Kalan metin (son, eksik pencereler)
+    end_of_text = buffer_start + len(buffer)
+    while start < end_of_text:
+        local = start - buffer_start
+        yield Chunk(buffer[local:local + max_chars].strip(), page_at(start), start, min(start + max_chars, end_of_text))
+        start += step
+
+def iter_document_chunks(
+    pages: Iterable[PageText],
+    model_name: str = DEFAULT_EMBEDDING_MODEL
+) -> Iterator[Chunk]:
+    """
+    Ayarlı parçalama yöntemiyle (DOCSAGE_CHUNKER) sayfaları parçalara böler.
+    sentence yönteminde parça boyutu embedding modelinin tokenizer'ı ile ölçülür ve
+    modelin girdi sınırını aşmaz.
+    """
+    if CHUNKER == "fixed":
+        yield from iter_chunks(pages)
+        return
+
+    model = get_embedding_model(model_name)
+    max_tokens = CHUNK_TOKENS
+    if getattr(model, "max_seq_length", None):
+        # [CLS] ve [SEP] için iki token ayrılır
+        max_tokens = min(max_tokens, model.max_seq_length - 2)
+    yield from iter_sentence_chunks(pages, model.tokenizer, max_tokens)
+
+def is_meaningful_chunk(chunk: str) -> bool:
+    # Çok kısa veya boş parçalar indekslenmez
+    return bool(chunk) and len(chunk.strip()) > 20
+
 class DocumentObject:
     """
     Tek bir dokümanın işlenmiş halini temsil eder.
     Metin parçalarını (chunks) saklar ve bunlar için vektör veritabanını (EmbeddingStore) yönetir.
     """
-    def __init__(self, chunks: List[str]):
-        # Çok kısa veya boş parçaları temizle
-        cleaned_chunks = [
-            c.strip() for c in chunks
-            if c and c.strip() and len(c.strip()) > 20
-        ]
+    def __init__(
+        self,
+        chunks: Sequence[str],
+        doc_id: Optional[str] = None,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        metadata: Optional[Dict] = None,
+        vectors: Optional[np.ndarray] = None,
+        token_counts: Optional[np.ndarray] = None,
+        pages: Optional[List[int]] = None,
+        spans: Optional[np.ndarray] = None,
+        keyword_index: Optional[KeywordIndex] = None,
+        progress: Optional[Callable[[int, int], None]] = None
+    ):
+        if pages is None:
+            pages = [0] * len(chunks)
+        if spans is None:
+            spans = [(-1, -1)] * len(chunks)
+        if isinstance(chunks, ChunkTexts):
+            # Paketli parçalar (diskten memory-map ile yüklenen doküman) kaydedilmeden önce temizlenmiştir;
+            # metinler decode edilmeden olduğu gibi kullanılır
+            self.chunks = chunks
+            self.pages = np.asarray(pages, dtype=np.int32)
+            self.spans = np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+        else:
+            # Çok kısa veya boş parçaları temizle (sayfa numaraları ve aralıklar parçalarla hizalı kalır)
+            kept = [(c.strip(), p, s) for c, p, s in zip(chunks, pages, spans) if is_meaningful_chunk(c)]
+            # Kompakt modda metinler tek bir buffer'da (ChunkTexts) tutulur
+            self.chunks = pack_texts([c for c, _, _ in kept])
+            # Her parçanın başladığı sayfa (0 = bilinmiyor)
+            self.pages = np.array([p for _, p, _ in kept], dtype=np.int32)
+            # Her parçanın birleştirilmiş metindeki [start, end) karakter aralığı (-1 = bilinmiyor)
+            self.spans = np.array([s for _, _, s in kept], dtype=np.int64).reshape(-1, 2)
 
-        if not cleaned_chunks:
+        if not len(self.chunks):
             raise ValueError("Dokümandan anlamlı metin çıkarılamadı.")
 
-        self.chunks = cleaned_chunks
+        self.doc_id = doc_id or str(uuid.uuid4())
+        self.metadata = metadata or {}
         
-        # Her dokümanın kendi mini vektör deposu (store) olur
-        self.embedding_store = EmbeddingStore()
-        self.embedding_store.build_index(cleaned_chunks)
\ No newline at end of file
+        # Vektörler global indekse bu dokümanın ID'siyle eklenir, model tüm dokümanlarca paylaşılır
+        self.embedding_store = EmbeddingStore(self.doc_id, model_name)
+        if vectors is None:
+            self.embedding_store.build_index(self.chunks, progress=progress)
+        else:
+            # Diskten yüklenen doküman: vektörler hazır, yeniden encode edilmez
+            self.embedding_store.add_vectors(self.chunks, vectors)
+
+        # Keyword araması için ters indeks bir kez kurulur (diskten yüklenende kayıtlı postings kullanılır)
+        if keyword_index is None or keyword_index.num_chunks != len(self.chunks):
+            keyword_index = KeywordIndex(list(self.chunks))
+        self.keyword_index = keyword_index
+
+        # Bağlam paketleme için her parçanın LLM token sayısı bir kez ölçülür
+        if token_counts is None or len(token_counts) != len(self.chunks):
+            token_counts = count_tokens(list(self.chunks))
+        self.token_counts = np.asarray(token_counts, dtype=np.int32)
+
+    def memory_bytes(self) -> Dict[str, int]:
+        """
+        Dokümanın bellekteki yaklaşık boyutu (byte), bileşenlerine göre.
+        Diskten memory-map ile açılan vektörler de tam boyutuyla sayılır.
+        """
+        store = self.embedding_store
+        usage = {
+            "vectors": int(store.vectors.nbytes) if store.vectors is not None else 0,
+            "vector_index": store.index.document_bytes(self.doc_id),
+            "texts": texts_nbytes(self.chunks),
+            "keyword_index": self.keyword_index.nbytes,
+            "chunk_metadata": self.token_counts.nbytes + self.pages.nbytes + self.spans.nbytes,
+        }
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def remove(self):
+        """
+        Dokümanı global vektör indeksinden çıkarır.
+        """
+        self.embedding_store.remove()
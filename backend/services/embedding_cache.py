@@ -0,0 +1,90 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from services.compact_storage import storage_dtype
+
+# --- AYARLAR ---
+# Chunk embedding önbelleğinin bellek sınırı (MB, 0 = kapalı)
+EMBEDDING_CACHE_MB = float(os.getenv("DOCSAGE_EMBEDDING_CACHE_MB", "64"))
+
+
+def text_key(model_name: str, text: str) -> bytes:
+    """
+    Aynı metin farklı modellerde farklı vektör verir; anahtar model adını da içerir.
+    """
+    return hashlib.blake2b(f"{model_name}\x1f{text}".encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """
+    Chunk metninin hash'i -> embedding önbelleği. Aynı dosyanın farklı kopyaları veya
+    dokümanlar arası ortak bölümler (ör. standart giriş bölümleri) yeniden encode edilmez.
+    Toplam vektör belleğine göre LRU ile sınırlıdır.
+    """
+    def __init__(self, max_mb: float = EMBEDDING_CACHE_MB):
+        self.max_bytes = int(max_mb * 2**20)
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def lookup(self, keys: List[bytes]) -> Tuple[List[Optional[np.ndarray]], List[int]]:
+        """
+        Her anahtar için önbellekteki vektörü (yoksa None) ve eksik olanların indekslerini döndürür.
+        """
+        found: List[Optional[np.ndarray]] = []
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._entries.get(key)
+                if vector is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                found.append(vector)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        if not self.enabled:
+            return
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                if key in self._entries:
+                    continue
+                # Büyük batch matrisini canlı tutmamak için satır kopyalanır (saklama tipinde)
+                vector = np.array(vector, dtype=storage_dtype())
+                self._entries[key] = vector
+                self._bytes += vector.nbytes
+
+            # Bellek sınırı aşılırsa en uzun süredir kullanılmayan vektörleri at (LRU)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+EMBEDDING_CACHE = EmbeddingCache()
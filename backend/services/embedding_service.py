@@ -1,58 +1,112 @@
-from typing import List
-from sentence_transformers import SentenceTransformer
+from typing import Callable, List, Optional, Sequence
 import numpy as np
-import faiss
+from services.compact_storage import compact_vectors
+from services.embedding_cache import EMBEDDING_CACHE, text_key
+from services.model_registry import DEFAULT_EMBEDDING_MODEL, get_embedding_model
+from services.vector_index import get_vector_index
+
+# Tek seferde encode edilen chunk sayısı (ilerleme bu aralıklarla bildirilir)
+ENCODE_BATCH_SIZE = 64
 
 class EmbeddingStore:
     """
-    Metinleri vektörlere (embedding) dönüştürür ve Faiss kullanarak
-    hızlı benzerlik araması (similarity search) yapılmasını sağlar.
+    Bir dokümanın metinlerini vektörlere (embedding) dönüştürür ve bu vektörleri
+    tüm dokümanların paylaştığı global Faiss indeksine kaydeder.
     """
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        # Hafif ve hızlı bir model kullanıyoruz (CPU dostu)
-        self.model = SentenceTransformer(model_name)
-        self.index = None
+    def __init__(self, doc_id: str, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        # Model her doküman için yeniden yüklenmez, paylaşılan registry'den ödünç alınır
+        self.doc_id = doc_id
+        self.model_name = model_name
+        self.model = get_embedding_model(model_name)
+        self.index = get_vector_index(model_name)
+        self.vectors = None
         self.texts = []
 
-    def build_index(self, texts: List[str]):
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Metinleri birim uzunluğa normalize edilmiş float32 vektörlere çevirir.
+        Normalize vektörlerde iç çarpım doğrudan kosinüs benzerliğini verir.
         """
-        Verilen metin listesi için vektör indeksi oluşturur.
+        embeddings = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def encode_chunks(self, texts: List[str]) -> np.ndarray:
+        """
+        Doküman parçalarını encode eder; daha önce görülmüş (hash'i önbellekte olan)
+        parçalar için modeli çağırmaz, yalnızca yeni parçalar encode edilir.
+        """
+        if not EMBEDDING_CACHE.enabled:
+            return self.encode(texts)
+
+        keys = [text_key(self.model_name, t) for t in texts]
+        vectors, missing = EMBEDDING_CACHE.lookup(keys)
+        if missing:
+            # Aynı batch içinde tekrar eden metinler de tek kez encode edilir
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = self.encode(unique)
+            by_text = dict(zip(unique, encoded))
+            for i in missing:
+                vectors[i] = by_text[texts[i]]
+            EMBEDDING_CACHE.put_many([text_key(self.model_name, t) for t in unique], encoded)
+        return np.stack(vectors).astype(np.float32, copy=False)
+
+    def build_index(self, texts: Sequence[str], progress: Optional[Callable[[int, int], None]] = None):
+        """
+        Verilen metin listesini vektöre çevirir ve global indekse ekler.
+        progress verilirse her batch sonrası (encode edilen, toplam) ile çağrılır.
         """
         if not texts:
             raise ValueError("Index oluşturmak için metin yok.")
 
-        # Metinleri vektöre çevir
-        embeddings = self.model.encode(texts)
+        # Metinleri batch'ler halinde vektöre çevir
+        batches = []
+        for start in range(0, len(texts), ENCODE_BATCH_SIZE):
+            batches.append(self.encode_chunks(texts[start:start + ENCODE_BATCH_SIZE]))
+            if progress:
+                progress(min(start + ENCODE_BATCH_SIZE, len(texts)), len(texts))
+        embeddings = np.concatenate(batches)
 
         # Hata kontrolü
         if embeddings.ndim != 2 or embeddings.shape[0] == 0:
             raise ValueError("Geçerli embedding üretilemedi.")
 
-        dim = embeddings.shape[1]
+        self.add_vectors(texts, embeddings)
 
-        # Faiss L2 (Öklid mesafesi) indeksi oluştur
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(embeddings)
+    def add_vectors(self, texts: Sequence[str], vectors: np.ndarray):
+        """
+        Önceden hesaplanmış (ör. diskten memory-map ile okunan) vektörleri yeniden
+        encode etmeden global indekse ekler. Vektörler saklama moduna (float32 / float16) çevrilir.
+        """
+        if len(texts) != vectors.shape[0]:
+            raise ValueError("Metin ve vektör sayıları uyuşmuyor.")
+        vectors = compact_vectors(vectors)
+
+        # Vektörler global indekse bu dokümanın ID aralığıyla eklenir
+        self.index.add_document(self.doc_id, vectors)
 
-        # Metinleri hafızada tut (sonuçları döndürmek için)
+        # Vektörleri ve metinleri hafızada tut (yeniden encode etmemek için)
+        self.vectors = vectors
         self.texts = texts
 
+    def remove(self):
+        """
+        Dokümanın vektörlerini global indeksten siler.
+        """
+        self.index.remove_document(self.doc_id)
+
+    def search_by_vector(self, q_vec: np.ndarray, k: int = 5):
+        """
+        Önceden encode edilmiş (normalize) sorgu vektörüne bu doküman içinde en benzer
+        'k' parçayı chunk ID'si ve kosinüs skoru ile birlikte döndürür.
+        """
+        hits = self.index.search(q_vec, k=k, doc_ids=[self.doc_id])[0]
+        return [
+            {"chunk_id": h["chunk_id"], "score": h["score"], "text": self.texts[h["chunk_id"]]}
+            for h in hits
+        ]
+
     def search(self, query: str, k: int = 5):
         """
         Verilen sorguya (query) en benzer 'k' adet metni döndürür.
         """
-        if not self.index:
-             return []
-             
-        q_emb = self.model.encode([query])
-        distances, indices = self.index.search(q_emb, k)
-
-        results = []
-        for idx in indices[0]:
-            # Geçerli bir indeks mi kontrol et
-            if 0 <= idx < len(self.texts):
-                results.append({
-                    "text": self.texts[idx]
-                })
-
-        return results
\ No newline at end of file
+        return self.search_by_vector(self.encode([query])[0], k)
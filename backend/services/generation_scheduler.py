@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+from services.metrics import observe_stage
+from services.qa_service import generate_answers_batch
+
+# --- AYARLAR ---
+# Tek seferde modele verilen en fazla soru sayısı
+GEN_MAX_BATCH_SIZE = int(os.getenv("DOCSAGE_GEN_MAX_BATCH_SIZE", "4"))
+# İlk istek geldikten sonra batch'i doldurmak için beklenen en uzun süre (ms)
+GEN_MAX_WAIT_MS = float(os.getenv("DOCSAGE_GEN_MAX_WAIT_MS", "25"))
+
+BatchFn = Callable[[List[Tuple[str, List[str]]]], List[str]]
+
+
+class _Pending:
+    def __init__(self, question: str, contexts: List[str]):
+        self.question = question
+        self.contexts = contexts
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class GenerationScheduler:
+    """
+    Eşzamanlı QA isteklerini kısa bir pencere boyunca toplayıp tek bir padded batch
+    olarak modele veren dinamik micro-batching zamanlayıcısı.
+    Model tek bir worker thread'inde çalışır; böylece istekler aynı CPU çekirdekleri için yarışmaz.
+    """
+    def __init__(
+        self,
+        batch_fn: BatchFn,
+        max_batch_size: int = GEN_MAX_BATCH_SIZE,
+        max_wait_ms: float = GEN_MAX_WAIT_MS
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Metrikler
+        self.batches = 0
+        self.requests = 0
+        self.batch_size_counts: Dict[int, int] = {}
+        self.total_queue_wait_s = 0.0
+        self.in_flight = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, daemon=True, name="generation-scheduler")
+                    self._thread.start()
+
+    def submit(self, question: str, contexts: List[str]) -> Future:
+        """
+        Üretim isteğini kuyruğa alır; sonuç (temizlenmiş cevap) Future üzerinden döner.
+        """
+        self._ensure_started()
+        pending = _Pending(question, contexts)
+        self._queue.put(pending)
+        return pending.future
+
+    def generate(self, question: str, contexts: List[str]) -> str:
+        """
+        submit + sonucu bekle (senkron handler'lar için).
+        """
+        return self.submit(question, contexts).result()
+
+    def _collect(self) -> List[_Pending]:
+        # İlk isteği bekle, ardından pencere dolana veya batch büyüklüğüne ulaşılana kadar topla
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            # İstemci vazgeçtiyse (iptal edilen Future) boşuna üretme
+            batch = [p for p in batch if p.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            self.in_flight = len(batch)
+            self.batches += 1
+            self.requests += len(batch)
+            self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+            self.total_queue_wait_s += sum(started - p.enqueued_at for p in batch)
+            for pending in batch:
+                observe_stage("generation_queue_wait", started - pending.enqueued_at)
+
+            try:
+                answers = self.batch_fn([(p.question, p.contexts) for p in batch])
+                for pending, answer in zip(batch, answers):
+                    pending.future.set_result(answer)
+            except Exception as e:
+                for pending in batch:
+                    pending.future.set_exception(e)
+            finally:
+                self.in_flight = 0
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "in_flight": self.in_flight,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": round(self.requests / self.batches, 3) if self.batches else 0.0,
+            "mean_queue_wait_ms": round(1000 * self.total_queue_wait_s / self.requests, 2) if self.requests else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+        }
+
+
+GENERATION_SCHEDULER = GenerationScheduler(generate_answers_batch)
@@ -0,0 +1,568 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from itertools import islice
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+from services.document_service import EXTRACT_PROCESSES, Source, iter_pages, submit_extraction
+from services.documents import DocumentObject, is_meaningful_chunk, iter_document_chunks
+from services.embedding_service import ENCODE_BATCH_SIZE, EmbeddingStore
+from services.metrics import observe_stage, request_timings, rss_bytes, timed, timed_iter, timings_ms
+from services.uploads import COPY_CHUNK_BYTES, MAX_UPLOAD_BYTES, UploadTooLargeError, discard, spool
+
+# --- AYARLAR ---
+# Aynı anda çalışan ingestion işi sayısı
+MAX_WORKERS = int(os.getenv("DOCSAGE_INGEST_WORKERS", "2"))
+# Çalışan + kuyrukta bekleyen en fazla iş sayısı (aşılırsa yeni yükleme reddedilir)
+MAX_PENDING = int(os.getenv("DOCSAGE_INGEST_MAX_PENDING", "16"))
+# Durumu sorgulanabilsin diye bellekte tutulan tamamlanmış iş sayısı
+MAX_FINISHED = 1000
+# Toplu yüklemede (dosyalar + zip içerikleri) kabul edilen en fazla dosya
+BULK_MAX_FILES = int(os.getenv("DOCSAGE_BULK_MAX_FILES", "1000"))
+# Toplu yüklemede farklı dosyaların parçalarından oluşturulan embedding batch büyüklüğü
+BULK_ENCODE_BATCH_SIZE = int(os.getenv("DOCSAGE_BULK_ENCODE_BATCH_SIZE", "256"))
+# Zip arşivinin açılmış toplam boyutu sınırı (MB)
+BULK_MAX_ARCHIVE_MB = float(os.getenv("DOCSAGE_BULK_MAX_ARCHIVE_MB", "1024"))
+BULK_MAX_ARCHIVE_BYTES = int(BULK_MAX_ARCHIVE_MB * 1024 * 1024)
+
+SUPPORTED_EXTENSIONS = ("pdf", "docx")
+
+
+class QueueFullError(Exception):
+    """
+    Ingestion kuyruğu dolu olduğunda fırlatılır (back-pressure).
+    """
+
+
+class Upload(NamedTuple):
+    filename: str
+    # Dosya içeriği veya diskteki geçici yükleme dosyasının yolu
+    source: Source
+    ext: str
+    # Dosya diske yazılırken hesaplandıysa içerik hash'i
+    content_hash: Optional[str] = None
+
+
+def _content_hash(source: Source) -> str:
+    digest = hashlib.sha256()
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_BYTES), b""):
+                digest.update(chunk)
+    else:
+        digest.update(source)
+    return digest.hexdigest()
+
+
+def discard_upload(upload: Upload):
+    # Geçici yükleme dosyası (yol olarak verilen kaynak) silinir
+    if isinstance(upload.source, str):
+        discard(upload.source)
+
+
+def file_extension(filename: str) -> str:
+    parts = filename.rsplit(".", 1)
+    return parts[-1].lower() if len(parts) > 1 else ""
+
+
+def unpack_archive(filename: str, source: Source) -> Tuple[List[Upload], List[Dict[str, str]]]:
+    """
+    Zip arşivindeki PDF / DOCX dosyalarını parça parça geçici dosyalara çıkarır. Desteklenmeyen
+    veya MAX_UPLOAD_MB'tan büyük dosyalar hata listesinde döner; klasörler ve gizli / sistem
+    dosyaları (ör. __MACOSX) sessizce atlanır.
+    """
+    try:
+        archive = zipfile.ZipFile(source if isinstance(source, str) else BytesIO(source))
+    except zipfile.BadZipFile:
+        raise ValueError(f"Geçersiz zip arşivi: {filename}")
+
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and not any(part.startswith((".", "__MACOSX")) for part in info.filename.split("/"))
+        ]
+        if sum(info.file_size for info in members) > BULK_MAX_ARCHIVE_BYTES:
+            raise ValueError(f"Arşivin açılmış boyutu {BULK_MAX_ARCHIVE_MB:g} MB sınırını aşıyor: {filename}")
+
+        uploads, failures = [], []
+        for info in members:
+            name = f"{filename}/{info.filename}"
+            ext = file_extension(info.filename)
+            if ext not in SUPPORTED_EXTENSIONS:
+                failures.append({"filename": name, "error": "Sadece PDF ve DOCX dosyaları destekleniyor."})
+                continue
+            try:
+                with archive.open(info) as member:
+                    spooled = spool(member, f".{ext}", MAX_UPLOAD_BYTES)
+            except UploadTooLargeError as e:
+                failures.append({"filename": name, "error": str(e)})
+                continue
+            except Exception:
+                for upload in uploads:
+                    discard_upload(upload)
+                raise
+            uploads.append(Upload(name, spooled.path, ext, spooled.content_hash))
+    return uploads, failures
+
+
+class IngestionJob:
+    """
+    Tek bir dosyanın yükleme işini ve ilerleme durumunu temsil eder.
+    Durumlar: queued -> extracting -> indexing -> saving -> done | failed
+    (extracting sırasında sayfa ayıklama, parçalama ve embedding birlikte ilerler)
+    """
+    def __init__(self, filename: str, content_hash: Optional[str] = None):
+        self.job_id = str(uuid.uuid4())
+        self.doc_id = str(uuid.uuid4())
+        self.filename = filename
+        self.content_hash = content_hash
+        # Aynı içerik daha önce yüklendiyse mevcut doküman döner, yeniden işlenmez
+        self.duplicate = False
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.pages_total = 0
+        self.pages_parsed = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # Aşama -> saniye (extract, chunk, embed, index, save)
+        self.timings: Dict[str, float] = {}
+        # İş sürerken gözlenen en yüksek süreç RSS'i (eşzamanlı işler dahil, süreç genelinde)
+        self.peak_rss_bytes = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def on_pages(self, parsed: int, total: int):
+        self.pages_parsed, self.pages_total = parsed, total
+        self.sample_memory()
+
+    def on_embedded(self, embedded: int, total: int):
+        self.chunks_embedded, self.chunks_total = embedded, total
+        self.sample_memory()
+
+    def on_streamed(self, embedded: int):
+        """
+        Akış halinde yüklemede bir batch encode edildiğinde çağrılır. Toplam parça sayısı
+        ayıklama bitene kadar bilinmez; ayıklanan sayfa oranından tahmin edilir.
+        """
+        total = embedded
+        if 0 < self.pages_parsed < self.pages_total:
+            total = max(embedded + 1, round(embedded * self.pages_total / self.pages_parsed))
+        self.on_embedded(embedded, total)
+
+    def sample_memory(self):
+        self.peak_rss_bytes = max(self.peak_rss_bytes, rss_bytes() or 0)
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "doc_id": self.doc_id,
+            "filename": self.filename,
+            "status": self.status,
+            "duplicate": self.duplicate,
+            "error": self.error,
+            "progress": {
+                "pages_parsed": self.pages_parsed,
+                "pages_total": self.pages_total,
+                "chunks_embedded": self.chunks_embedded,
+                "chunks_total": self.chunks_total,
+            },
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "timings_ms": timings_ms(self.timings),
+            "peak_rss_bytes": self.peak_rss_bytes,
+        }
+
+
+def ingest_document(job: IngestionJob, source: Source, ext: str, store):
+    """
+    Dosyayı (içerik veya disk yolu) ayıklar, parçalara böler, embedding'lerini çıkarır ve store'a kaydeder.
+    Sayfalar generator olarak geldikçe parçalanır ve batch'ler halinde encode edilir;
+    böylece tüm metin hiçbir zaman tek bir string olarak bellekte tutulmaz.
+    Her aşamada job üzerindeki durum/ilerleme bilgisi güncellenir.
+    """
+    # 1-3. Sayfaları ayıkla, parçala ve encode et (akış halinde)
+    job.status = "extracting"
+    encoder = EmbeddingStore(job.doc_id)
+    page_stream = timed_iter(iter_pages(source, ext, progress=job.on_pages), "extract")
+    chunk_stream = (
+        chunk for chunk in iter_document_chunks(page_stream)
+        if is_meaningful_chunk(chunk.text)
+    )
+    chunks, pages, spans, batches = [], [], [], []
+    # Parçalama süresi, parça üretimine harcanan süreden sayfa ayıklama süresi çıkarılarak bulunur
+    produce_seconds = 0.0
+    while True:
+        start = time.perf_counter()
+        batch = list(islice(chunk_stream, ENCODE_BATCH_SIZE))
+        produce_seconds += time.perf_counter() - start
+        if not batch:
+            break
+        with timed("embed"):
+            batches.append(encoder.encode_chunks([chunk.text for chunk in batch]))
+        chunks.extend(chunk.text for chunk in batch)
+        pages.extend(chunk.page for chunk in batch)
+        spans.extend((chunk.start, chunk.end) for chunk in batch)
+        job.on_streamed(len(chunks))
+
+    page_stream.close()
+    job.on_embedded(len(chunks), len(chunks))
+    observe_stage("chunk", max(0.0, produce_seconds - page_stream.seconds))
+
+    if not chunks:
+        raise ValueError("Dokümandan anlamlı metin çıkarılamadı.")
+
+    # 4. DocumentObject oluştur (hazır vektörler global indekse eklenir)
+    job.status = "indexing"
+    with timed("index"):
+        doc_obj = DocumentObject(
+            chunks=chunks,
+            doc_id=job.doc_id,
+            metadata={"filename": job.filename, "content_hash": job.content_hash},
+            vectors=np.concatenate(batches),
+            pages=pages,
+            spans=np.array(spans, dtype=np.int64)
+        )
+
+    # 5. Sakla (diske de yazılır)
+    job.status = "saving"
+    with timed("save"):
+        store[doc_obj.doc_id] = doc_obj
+    job.sample_memory()
+
+
+class _BulkDocument:
+    """
+    Toplu yüklemede parçaları embedding sırası bekleyen doküman.
+    """
+    def __init__(self, job: IngestionJob, chunks: list):
+        self.job = job
+        self.chunks = chunks
+        self.vectors: List[np.ndarray] = []
+        self.embedded = 0
+
+
+def _observe(job: IngestionJob, stage: str, seconds: float):
+    observe_stage(stage, seconds)
+    job.timings[stage] = job.timings.get(stage, 0.0) + seconds
+
+
+def _fail(job: IngestionJob, error: Exception):
+    job.status = "failed"
+    job.error = str(error)
+    job.finished_at = time.time()
+
+
+def _save_bulk_document(doc: _BulkDocument, store):
+    job = doc.job
+    try:
+        job.status = "indexing"
+        start = time.perf_counter()
+        doc_obj = DocumentObject(
+            chunks=[chunk.text for chunk in doc.chunks],
+            doc_id=job.doc_id,
+            metadata={"filename": job.filename, "content_hash": job.content_hash},
+            vectors=np.concatenate(doc.vectors),
+            pages=[chunk.page for chunk in doc.chunks],
+            spans=np.array([(chunk.start, chunk.end) for chunk in doc.chunks], dtype=np.int64)
+        )
+        _observe(job, "index", time.perf_counter() - start)
+
+        job.status = "saving"
+        start = time.perf_counter()
+        store[doc_obj.doc_id] = doc_obj
+        _observe(job, "save", time.perf_counter() - start)
+        job.sample_memory()
+        job.status = "done"
+        job.finished_at = time.time()
+    except Exception as e:
+        _fail(job, e)
+
+
+def ingest_documents(items: List[Tuple[IngestionJob, Upload]], store):
+    """
+    Birden fazla dosyayı birlikte yükler. Dosyalar süreç havuzunda dosya başına bir görevle
+    paralel ayıklanır; farklı dosyaların parçaları BULK_ENCODE_BATCH_SIZE'lık ortak batch'lerde
+    encode edilir. Bir dosyanın hatası yalnızca o dosyanın işini başarısız yapar.
+    """
+    encoder = EmbeddingStore("bulk")
+    # Ayıklaması süren dosyalar (gönderim sırasıyla) ve embedding sırası bekleyen parçalar
+    extracting = deque()
+    waiting: "deque[Tuple[_BulkDocument, int]]" = deque()
+    remaining = iter(items)
+
+    def submit_next():
+        item = next(remaining, None)
+        if item is not None:
+            job, upload = item
+            job.status = "extracting"
+            extracting.append((job, time.perf_counter(), submit_extraction(upload.source, upload.ext)))
+
+    def encode(size: int):
+        batch = [waiting.popleft() for _ in range(min(size, len(waiting)))]
+        # Önceki bir batch'te başarısız olan dokümanların kalan parçaları encode edilmez
+        batch = [(doc, i) for doc, i in batch if not doc.job.finished]
+        if not batch:
+            return
+        docs = list(dict.fromkeys(doc for doc, _ in batch))
+        start = time.perf_counter()
+        try:
+            vectors = encoder.encode_chunks([doc.chunks[i].text for doc, i in batch])
+        except Exception as e:
+            for doc in docs:
+                _fail(doc.job, e)
+            return
+        seconds = time.perf_counter() - start
+
+        offset = 0
+        for doc in docs:
+            share = sum(1 for owner, _ in batch if owner is doc)
+            # Ortak batch süresi dokümanlara parça sayısı oranında paylaştırılır
+            _observe(doc.job, "embed", seconds * share / len(batch))
+            doc.vectors.append(vectors[offset:offset + share])
+            offset += share
+            doc.embedded += share
+            doc.job.on_embedded(doc.embedded, len(doc.chunks))
+            if doc.embedded == len(doc.chunks):
+                _save_bulk_document(doc, store)
+
+    # Süreç başına en fazla iki dosya beklemede: tüm çekirdekler çalışır, bellek sınırlı kalır
+    for _ in range(2 * max(1, EXTRACT_PROCESSES)):
+        submit_next()
+
+    while extracting:
+        job, submitted, future = extracting.popleft()
+        try:
+            pages = future.result()
+        except Exception as e:
+            _fail(job, e)
+            submit_next()
+            continue
+        # Havuzda sıra bekleme süresi dahil
+        _observe(job, "extract", time.perf_counter() - submitted)
+        job.on_pages(len(pages), len(pages))
+        submit_next()
+
+        start = time.perf_counter()
+        chunks = [chunk for chunk in iter_document_chunks(pages) if is_meaningful_chunk(chunk.text)]
+        _observe(job, "chunk", time.perf_counter() - start)
+        if not chunks:
+            _fail(job, ValueError("Dokümandan anlamlı metin çıkarılamadı."))
+            continue
+
+        doc = _BulkDocument(job, chunks)
+        job.on_embedded(0, len(chunks))
+        waiting.extend((doc, i) for i in range(len(chunks)))
+        while len(waiting) >= BULK_ENCODE_BATCH_SIZE:
+            encode(BULK_ENCODE_BATCH_SIZE)
+
+    while waiting:
+        encode(BULK_ENCODE_BATCH_SIZE)
+
+
+class IngestionBatch:
+    """
+    Tek istekle yüklenen dosyaların işleri ve yüklemeden önce reddedilen dosyalar.
+    """
+    def __init__(self, jobs: List[IngestionJob], failures: List[Dict[str, str]]):
+        self.batch_id = str(uuid.uuid4())
+        self.jobs = jobs
+        self.failures = failures
+        self.created_at = time.time()
+
+    @property
+    def finished(self) -> bool:
+        return all(job.finished for job in self.jobs)
+
+    def to_dict(self) -> Dict:
+        statuses = [job.status for job in self.jobs]
+        return {
+            "batch_id": self.batch_id,
+            "status": "done" if self.finished else "running",
+            "counts": {
+                "files": len(self.jobs) + len(self.failures),
+                "done": statuses.count("done"),
+                "failed": statuses.count("failed") + len(self.failures),
+                "pending": sum(1 for job in self.jobs if not job.finished),
+            },
+            "documents": [job.to_dict() for job in self.jobs],
+            "failures": self.failures,
+            "created_at": self.created_at,
+        }
+
+
+class IngestionQueue:
+    """
+    Yükleme işlerini sınırlı bir thread havuzunda arka planda çalıştırır.
+    Bekleyen iş sayısı MAX_PENDING'i aşarsa yeni işler QueueFullError ile reddedilir.
+    """
+    def __init__(self, store, max_workers: int = MAX_WORKERS, max_pending: int = MAX_PENDING):
+        self.store = store
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        # İşlenmekte olan içerik hash'leri -> iş (aynı dosyanın eşzamanlı yüklemeleri tek iş olur)
+        self._inflight: Dict[str, IngestionJob] = {}
+        self._batches: "OrderedDict[str, IngestionBatch]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, source: Source, ext: str, content_hash: Optional[str] = None) -> IngestionJob:
+        """
+        Yeni bir yükleme işini kuyruğa alır ve hemen döner.
+        Aynı içerik zaten kayıtlıysa (veya işleniyorsa) mevcut doküman/iş döndürülür.
+        Kaynak disk yolu ise geçici yükleme dosyası kabul edilir; iş bitince (veya yükleme
+        reddedilirse) silinir.
+        """
+        upload = Upload(filename, source, ext, content_hash or _content_hash(source))
+        try:
+            with self._lock:
+                existing = self._existing(filename, upload.content_hash)
+                if existing is not None:
+                    discard_upload(upload)
+                    return existing
+
+                if not self._slots.acquire(blocking=False):
+                    raise QueueFullError("Ingestion kuyruğu dolu, lütfen daha sonra tekrar deneyin.")
+
+                job = self._new_job(filename, upload.content_hash)
+
+            try:
+                self._executor.submit(self._run, job, upload)
+            except Exception:
+                with self._lock:
+                    self._inflight.pop(upload.content_hash, None)
+                self._slots.release()
+                raise
+        except Exception:
+            discard_upload(upload)
+            raise
+        return job
+
+    def submit_many(self, uploads: List[Upload], failures: Optional[List[Dict[str, str]]] = None) -> IngestionBatch:
+        """
+        Birden fazla dosyayı tek bir toplu iş olarak kuyruğa alır (kuyrukta tek yer kaplar).
+        Kayıtlı veya işlenmekte olan içerikler submit'teki gibi mevcut doküman / işle eşleşir;
+        geçici yükleme dosyaları submit'teki gibi silinir.
+        """
+        uploads = [u if u.content_hash else u._replace(content_hash=_content_hash(u.source)) for u in uploads]
+        jobs, new = [], []
+        with self._lock:
+            if not self._slots.acquire(blocking=False):
+                for upload in uploads:
+                    discard_upload(upload)
+                raise QueueFullError("Ingestion kuyruğu dolu, lütfen daha sonra tekrar deneyin.")
+            for upload in uploads:
+                job = self._existing(upload.filename, upload.content_hash)
+                if job is None:
+                    job = self._new_job(upload.filename, upload.content_hash)
+                    new.append((job, upload))
+                else:
+                    discard_upload(upload)
+                jobs.append(job)
+            batch = IngestionBatch(jobs, list(failures or []))
+            self._batches[batch.batch_id] = batch
+            while len(self._batches) > MAX_FINISHED and next(iter(self._batches.values())).finished:
+                self._batches.popitem(last=False)
+            if not new:
+                # Tüm dosyalar zaten kayıtlı veya işleniyor
+                self._slots.release()
+                return batch
+
+        try:
+            self._executor.submit(self._run_many, new)
+        except Exception:
+            with self._lock:
+                for job, upload in new:
+                    self._inflight.pop(job.content_hash, None)
+                    discard_upload(upload)
+            self._slots.release()
+            raise
+        return batch
+
+    def _existing(self, filename: str, content_hash: str) -> Optional[IngestionJob]:
+        # Önce işlenenlere, sonra kayıtlılara bakılır: iş store'a yazıldıktan sonra listeden çıkar
+        inflight = self._inflight.get(content_hash)
+        if inflight is not None:
+            return inflight
+        existing = self.store.find_by_hash(content_hash)
+        if existing is None:
+            return None
+        job = IngestionJob(filename, content_hash)
+        job.doc_id = existing
+        job.duplicate = True
+        job.status = "done"
+        job.finished_at = time.time()
+        self._jobs[job.job_id] = job
+        self._trim()
+        return job
+
+    def _new_job(self, filename: str, content_hash: str) -> IngestionJob:
+        job = IngestionJob(filename, content_hash)
+        self._jobs[job.job_id] = job
+        self._inflight[content_hash] = job
+        self._trim()
+        return job
+
+    def _run_many(self, items: List[Tuple[IngestionJob, Upload]]):
+        try:
+            ingest_documents(items, self.store)
+        except Exception as e:
+            for job, _ in items:
+                if not job.finished:
+                    _fail(job, e)
+        finally:
+            with self._lock:
+                for job, upload in items:
+                    self._inflight.pop(job.content_hash, None)
+                    discard_upload(upload)
+            self._slots.release()
+
+    def _run(self, job: IngestionJob, upload: Upload):
+        try:
+            # Aşama süreleri iş üzerinde de tutulur (/documents/jobs/{job_id})
+            with request_timings() as timings:
+                job.timings = timings
+                ingest_document(job, upload.source, upload.ext, self.store)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            discard_upload(upload)
+            job.finished_at = time.time()
+            with self._lock:
+                self._inflight.pop(job.content_hash, None)
+            self._slots.release()
+
+    def _trim(self):
+        # En eski tamamlanmış işleri unut (bellek sınırsız büyümesin)
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def get_batch(self, batch_id: str) -> Optional[IngestionBatch]:
+        return self._batches.get(batch_id)
+
+    def depth(self) -> Dict[str, int]:
+        """
+        Kuyrukta bekleyen ve işlenmekte olan iş sayıları.
+        """
+        with self._lock:
+            statuses: List[str] = [job.status for job in self._jobs.values() if not job.finished]
+        queued = statuses.count("queued")
+        return {"queued": queued, "running": len(statuses) - queued}
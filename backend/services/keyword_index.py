@@ -0,0 +1,228 @@
+import re
+import sys
+from collections import Counter
+from typing import Dict, List, Sequence, Union
+import numpy as np
+
+# Soru içinde anlam taşımayan kelimeler (tek sefer oluşturulur)
+STOP_WORDS = frozenset({
+    "what", "how", "why", "when", "does", "do", "did", "can", "could",
+    "use", "using", "used", "code", "file", "make", "create",
+    "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for",
+    "with", "by", "of", "is", "are", "was", "were", "be", "been", "should"
+})
+
+# Özel isimlerin (Proper Noun) ağırlığı; metinde yoksa ceza kesilir
+PROPER_NOUN_WEIGHT = 3.0
+
+_TOKEN_RE = re.compile(r"\w+")
+_QUERY_WORD_RE = re.compile(r"\b\w{3,}\b")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Metni küçük harfli kelimelere ayırır. '\\b kelime \\b' regex eşleşmesiyle aynı sınırları kullanır.
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+
+class QueryTerms:
+    """
+    Sorudan bir kez çıkarılan anahtar kelimeler ve ağırlıkları.
+    Stop words temizlenir, özel isimler (baş harfi büyük) yüksek ağırlık alır.
+    """
+    def __init__(self, question: str):
+        words = [w for w in _QUERY_WORD_RE.findall(question.lower()) if w not in STOP_WORDS]
+        word_case_map = {w.lower(): w for w in _QUERY_WORD_RE.findall(question)}
+
+        # Kelime Ağırlıkları (tekrarlanan kelimeler tek sayılır)
+        weights: Dict[str, float] = {}
+        for w_lower in words:
+            original = word_case_map.get(w_lower, w_lower)
+            # Baş harfi büyükse (Özel İsim) -> Yüksek Puan
+            if original[0].isupper():
+                weights[w_lower] = PROPER_NOUN_WEIGHT
+            elif len(w_lower) > 6:
+                weights[w_lower] = 1.5
+            else:
+                weights[w_lower] = 1.0
+
+        self.terms = list(weights)
+        self.weights = np.array(list(weights.values()), dtype=np.float32)
+        self.proper = self.weights >= PROPER_NOUN_WEIGHT
+        self.total_weight = float(self.weights.sum())
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def match_scores(self, presence: np.ndarray) -> np.ndarray:
+        """
+        (chunk sayısı x terim sayısı) boyutlu varlık matrisinden keyword skorlarını hesaplar.
+        Skor = (bulunan kelimelerin ağırlığı - eksik özel isim sayısı) / toplam ağırlık
+        """
+        if not self.terms:
+            return np.full(presence.shape[0], 0.5, dtype=np.float32)
+
+        score = presence @ self.weights
+        penalty = (~presence[:, self.proper]).sum(axis=1)
+        return np.maximum(0.0, (score - penalty) / self.total_weight)
+
+
+class QueryBatch:
+    """
+    Birden fazla sorunun anahtar kelimeleri tek bir ortak terim listesinde.
+    Ağırlıklar (terim x soru) matrisinde tutulur; skorlar tüm sorular için matris çarpımıyla hesaplanır.
+    """
+    def __init__(self, questions: Sequence[str]):
+        self.queries = [QueryTerms(q) for q in questions]
+        self.terms = list(dict.fromkeys(t for q in self.queries for t in q.terms))
+        column = {t: i for i, t in enumerate(self.terms)}
+
+        self.weights = np.zeros((len(self.terms), len(self.queries)), dtype=np.float32)
+        self.proper = np.zeros_like(self.weights)
+        for j, query in enumerate(self.queries):
+            rows = [column[t] for t in query.terms]
+            self.weights[rows, j] = query.weights
+            self.proper[rows, j] = query.proper
+        self.total_weight = np.array([q.total_weight for q in self.queries], dtype=np.float32)
+        self.empty = np.array([not q for q in self.queries], dtype=bool)
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def match_scores(self, presence: np.ndarray) -> np.ndarray:
+        """
+        (chunk sayısı x terim sayısı) varlık matrisinden (chunk sayısı x soru sayısı) keyword skorları.
+        QueryTerms.match_scores ile aynı formül; terimi olmayan sorular 0.5 alır.
+        """
+        score = presence @ self.weights
+        penalty = (~presence).astype(np.float32) @ self.proper
+        scores = np.maximum(0.0, (score - penalty) / np.where(self.empty, 1.0, self.total_weight))
+        scores[:, self.empty] = 0.5
+        return scores
+
+
+Query = Union[QueryTerms, QueryBatch]
+
+
+class KeywordIndex:
+    """
+    Bir dokümanın chunk'ları için yükleme sırasında bir kez kurulan ters indeks (inverted index).
+    Postings listeleri CSR düzeninde (indptr / chunk_ids / counts) tek dizilerde tutulur.
+    """
+    def __init__(self, texts: List[str]):
+        self.num_chunks = len(texts)
+        self.vocab: Dict[str, int] = {}
+        self.chunk_lengths = np.zeros(self.num_chunks, dtype=np.float32)
+
+        term_ids, chunk_ids, counts = [], [], []
+        for chunk_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.chunk_lengths[chunk_id] = len(tokens)
+            for term, count in Counter(tokens).items():
+                term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+                chunk_ids.append(chunk_id)
+                counts.append(count)
+
+        term_ids = np.array(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        self.chunk_ids = np.array(chunk_ids, dtype=np.int32)[order]
+        self.counts = np.array(counts, dtype=np.float32)[order]
+        self.indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.vocab)), out=self.indptr[1:])
+        self.avg_length = float(self.chunk_lengths.mean()) if self.num_chunks else 0.0
+
+    @classmethod
+    def from_arrays(
+        cls,
+        terms: Sequence[str],
+        chunk_ids: np.ndarray,
+        counts: np.ndarray,
+        indptr: np.ndarray,
+        chunk_lengths: np.ndarray
+    ) -> "KeywordIndex":
+        """
+        Diskte saklanan postings dizilerinden (memory-map edilebilir) yeniden tokenize etmeden kurar.
+        terms, terim ID'si sırasıyla sözlüktür (bkz. terms()).
+        """
+        index = cls.__new__(cls)
+        index.num_chunks = len(chunk_lengths)
+        index.vocab = {term: i for i, term in enumerate(terms)}
+        index.chunk_lengths = chunk_lengths
+        index.chunk_ids = chunk_ids
+        index.counts = counts
+        index.indptr = indptr
+        index.avg_length = float(np.mean(chunk_lengths)) if index.num_chunks else 0.0
+        return index
+
+    def terms(self) -> List[str]:
+        # Sözlük terim ID'si sırasıyla eklendiği için dict sırası ID sırasıdır
+        return list(self.vocab)
+
+    @property
+    def nbytes(self) -> int:
+        # Postings dizileri + sözlük (dict ve terim str nesneleri dahil, yaklaşık)
+        arrays = self.chunk_ids.nbytes + self.counts.nbytes + self.indptr.nbytes + self.chunk_lengths.nbytes
+        return arrays + sys.getsizeof(self.vocab) + sum(sys.getsizeof(term) for term in self.vocab)
+
+    def _postings(self, term: str):
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return self.chunk_ids[:0], self.counts[:0]
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        return self.chunk_ids[start:end], self.counts[start:end]
+
+    def presence(self, query: Query) -> np.ndarray:
+        """
+        Her chunk için sorgu kelimelerinin geçip geçmediğini gösteren bool matris döndürür.
+        """
+        matrix = np.zeros((self.num_chunks, len(query.terms)), dtype=bool)
+        for col, term in enumerate(query.terms):
+            matrix[self._postings(term)[0], col] = True
+        return matrix
+
+    def match_scores(self, query: Query) -> np.ndarray:
+        """
+        Tüm chunk'lar için ağırlıklı keyword skorunu (özel isim cezası dahil) döndürür.
+        QueryBatch verilirse sonuç (chunk x soru) matrisidir.
+        """
+        return query.match_scores(self.presence(query))
+
+    def doc_freqs(self, query: Query) -> np.ndarray:
+        """
+        Her sorgu kelimesinin kaç chunk'ta geçtiğini döndürür.
+        """
+        return np.array([len(self._postings(t)[0]) for t in query.terms], dtype=np.float32)
+
+    def bm25_scores(
+        self,
+        query: Query,
+        idf: np.ndarray,
+        k1: float = 1.5,
+        b: float = 0.75
+    ) -> np.ndarray:
+        """
+        Tüm chunk'lar için (kelime ağırlıklarıyla çarpılmış) BM25 skorunu döndürür.
+        IDF dışarıdan verilir; böylece birden fazla doküman ortak bir korpus gibi skorlanır.
+        QueryBatch verilirse sonuç (chunk x soru) matrisidir.
+        """
+        scores = np.zeros((self.num_chunks,) + query.weights.shape[1:], dtype=np.float32)
+        if not self.num_chunks:
+            return scores
+
+        norm = k1 * (1 - b + b * self.chunk_lengths / (self.avg_length or 1.0))
+        for col, term in enumerate(query.terms):
+            chunk_ids, tf = self._postings(term)
+            if len(chunk_ids):
+                term_scores = idf[col] * tf * (k1 + 1) / (tf + norm[chunk_ids])
+                scores[chunk_ids] += np.multiply.outer(term_scores, query.weights[col])
+        return scores
+
+
+def corpus_idf(indexes: List[KeywordIndex], query: Query) -> np.ndarray:
+    """
+    Verilen dokümanların tamamını tek korpus kabul ederek sorgu kelimelerinin BM25 IDF değerlerini hesaplar.
+    """
+    n = sum(index.num_chunks for index in indexes)
+    df = sum((index.doc_freqs(query) for index in indexes), np.zeros(len(query.terms), dtype=np.float32))
+    return np.log(1.0 + (n - df + 0.5) / (df + 0.5))
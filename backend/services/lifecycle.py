@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from services.llm_loader import LLM_SELF_CHECK, get_llm, llm_loaded, self_check
+from services.model_registry import DEFAULT_EMBEDDING_MODEL, embedding_model_loaded, get_embedding_model
+from services.speculative import SPECULATIVE_DECODING, get_draft_model
+
+# --- AYARLAR ---
+# Uygulama başlarken modelleri arka planda yükle (0 ise ilk istekte yüklenir)
+PRELOAD_MODELS = os.getenv("DOCSAGE_PRELOAD_MODELS", "1") == "1"
+# Embedding modeli ve LLM aynı anda mı yüklensin
+PARALLEL_MODEL_LOAD = os.getenv("DOCSAGE_PARALLEL_MODEL_LOAD", "1") == "1"
+
+
+class ModelLifecycle:
+    """
+    Modellerin yüklenme ve ısınma (warmup) sürecini yönetir, hazır olma durumunu raporlar.
+    Yükleme arka plan thread'inde yapılır; böylece /healthz hemen cevap verirken
+    /readyz modeller kullanılabilir olana kadar 503 döner.
+    Önceden yükleme kapalıysa (preload=False) modeller ilk istekte yükleneceği için
+    bekleyen bileşenler "lazy" raporlanır ve hazır sayılır.
+    """
+    def __init__(self, preload: bool = PRELOAD_MODELS):
+        self.preload = preload
+        self._state: Dict[str, Dict] = {
+            "embedding": {"state": "pending", "error": None, "load_s": None},
+            "llm": {"state": "pending", "error": None, "load_s": None},
+        }
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, parallel: bool = PARALLEL_MODEL_LOAD) -> threading.Thread:
+        """
+        Modelleri arka planda yüklemeye başlar (idempotent).
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._load_all, args=(parallel,), daemon=True, name="model-loader")
+            self._thread.start()
+        return self._thread
+
+    def _load_all(self, parallel: bool):
+        loaders = [("embedding", self._load_embedding), ("llm", self._load_llm)]
+        if parallel:
+            with ThreadPoolExecutor(max_workers=len(loaders)) as pool:
+                for name, loader in loaders:
+                    pool.submit(self._run, name, loader)
+        else:
+            for name, loader in loaders:
+                self._run(name, loader)
+
+    def _run(self, name: str, loader):
+        entry = self._state[name]
+        entry["state"] = "loading"
+        start = time.perf_counter()
+        try:
+            loader()
+            entry["state"] = "ready"
+        except Exception as e:
+            entry["state"] = "failed"
+            entry["error"] = str(e)
+        finally:
+            entry["load_s"] = round(time.perf_counter() - start, 2)
+
+    @staticmethod
+    def _load_embedding():
+        # Yükle ve bir encode ile ısıt (ilk istekteki gecikmeyi önler)
+        model = get_embedding_model(DEFAULT_EMBEDDING_MODEL)
+        model.encode(["warmup"], convert_to_numpy=True)
+
+    @staticmethod
+    def _load_llm():
+        tokenizer, model = get_llm()
+        # get_llm self-check açıksa zaten kısa bir üretim yaptı; değilse ısınma üretimi yap
+        if not LLM_SELF_CHECK:
+            self_check(tokenizer, model, max_new_tokens=1)
+        # Spekülatif üretim açıksa taslak model de ilk istekten önce yüklenir
+        if SPECULATIVE_DECODING:
+            get_draft_model()
+
+    def status(self) -> Dict[str, Dict]:
+        """
+        Her bileşenin durumunu döndürür. Lazy (ilk istekte) yüklenen modeller de "ready" sayılır;
+        önceden yükleme kapalıyken henüz yüklenmemiş olanlar "lazy" olur.
+        """
+        loaded = {
+            "embedding": embedding_model_loaded(DEFAULT_EMBEDDING_MODEL),
+            "llm": llm_loaded(),
+        }
+        report = {}
+        for name, entry in self._state.items():
+            report[name] = dict(entry)
+            if loaded[name] and entry["state"] != "ready":
+                report[name]["state"] = "ready"
+            elif not self.preload and entry["state"] == "pending":
+                report[name]["state"] = "lazy"
+        return report
+
+    def ready(self, status: Optional[Dict[str, Dict]] = None) -> bool:
+        """
+        Tüm bileşenler istek alabilir mi: yüklenmiş veya ilk istekte yüklenecek (lazy).
+        """
+        status = self.status() if status is None else status
+        return all(c["state"] in ("ready", "lazy") for c in status.values())
+
+
+MODEL_LIFECYCLE = ModelLifecycle()
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+# --- AYARLAR ---
+MODEL_NAME = "Qwen/Qwen2.5-1.5B-Instruct"
+
+# Çıkarım hassasiyeti:
+#   fp32         -> tam hassasiyet (varsayılan)
+#   bf16         -> ağırlıklar bfloat16, belleği yarıya indirir
+#   int8         -> Linear katmanlarına dinamik int8 quantization
+#   prequantized -> DOCSAGE_LLM_CHECKPOINT ile verilen hazır quantize checkpoint
+PRECISIONS = ("fp32", "bf16", "int8", "prequantized")
+LLM_PRECISION = os.getenv("DOCSAGE_LLM_PRECISION", "fp32").lower()
+LLM_CHECKPOINT = os.getenv("DOCSAGE_LLM_CHECKPOINT")
+
+# Başlangıçta kısa bir üretimle modelin kullanılabilir olduğunu doğrula
+LLM_SELF_CHECK = os.getenv("DOCSAGE_LLM_SELF_CHECK", "1") == "1"
+
+# Süreç genelinde tek kopya (ilk kullanımda veya uygulama başlarken yüklenir)
+_LLM: Optional[Tuple[AutoTokenizer, AutoModelForCausalLM]] = None
+# Model yüklenmeden yalnızca token saymak için kullanılan tokenizer
+_TOKENIZER: Optional[AutoTokenizer] = None
+_LOCK = threading.Lock()
+
+SELF_CHECK_PROMPT = "Context:\nParis is the capital of France.\n\nQuestion:\nWhat is the capital of France?"
+
+
+def load_llm(
+    precision: str = LLM_PRECISION,
+    model_name: str = MODEL_NAME,
+    checkpoint: Optional[str] = LLM_CHECKPOINT
+) -> Tuple[AutoTokenizer, AutoModelForCausalLM]:
+    """
+    Tokenizer ve cevap modelini istenen hassasiyette CPU üzerinde yükler.
+    """
+    precision = precision.lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"Desteklenmeyen hassasiyet: {precision} (seçenekler: {', '.join(PRECISIONS)})")
+
+    if precision == "prequantized":
+        if not checkpoint:
+            raise ValueError("prequantized modu için DOCSAGE_LLM_CHECKPOINT tanımlanmalı.")
+        model_name = checkpoint
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+    # Batch üretimde tüm satırların sonu hizalı olsun diye soldan padding
+    tokenizer.padding_side = "left"
+
+    torch_dtype = {
+        "fp32": torch.float32,
+        "bf16": torch.bfloat16,
+        "int8": torch.float32,
+        # Hazır checkpoint kendi dtype / quantization ayarıyla yüklenir
+        "prequantized": "auto",
+    }[precision]
+
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        device_map="cpu",
+        torch_dtype=torch_dtype,
+        trust_remote_code=True
+    )
+
+    if precision == "int8":
+        # Linear ağırlıkları int8 saklanır, aktivasyonlar çalışma anında quantize edilir
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    model.eval()
+    model.docsage_precision = precision
+    return tokenizer, model
+
+
+def model_size_bytes(model) -> int:
+    """
+    Modelin ağırlıklarının (quantize edilmiş paketler dahil) kapladığı bellek miktarı.
+    """
+    total = sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+    # Dinamik quantize edilen Linear katmanlarının ağırlıkları parametre olarak görünmez
+    for module in model.modules():
+        packed = getattr(module, "_packed_params", None)
+        if packed is not None and hasattr(packed, "_weight_bias"):
+            weight, bias = packed._weight_bias()
+            total += weight.numel() * weight.element_size()
+            if bias is not None:
+                total += bias.numel() * bias.element_size()
+    return total
+
+
+def self_check(tokenizer, model, max_new_tokens: int = 8) -> Dict:
+    """
+    Kısa bir greedy üretim yaparak modelin sayısal olarak sağlıklı çalıştığını doğrular.
+    Logitlerde NaN/Inf varsa veya hiç token üretilemezse RuntimeError fırlatır.
+    """
+    messages = [{"role": "user", "content": SELF_CHECK_PROMPT}]
+    prompt = tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        logits = model(**inputs).logits[0, -1]
+        if not torch.isfinite(logits.float()).all():
+            raise RuntimeError("LLM self-check başarısız: logitlerde NaN/Inf var.")
+
+        outputs = model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=tokenizer.eos_token_id
+        )
+    elapsed = time.perf_counter() - start
+
+    generated = outputs[0][inputs.input_ids.shape[1]:]
+    text = tokenizer.decode(generated, skip_special_tokens=True).strip()
+    if len(generated) == 0 or not text:
+        raise RuntimeError("LLM self-check başarısız: model boş çıktı üretti.")
+
+    return {
+        "precision": getattr(model, "docsage_precision", "fp32"),
+        "output": text,
+        "latency_s": round(elapsed, 3),
+        "model_bytes": model_size_bytes(model),
+    }
+
+
+def get_llm() -> Tuple[AutoTokenizer, AutoModelForCausalLM]:
+    """
+    Paylaşılan tokenizer ve modeli döndürür; henüz yüklenmemişse (bir kez) yükler.
+    Modül import edildiğinde hiçbir model yüklenmez.
+    """
+    global _LLM
+    if _LLM is not None:
+        return _LLM
+
+    with _LOCK:
+        if _LLM is None:
+            tokenizer, model = load_llm()
+            if LLM_SELF_CHECK:
+                self_check(tokenizer, model)
+            _LLM = (tokenizer, model)
+    return _LLM
+
+
+def get_llm_tokenizer() -> AutoTokenizer:
+    """
+    Cevap modelinin tokenizer'ını döndürür. Model henüz yüklenmediyse yalnızca
+    tokenizer yüklenir (ör. yükleme sırasında chunk token sayılarını ölçmek için).
+    """
+    global _TOKENIZER
+    if _LLM is not None:
+        return _LLM[0]
+
+    with _LOCK:
+        if _TOKENIZER is None:
+            model_name = LLM_CHECKPOINT if LLM_PRECISION == "prequantized" and LLM_CHECKPOINT else MODEL_NAME
+            _TOKENIZER = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+    return _TOKENIZER
+
+
+def use_llm(tokenizer, model=None) -> None:
+    """
+    Hazır bir tokenizer'ı (ve verildiyse modeli) paylaşılan kopya olarak kullanır
+    (ör. benchmark'ta küçük veya stub backend). Model verilmezse yalnızca token sayımı etkilenir.
+    """
+    global _LLM, _TOKENIZER
+    with _LOCK:
+        _TOKENIZER = tokenizer
+        if model is not None:
+            _LLM = (tokenizer, model)
+
+
+def llm_loaded() -> bool:
+    return _LLM is not None
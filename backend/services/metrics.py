@@ -0,0 +1,286 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+
+# Süre histogramlarının üst sınırları (saniye)
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 768, 1024, 1536, 2048, 4096)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200, 500)
+
+LabelKey = Tuple[str, ...]
+T = TypeVar("T")
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelKey, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} etiketleri {self.labelnames} olmalı, verilen: {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = SECONDS_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # etiketler -> (bucket sayaçları, toplam, adet)
+        self._values: Dict[LabelKey, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = {k: (list(c), t, n) for k, (c, t, n) in self._values.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Değeri her okumada (scrape) fonksiyondan alınan gösterge. Fonksiyon tek bir sayı
+    veya etiket değerleri -> sayı sözlüğü döndürebilir.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], Union[float, Dict[LabelKey, float]]],
+                 labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self.read = read
+
+    def samples(self) -> List[str]:
+        value = self.read()
+        values = value if isinstance(value, dict) else {(): value}
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in sorted(values.items())]
+
+
+class MetricsRegistry:
+    """
+    Prometheus metin formatında (0.0.4) dışa aktarılan metriklerin kaydı.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metrik zaten kayıtlı: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Iterable[float] = SECONDS_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name: str, help_text: str, read: Callable, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, help_text, read, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def rss_bytes() -> Optional[int]:
+    """
+    Sürecin o anki yerleşik bellek (RSS) miktarı; /proc olmayan sistemlerde None.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_bytes() -> Optional[int]:
+    """
+    Süreç başladığından beri ulaşılan en yüksek RSS.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux'ta KB, macOS'ta byte
+    return peak if sys.platform == "darwin" else peak * 1024
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "docsage_stage_seconds", "QA ve yükleme aşamalarının süresi (saniye)", ("stage",)
+)
+PROMPT_TOKENS = REGISTRY.histogram(
+    "docsage_prompt_tokens", "LLM'e verilen prompt token sayısı (cache'lenmiş önek dahil)", buckets=TOKEN_BUCKETS
+)
+GENERATED_TOKENS = REGISTRY.counter(
+    "docsage_generated_tokens_total", "Üretilen toplam token sayısı", ("mode",)
+)
+DECODE_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "docsage_decode_tokens_per_second", "Prefill sonrası üretim hızı (token/saniye)", ("mode",), RATE_BUCKETS
+)
+REGISTRY.gauge("docsage_process_rss_bytes", "Sürecin yerleşik belleği (RSS)", lambda: rss_bytes() or 0)
+REGISTRY.gauge("docsage_process_peak_rss_bytes", "Süreç başladığından beri en yüksek RSS", lambda: peak_rss_bytes() or 0)
+
+# İstek başına süre dökümü (aşama -> saniye); yalnızca request_timings bloğu içinde dolar
+_REQUEST_TIMINGS: ContextVar[Optional[Dict[str, float]]] = ContextVar("docsage_request_timings", default=None)
+
+
+def observe_stage(stage: str, seconds: float):
+    """
+    Aşama süresini histograma ve (varsa) o anki isteğin süre dökümüne ekler.
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _REQUEST_TIMINGS.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+class TimedIterator(Iterator[T]):
+    """
+    Sarmaladığı iterator'ın eleman üretmek için harcadığı süreyi (tüketicinin süresi hariç) ölçer.
+    Ölçülen toplam seconds'ta okunabilir; iterator bittiğinde veya kapatıldığında aşamaya bir kez eklenir.
+    """
+    def __init__(self, iterable: Iterable[T], stage: str):
+        self._iterator = iter(iterable)
+        self.stage = stage
+        self.seconds = 0.0
+        self._observed = False
+
+    def __iter__(self) -> "TimedIterator[T]":
+        return self
+
+    def __next__(self) -> T:
+        start = time.perf_counter()
+        try:
+            item = next(self._iterator)
+        except BaseException:
+            # Bitiş (StopIteration) veya hata: süre aşamaya eklenir
+            self.seconds += time.perf_counter() - start
+            self.close()
+            raise
+        self.seconds += time.perf_counter() - start
+        return item
+
+    def close(self):
+        if self._observed:
+            return
+        self._observed = True
+        # Yarıda bırakılan generator'ın temizliği (geçici dosyalar, bekleyen işler) hemen çalışsın
+        close = getattr(self._iterator, "close", None)
+        if close is not None:
+            close()
+        observe_stage(self.stage, self.seconds)
+
+
+def timed_iter(iterator: Iterable[T], stage: str) -> TimedIterator[T]:
+    """
+    Generator'ın eleman üretmek için harcadığı süreyi (tüketicinin süresi hariç) ölçer;
+    toplam süre dönen nesnenin seconds alanındadır.
+    """
+    return TimedIterator(iterator, stage)
+
+
+@contextmanager
+def request_timings():
+    """
+    Blok içinde (aynı thread / context) ölçülen aşama sürelerini toplayan sözlüğü verir.
+    """
+    timings: Dict[str, float] = {}
+    token = _REQUEST_TIMINGS.set(timings)
+    start = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings["total"] = time.perf_counter() - start
+        _REQUEST_TIMINGS.reset(token)
+
+
+def timings_ms(timings: Dict[str, float]) -> Dict[str, float]:
+    return {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
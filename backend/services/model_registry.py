@@ -0,0 +1,55 @@
+import threading
+from typing import Dict
+from sentence_transformers import SentenceTransformer
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Süreç genelinde paylaşılan embedding modelleri (model adı -> model)
+_EMBEDDING_MODELS: Dict[str, SentenceTransformer] = {}
+_LOCK = threading.Lock()
+
+
+def get_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL) -> SentenceTransformer:
+    """
+    İstenen embedding modelini döndürür. Model süreç başına yalnızca bir kez yüklenir,
+    sonraki çağrılar aynı örneği paylaşır.
+    """
+    model = _EMBEDDING_MODELS.get(model_name)
+    if model is not None:
+        return model
+
+    with _LOCK:
+        # Kilidi beklerken başka bir thread modeli yüklemiş olabilir
+        model = _EMBEDDING_MODELS.get(model_name)
+        if model is None:
+            model = SentenceTransformer(model_name)
+            model.eval()
+            _EMBEDDING_MODELS[model_name] = model
+    return model
+
+
+def register_embedding_model(model_name: str, model) -> None:
+    """
+    Hazır bir modeli (ör. benchmark için küçük veya stub model) verilen ad altında
+    paylaşılan model olarak kaydeder; sonraki get_embedding_model çağrıları bunu döndürür.
+    """
+    with _LOCK:
+        _EMBEDDING_MODELS[model_name] = model
+
+
+def embedding_model_loaded(model_name: str = DEFAULT_EMBEDDING_MODEL) -> bool:
+    return model_name in _EMBEDDING_MODELS
+
+
+def model_memory_report() -> Dict[str, int]:
+    """
+    Yüklü her model için ağırlık ve buffer'ların kapladığı bellek miktarını (byte) döndürür.
+    """
+    with _LOCK:
+        models = dict(_EMBEDDING_MODELS)
+
+    report = {}
+    for name, model in models.items():
+        tensors = list(model.parameters()) + list(model.buffers())
+        report[name] = sum(t.numel() * t.element_size() for t in tensors)
+    return report
@@ -0,0 +1,239 @@
+import copy
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import torch
+from transformers import DynamicCache
+
+from services.llm_loader import get_llm
+from services.prompts import MAX_PROMPT_TOKENS, build_messages
+
+# --- AYARLAR ---
+# Sabit system prompt'un KV cache'ini bir kez hesaplayıp her istekte yeniden kullan
+PREFIX_CACHE_ENABLED = os.getenv("DOCSAGE_PREFIX_CACHE", "1") == "1"
+# Konuşma başına tutulan KV cache'lerin toplam bellek sınırı (MB, 0 = kapalı)
+CONVERSATION_CACHE_MB = float(os.getenv("DOCSAGE_CONVERSATION_CACHE_MB", "256"))
+
+# Chat şablonunda kullanıcı mesajının başladığı yeri bulmak için kullanılan işaret
+_SENTINEL = "\x00DOCSAGE_USER_CONTENT\x00"
+
+
+def _cache_tensors(cache):
+    # transformers sürümüne göre DynamicCache katmanları farklı alanlarda tutulur
+    if hasattr(cache, "layers"):
+        for layer in cache.layers:
+            yield getattr(layer, "keys", None)
+            yield getattr(layer, "values", None)
+    else:
+        yield from getattr(cache, "key_cache", [])
+        yield from getattr(cache, "value_cache", [])
+
+
+def cache_nbytes(cache) -> int:
+    """
+    KV cache'in kapladığı bellek (byte).
+    """
+    if cache is None:
+        return 0
+    return sum(t.numel() * t.element_size() for t in _cache_tensors(cache) if isinstance(t, torch.Tensor))
+
+
+def _chat_text(tokenizer, messages: List[Dict], add_generation_prompt: bool = True) -> str:
+    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=add_generation_prompt)
+
+
+class PreparedPrompt:
+    """
+    Üretime hazır prompt: token ID'leri, (varsa) önceden doldurulmuş KV cache
+    ve üretimden sonra konuşmayı güncellemek için gereken bilgiler.
+    """
+    def __init__(self, input_ids: List[int], past_key_values, messages: List[Dict],
+                 text: str, conversation_id: Optional[str]):
+        self.input_ids = input_ids
+        self.past_key_values = past_key_values
+        self.messages = messages
+        self.text = text
+        self.conversation_id = conversation_id
+        self.cached_tokens = past_key_values.get_seq_length() if past_key_values is not None else 0
+
+    @property
+    def prefill_tokens(self) -> int:
+        # Bu istekte gerçekten prefill edilecek (cache'te olmayan) token sayısı
+        return len(self.input_ids) - self.cached_tokens
+
+    def generate_kwargs(self) -> Dict:
+        _, model = get_llm()
+        kwargs = {
+            "input_ids": torch.tensor([self.input_ids], device=model.device),
+            "attention_mask": torch.ones((1, len(self.input_ids)), dtype=torch.long, device=model.device),
+        }
+        if self.past_key_values is not None:
+            kwargs["past_key_values"] = self.past_key_values
+        return kwargs
+
+
+class _Conversation:
+    def __init__(self, messages: List[Dict], text: str, token_ids: List[int], cache):
+        self.messages = messages
+        self.text = text
+        self.token_ids = token_ids
+        self.cache = cache
+        self.nbytes = cache_nbytes(cache)
+
+
+class PromptCache:
+    """
+    Prefill maliyetini azaltmak için KV cache yeniden kullanımı:
+    - Sabit system prompt öneki bir kez hesaplanır, her istekte kopyası kullanılır.
+    - conversation_id verilirse konuşmanın KV cache'i saklanır; takip sorusunda yalnızca
+      yeni token'lar prefill edilir. Konuşmalar toplam bellek sınırına göre LRU ile atılır.
+    """
+    def __init__(
+        self,
+        prefix_enabled: bool = PREFIX_CACHE_ENABLED,
+        conversation_cache_mb: float = CONVERSATION_CACHE_MB
+    ):
+        self.prefix_enabled = prefix_enabled
+        self.max_conversation_bytes = int(conversation_cache_mb * 2**20)
+        self._prefix = None
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._conversation_bytes = 0
+        self._lock = threading.Lock()
+        self.prefix_hits = 0
+        self.conversation_hits = 0
+        self.conversation_evictions = 0
+        self.prefill_tokens = 0
+        self.reused_tokens = 0
+
+    def _system_prefix(self):
+        """
+        System prompt ve kullanıcı mesajı başlangıcına kadar olan sabit metnin
+        token'larını ve KV cache'ini (bir kez) hesaplar.
+        """
+        if self._prefix is not None:
+            return self._prefix
+
+        with self._lock:
+            if self._prefix is None:
+                tokenizer, model = get_llm()
+                template = _chat_text(tokenizer, build_messages(_SENTINEL, []))
+                text = template[:template.index("Context:")]
+                ids = tokenizer(text, add_special_tokens=False).input_ids
+
+                with torch.no_grad():
+                    cache = model(
+                        torch.tensor([ids], device=model.device),
+                        past_key_values=DynamicCache(),
+                        use_cache=True
+                    ).past_key_values
+                self._prefix = (text, ids, cache)
+        return self._prefix
+
+    def prepare(self, question: str, contexts: List[str], conversation_id: Optional[str] = None) -> PreparedPrompt:
+        """
+        Soruyu, mümkünse cache'lenmiş bir önekin devamı olarak tokenize eder.
+        """
+        tokenizer, _ = get_llm()
+        turn = build_messages(question, contexts)
+
+        # 1. Takip sorusu: konuşmanın cache'i varsa yalnızca yeni tur prefill edilir
+        conversation = self._take_conversation(conversation_id)
+        if conversation is not None:
+            messages = conversation.messages + [turn[1]]
+            text = _chat_text(tokenizer, messages)
+            if text.startswith(conversation.text):
+                suffix = tokenizer(text[len(conversation.text):], add_special_tokens=False).input_ids
+                ids = conversation.token_ids + suffix
+                if len(ids) <= MAX_PROMPT_TOKENS:
+                    self.conversation_hits += 1
+                    return self._record(PreparedPrompt(ids, conversation.cache, messages, text, conversation_id))
+            # Geçmiş MAX_PROMPT_TOKENS'ı aştıysa veya şablon uyuşmadıysa konuşma baştan başlar
+
+        # 2. Yeni konuşma: sabit system prompt öneki cache'ten kopyalanır
+        text = _chat_text(tokenizer, turn)
+        cache = None
+        if self.prefix_enabled:
+            prefix_text, prefix_ids, prefix_cache = self._system_prefix()
+            if text.startswith(prefix_text):
+                ids = prefix_ids + tokenizer(text[len(prefix_text):], add_special_tokens=False).input_ids
+                cache = copy.deepcopy(prefix_cache)
+                self.prefix_hits += 1
+        if cache is None:
+            ids = tokenizer(text, add_special_tokens=False).input_ids
+
+        # Eski truncation=True davranışı: prompt en fazla MAX_PROMPT_TOKENS token
+        return self._record(PreparedPrompt(ids[:MAX_PROMPT_TOKENS], cache, turn, text, conversation_id))
+
+    def _record(self, prepared: PreparedPrompt) -> PreparedPrompt:
+        self.prefill_tokens += prepared.prefill_tokens
+        self.reused_tokens += prepared.cached_tokens
+        return prepared
+
+    def finish(self, prepared: PreparedPrompt, generated_ids: List[int], past_key_values):
+        """
+        Üretim bittikten sonra konuşmanın geçmişini ve KV cache'ini saklar.
+        """
+        if not prepared.conversation_id or self.max_conversation_bytes <= 0:
+            return
+
+        tokenizer, _ = get_llm()
+        im_end = tokenizer.convert_tokens_to_ids("<|im_end|>")
+        terminators = {tokenizer.eos_token_id, im_end, tokenizer.convert_tokens_to_ids("<|endoftext|>")}
+        while generated_ids and generated_ids[-1] in terminators:
+            generated_ids = generated_ids[:-1]
+
+        raw_answer = tokenizer.decode(generated_ids, skip_special_tokens=False)
+        messages = prepared.messages + [{"role": "assistant", "content": raw_answer}]
+        conversation = _Conversation(
+            messages=messages,
+            text=prepared.text + raw_answer + "<|im_end|>",
+            token_ids=prepared.input_ids + generated_ids + [im_end],
+            cache=past_key_values
+        )
+        self._put_conversation(prepared.conversation_id, conversation)
+
+    def _take_conversation(self, conversation_id: Optional[str]) -> Optional[_Conversation]:
+        # Cache üretim sırasında yerinde güncellendiği için konuşma depodan alınır (sahiplik aktarılır)
+        if not conversation_id:
+            return None
+        with self._lock:
+            conversation = self._conversations.pop(conversation_id, None)
+            if conversation is not None:
+                self._conversation_bytes -= conversation.nbytes
+            return conversation
+
+    def _put_conversation(self, conversation_id: str, conversation: _Conversation):
+        if conversation.nbytes > self.max_conversation_bytes:
+            return
+        with self._lock:
+            old = self._conversations.pop(conversation_id, None)
+            if old is not None:
+                self._conversation_bytes -= old.nbytes
+            self._conversations[conversation_id] = conversation
+            self._conversation_bytes += conversation.nbytes
+
+            # Bellek sınırı aşılırsa en uzun süredir kullanılmayan konuşmaları at (LRU)
+            while self._conversation_bytes > self.max_conversation_bytes:
+                _, evicted = self._conversations.popitem(last=False)
+                self._conversation_bytes -= evicted.nbytes
+                self.conversation_evictions += 1
+
+    def drop_conversation(self, conversation_id: str):
+        self._take_conversation(conversation_id)
+
+    def stats(self) -> Dict:
+        return {
+            "prefix_enabled": self.prefix_enabled,
+            "prefix_tokens": len(self._prefix[1]) if self._prefix is not None else None,
+            "prefix_hits": self.prefix_hits,
+            "conversations": len(self._conversations),
+            "conversation_bytes": self._conversation_bytes,
+            "conversation_hits": self.conversation_hits,
+            "conversation_evictions": self.conversation_evictions,
+            "prefill_tokens": self.prefill_tokens,
+            "reused_tokens": self.reused_tokens,
+        }
+
+
+PROMPT_CACHE = PromptCache()
@@ -0,0 +1,27 @@
+from typing import Dict, List
+
+# Model cevabı bulamadığında döneceği standart mesaj
+NO_ANSWER_MSG = "I am sorry, I could not find the answer to this question in the provided documents."
+
+# Modele verilen prompt'un en fazla token sayısı
+MAX_PROMPT_TOKENS = 2048
+
+SYSTEM_PROMPT = (
+    "You are a helpful AI assistant. Your task is to answer the user's question based strictly on the provided context.\n"
+    "Steps to follow:\n"
+    "1. Read the context carefully.\n"
+    "2. Find the specific sentences that answer the question.\n"
+    "3. Synthesize the answer in a clear, readable format.\n"
+    f"If the context does not contain the answer, reply exactly with: '{NO_ANSWER_MSG}'"
+)
+
+
+def build_messages(question: str, contexts: List[str]) -> List[Dict[str, str]]:
+    """
+    Soru ve bağlam parçalarından chat şablonuna verilecek mesaj listesini oluşturur.
+    """
+    context_text = "\n\n".join(contexts)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Context:\n{context_text}\n\nQuestion:\n{question}"}
+    ]
@@ -1,24 +1,31 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import os
+import queue
+import threading
+import time
 import numpy as np
-from typing import List
-import re
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+from services.context_packer import CONTEXT_TOKEN_BUDGET, PackedContext, pack_contexts, prompt_overhead_tokens_batch
 from services.documents import DocumentObject
+from services.keyword_index import QueryBatch, QueryTerms, corpus_idf, tokenize
+from services.llm_loader import get_llm
+from services.metrics import DECODE_TOKENS_PER_SECOND, GENERATED_TOKENS, PROMPT_TOKENS, observe_stage, timed
+from services.prefix_cache import PROMPT_CACHE, PreparedPrompt
+from services.prompts import MAX_PROMPT_TOKENS, NO_ANSWER_MSG, build_messages
+from services.speculative import DECODE_STATS, SPECULATIVE_DECODING, assisted_kwargs, count_forwards
 
-# --- AYARLAR ---
-MODEL_NAME = "Qwen/Qwen2.5-1.5B-Instruct" 
-
-# Model cevabı bulamadığında döneceği standart mesaj
-NO_ANSWER_MSG = "I am sorry, I could not find the answer to this question in the provided documents."
+# Model import sırasında değil, ilk kullanımda (veya uygulama başlarken) get_llm() ile yüklenir.
+# Hassasiyet DOCSAGE_LLM_PRECISION ile seçilir (fp32 / bf16 / int8 / prequantized)
 
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, trust_remote_code=True)
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_NAME,
-    device_map="cpu",
-    torch_dtype=torch.float32,
-    trust_remote_code=True
-)
-model.eval()
+# --- AYARLAR ---
+# Toplu QA'da (/qa/batch) tek encode ve tek indeks aramasıyla birlikte işlenen soru sayısı
+QA_BATCH_SIZE = int(os.getenv("DOCSAGE_QA_BATCH_SIZE", "32"))
+# Tek toplu istekte kabul edilen en fazla soru
+QA_BATCH_MAX_QUESTIONS = int(os.getenv("DOCSAGE_QA_BATCH_MAX_QUESTIONS", "1000"))
+# Akışta (/qa/stream) bir sonraki metin parçası için beklenen en uzun süre (saniye);
+# aşılırsa üretim durdurulur ve istemciye "error" olayı gönderilir
+STREAM_TOKEN_TIMEOUT = float(os.getenv("DOCSAGE_STREAM_TOKEN_TIMEOUT", "120"))
 
 # --- YARDIMCI FONKSİYONLAR ---
 
@@ -26,166 +33,510 @@ def calculate_hybrid_match(question: str, text: str) -> float:
     """
     Keyword Skorlayıcı: Stop words temizlenir, özel isimler (Proper Nouns) korunur.
     Özel isimler metinde yoksa skor düşürülür (ceza).
+    Retrieval, aynı skoru dokümanın ön hesaplanmış KeywordIndex'i üzerinden toplu hesaplar.
     """
-    stops = {
-        "what", "how", "why", "when", "does", "do", "did", "can", "could", 
-        "use", "using", "used", "code", "file", "make", "create",
-        "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", 
-        "with", "by", "of", "is", "are", "was", "were", "be", "been", "should"
-    }
-    
-    words = [w for w in re.findall(r"\b\w{3,}\b", question.lower()) if w not in stops]
-    
-    if not words: return 0.5 
-    
-    # Kelime Ağırlıkları
-    weights = {}
-    question_words_original = re.findall(r"\b\w{3,}\b", question)
-    word_case_map = {w.lower(): w for w in question_words_original}
-
-    for w_lower in words:
-        original = word_case_map.get(w_lower, w_lower)
-        # Baş harfi büyükse (Özel İsim) -> Yüksek Puan
-        if original[0].isupper():
-            weights[w_lower] = 3.0
-        elif len(w_lower) > 6:
-            weights[w_lower] = 1.5
-        else:
-            weights[w_lower] = 1.0
-    
-    total_weight = sum(weights.values())
-    text_lower = text.lower()
-    score, penalty = 0.0, 0.0
-
-    for word, weight in weights.items():
-        if re.search(rf"\b{re.escape(word)}\b", text_lower):
-            score += weight
-        elif weight >= 3.0: 
-            # Özel isim yoksa ceza kes
-            penalty += 1.0
-
-    return max(0.0, (score - penalty) / total_weight)
+    query = QueryTerms(question)
+    tokens = set(tokenize(text))
+    presence = np.array([[term in tokens for term in query.terms]], dtype=bool)
+    return float(query.match_scores(presence)[0])
 
 # --- RETRIEVAL (ARAMA) ---
 
+def rank_relevant_chunks(
+    question: str,
+    documents: List[DocumentObject],
+    k_per_doc: int = 5,
+    threshold: float = 0.35,
+    vec_weight: float = 0.65,
+    q_vec: Optional[np.ndarray] = None
+) -> List[Tuple[str, float, int]]:
+    """
+    Tüm dokümanlar arasında hem vektör benzerliği hem de anahtar kelime eşleşmesi
+    kullanarak alakalı parçaları bulur (Hybrid Search).
+    Skora göre azalan sırada (metin, skor, token sayısı) listesi döndürür.
+    Soru vektörü (q_vec) önceden hesaplandıysa verilebilir; aksi halde burada encode edilir.
+    """
+    q_vecs = None if q_vec is None else q_vec[None, :]
+    return rank_relevant_chunks_batch([question], documents, k_per_doc, threshold, vec_weight, q_vecs)[0]
+
+
+def rank_relevant_chunks_batch(
+    questions: List[str],
+    documents: List[DocumentObject],
+    k_per_doc: int = 5,
+    threshold: float = 0.35,
+    vec_weight: float = 0.65,
+    q_vecs: Optional[np.ndarray] = None
+) -> List[List[Tuple[str, float, int]]]:
+    """
+    rank_relevant_chunks'ın aynı doküman kümesi üzerinde çok soruluk hali: sorular tek encode
+    çağrısıyla vektörlenir, tek indeks aramasıyla taranır; vektör ve keyword skorları
+    (aday x soru) matrisleri olarak hesaplanır. Her soru için ayrı sıralı liste döndürür.
+    """
+    if not documents or not questions:
+        return [[] for _ in questions]
+
+    # Sorgular tüm istek boyunca yalnızca bir kez encode edilir
+    store = documents[0].embedding_store
+    if q_vecs is None:
+        with timed("query_encode"):
+            q_vecs = store.encode(list(questions))
+
+    # Seçili tüm dokümanlar tek bir global indeks aramasıyla (doc_id filtresi) taranır
+    doc_map = {doc.doc_id: doc for doc in documents}
+    k = k_per_doc * len(doc_map)
+    with timed("vector_search"):
+        hits = store.index.search(q_vecs, k=k, doc_ids=list(doc_map))
+    # Soru başına aday (doc_id, chunk_id) listesi (ekleme sırası korunur)
+    candidates = [dict.fromkeys((h["doc_id"], h["chunk_id"]) for h in row) for row in hits]
+
+    keyword_start = time.perf_counter()
+    # Keyword araması tüm korpus üzerinde (BM25) yapılır; vektör aramasının kaçırdığı
+    # güçlü anahtar kelime eşleşmeleri de aday listesine eklenir
+    query = QueryBatch(questions)
+    if query:
+        idf = corpus_idf([doc.keyword_index for doc in doc_map.values()], query)
+        bm25_hits = [[] for _ in questions]
+        for doc_id, doc in doc_map.items():
+            scores = doc.keyword_index.bm25_scores(query, idf)
+            top = np.argsort(scores, axis=0)[::-1][:k]
+            for q, column in enumerate(top.T):
+                bm25_hits[q].extend((scores[i, q], doc_id, int(i)) for i in column if scores[i, q] > 0)
+
+        for q, doc_hits in enumerate(bm25_hits):
+            for _, doc_id, chunk_id in sorted(doc_hits, reverse=True)[:k]:
+                candidates[q].setdefault((doc_id, chunk_id))
+    keyword_seconds = time.perf_counter() - keyword_start
+
+    if not any(candidates):
+        observe_stage("keyword_scoring", keyword_seconds)
+        return [[] for _ in questions]
+
+    # ANN (HNSW / IVF-PQ) skorları yaklaşık olabileceğinden vektör skorları dokümanın kendi
+    # vektörlerinden kesin olarak, doküman başına tek matris çarpımıyla yeniden hesaplanır
+    with timed("rescore"):
+        chunk_ids_by_doc: Dict[str, set] = {}
+        for doc_candidates in candidates:
+            for doc_id, chunk_id in doc_candidates:
+                chunk_ids_by_doc.setdefault(doc_id, set()).add(chunk_id)
+        v_scores = {}
+        for doc_id, chunk_ids in chunk_ids_by_doc.items():
+            ids = np.array(sorted(chunk_ids), dtype=np.int64)
+            matrix = doc_map[doc_id].embedding_store.vectors[ids] @ q_vecs.T
+            v_scores.update(((doc_id, int(i)), row) for i, row in zip(ids, matrix))
+
+    # Keyword skorları doküman başına tek seferde, tüm sorular için hesaplanır
+    keyword_start = time.perf_counter()
+    k_scores = {doc_id: doc_map[doc_id].keyword_index.match_scores(query) for doc_id in chunk_ids_by_doc}
+    observe_stage("keyword_scoring", keyword_seconds + time.perf_counter() - keyword_start)
+
+    results = []
+    for q, doc_candidates in enumerate(candidates):
+        # Aynı metin birden fazla dokümanda çıkarsa en yüksek skoru tut
+        final_results = {}
+        for doc_id, chunk_id in doc_candidates:
+            v_score = float(v_scores[(doc_id, chunk_id)][q])
+            k_score = float(k_scores[doc_id][chunk_id, q])
+            # Vektör ve Keyword skorlarını ağırlıklandırarak birleştir
+            h_score = (v_score * vec_weight) + (k_score * (1 - vec_weight))
+
+            if h_score >= threshold:
+                doc = doc_map[doc_id]
+                text = doc.chunks[chunk_id]
+                if text not in final_results or h_score > final_results[text][0]:
+                    final_results[text] = (h_score, int(doc.token_counts[chunk_id]))
+
+        # En yüksek skorlu parçalar önce
+        ranked = sorted(final_results.items(), key=lambda x: x[1][0], reverse=True)
+        results.append([(text, score, tokens) for text, (score, tokens) in ranked])
+    return results
+
+
 def retrieve_globally_relevant_chunks(
     question: str,
     documents: List[DocumentObject],
     k_per_doc: int = 5,
     max_chunks: int = 5,
     threshold: float = 0.35,
-    vec_weight: float = 0.65
+    vec_weight: float = 0.65,
+    q_vec: Optional[np.ndarray] = None
 ) -> List[str]:
     """
-    Tüm dokümanlar arasında hem vektör benzerliği hem de anahtar kelime eşleşmesi
-    kullanarak en alakalı parçaları bulur (Hybrid Search).
-    """
-    candidates = list({r["text"] for doc in documents for r in doc.embedding_store.search(question, k=k_per_doc)})
-    if not candidates: return []
-
-    emb_model = documents[0].embedding_store.model
-    q_vec = emb_model.encode([question], convert_to_numpy=True)
-    c_vecs = emb_model.encode(candidates, convert_to_numpy=True)
-    
-    v_scores = (c_vecs @ q_vec.T).squeeze() / (np.linalg.norm(c_vecs, axis=1) * np.linalg.norm(q_vec))
-    if v_scores.ndim == 0: v_scores = [v_scores]
-
-    final_results = []
-    
-    for text, v_score in zip(candidates, v_scores):
-        k_score = calculate_hybrid_match(question, text)
-        # Vektör ve Keyword skorlarını ağırlıklandırarak birleştir
-        h_score = (v_score * vec_weight) + (k_score * (1 - vec_weight))
-        
-        if h_score >= threshold:
-            final_results.append((h_score, text))
-
-    # En yüksek skorlu parçaları döndür
-    return [res[1] for res in sorted(final_results, key=lambda x: x[0], reverse=True)[:max_chunks]]
+    En alakalı max_chunks parçanın metinlerini döndürür.
+    """
+    ranked = rank_relevant_chunks(question, documents, k_per_doc, threshold, vec_weight, q_vec)
+    return [text for text, _, _ in ranked[:max_chunks]]
 
-# --- GENERATION (CEVAP ÜRETME) ---
 
-def generate_answer_from_contexts(
+def retrieve_packed_contexts(
     question: str,
-    contexts: List[str]
-) -> str:
+    documents: List[DocumentObject],
+    k_per_doc: int = 5,
+    max_chunks: int = 5,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    q_vec: Optional[np.ndarray] = None
+) -> PackedContext:
     """
-    Bulunan bağlamları kullanarak LLM'e (Language Model) cevap ürettirir.
+    Alakalı parçaları skor sırasıyla token bütçesine yerleştirir. Bütçeye sığmayan
+    parçanın yerine sıradaki (daha kısa) parça denenebilir; soru her zaman eksiksiz kalır.
     """
-    if not contexts:
-        return NO_ANSWER_MSG
+    ranked = rank_relevant_chunks(question, documents, k_per_doc, q_vec=q_vec)
+    with timed("context_packing"):
+        return pack_contexts(
+            question,
+            [text for text, _, _ in ranked],
+            [tokens for _, _, tokens in ranked],
+            budget=token_budget,
+            max_chunks=max_chunks
+        )
+
 
-    context_text = "\n\n".join(contexts)
-
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a helpful AI assistant. Your task is to answer the user's question based strictly on the provided context.\n"
-                "Steps to follow:\n"
-                "1. Read the context carefully.\n"
-                "2. Find the specific sentences that answer the question.\n"
-                "3. Synthesize the answer in a clear, readable format.\n"
-                f"If the context does not contain the answer, reply exactly with: '{NO_ANSWER_MSG}'"
+def retrieve_packed_contexts_batch(
+    questions: List[str],
+    documents: List[DocumentObject],
+    k_per_doc: int = 5,
+    max_chunks: int = 5,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    q_vecs: Optional[np.ndarray] = None
+) -> List[PackedContext]:
+    """
+    retrieve_packed_contexts'in çok soruluk hali. Parçaların token sayıları yüklemede
+    ölçüldüğünden paylaşılır; soruların prompt yükü tek tokenizer çağrısıyla ölçülür.
+    """
+    ranked = rank_relevant_chunks_batch(questions, documents, k_per_doc, q_vecs=q_vecs)
+    with timed("context_packing"):
+        overheads = prompt_overhead_tokens_batch(questions)
+        return [
+            pack_contexts(
+                question,
+                [text for text, _, _ in question_ranked],
+                [tokens for _, _, tokens in question_ranked],
+                budget=token_budget,
+                max_chunks=max_chunks,
+                overhead=int(overhead)
             )
-        },
-        {
-            "role": "user",
-            "content": f"Context:\n{context_text}\n\nQuestion:\n{question}"
-        }
-    ]
+            for question, question_ranked, overhead in zip(questions, ranked, overheads)
+        ]
 
-    text_prompt = tokenizer.apply_chat_template(
-        messages,
+# --- GENERATION (CEVAP ÜRETME) ---
+
+# Modelin kendi kendine konuşmasını gösteren, cevaptan silinen ifadeler
+CUT_PHRASES = ["Answer:", "Explanation:", "Human:", "User:", "Note:"]
+# Telif hakkı vb. uyarılar: cevapta geçerse cevap yok sayılır (Hallüsinasyon önlemi)
+BANNED_PHRASES = ["Packt", "Publishing", "Copyright", "All rights reserved"]
+# Hatalı placeholder çıktıları
+PLACEHOLDERS = ["{NO_ANSWER_MSG}", "NO_ANSWER_MSG"]
+
+
+def build_prompt_text(question: str, contexts: List[str]) -> str:
+    """
+    Soru ve bağlamlardan chat şablonuna uygun prompt metnini oluşturur.
+    """
+    tokenizer, _ = get_llm()
+    return tokenizer.apply_chat_template(
+        build_messages(question, contexts),
         tokenize=False,
         add_generation_prompt=True
     )
 
-    inputs = tokenizer(
-        text_prompt,
-        return_tensors="pt",
-        truncation=True,
-        max_length=2048
-    ).to(model.device)
 
+def generation_kwargs() -> Dict:
+    """
+    Tüm üretim yollarında (normal / stream) ortak kullanılan generate parametreleri.
+    """
+    tokenizer, _ = get_llm()
     terminators = [
         tokenizer.eos_token_id,
         tokenizer.convert_tokens_to_ids("<|im_end|>"),
         tokenizer.convert_tokens_to_ids("<|endoftext|>")
     ]
+    return dict(
+        max_new_tokens=512,
+        do_sample=False,
+        temperature=0.0,
+        repetition_penalty=1.1,
+        eos_token_id=terminators,
+        pad_token_id=tokenizer.eos_token_id
+    )
 
-    with torch.no_grad():
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=512,
-            do_sample=False,
-            temperature=0.0,
-            repetition_penalty=1.1,
-            eos_token_id=terminators,
-            pad_token_id=tokenizer.eos_token_id
-        )
 
-    generated_ids = outputs[0][inputs.input_ids.shape[1]:]
-    answer = tokenizer.decode(generated_ids, skip_special_tokens=True).strip()
+def _is_rejected(answer: str) -> bool:
+    # Placeholder veya yasaklı ifade içeren cevaplar geçersizdir
+    if any(p in answer for p in PLACEHOLDERS):
+        return True
+    answer_lower = answer.lower()
+    return any(banned.lower() in answer_lower for banned in BANNED_PHRASES)
+
+
+def clean_answer(answer: str) -> str:
+    """
+    Modelin ham çıktısına son temizlik filtrelerini uygular.
+    """
+    answer = answer.strip()
 
-    # --- TEMİZLİK ---
-    
     # 1. Modelin kendi kendine konuşmasını temizle
-    for cut_phrase in ["Answer:", "Explanation:", "Human:", "User:", "Note:"]:
+    for cut_phrase in CUT_PHRASES:
         if cut_phrase in answer:
             answer = answer.replace(cut_phrase, "").strip()
 
-    # 2. Hatalı placeholder çıktısını düzelt
-    if "{NO_ANSWER_MSG}" in answer or "NO_ANSWER_MSG" in answer:
+    # 2-3. Hatalı placeholder veya telif hakkı uyarısı varsa cevap yoktur
+    if _is_rejected(answer):
         return NO_ANSWER_MSG
 
-    # 3. Telif hakkı vb. uyarıları varsa cevap yoktur (Hallüsinasyon önlemi)
-    for banned in ["Packt", "Publishing", "Copyright", "All rights reserved"]:
-        if banned.lower() in answer.lower():
-            return NO_ANSWER_MSG
-            
     # 4. Cevap çok kısaysa (anlamsızsa)
     if len(answer) < 10:
         return NO_ANSWER_MSG
 
-    return answer
\ No newline at end of file
+    return answer
+
+
+class StreamingAnswerCleaner:
+    """
+    Temizlik filtrelerini token akışı üzerinde artımlı olarak uygular.
+    Silinecek/yasaklı bir ifadenin başlangıcı olabilecek son birkaç karakter,
+    ifade netleşene kadar geri tutulur.
+    """
+    HOLDBACK = max(len(p) for p in CUT_PHRASES + BANNED_PHRASES + PLACEHOLDERS) - 1
+
+    def __init__(self):
+        self.raw = ""
+        self.emitted = 0
+        self.rejected = False
+
+    def _cleaned(self) -> str:
+        text = self.raw
+        for cut_phrase in CUT_PHRASES:
+            text = text.replace(cut_phrase, "")
+        return text.lstrip()
+
+    def feed(self, text: str) -> str:
+        """
+        Yeni üretilen metni ekler ve güvenle gönderilebilecek kısmı döndürür.
+        """
+        self.raw += text
+        cleaned = self._cleaned()
+        if _is_rejected(cleaned):
+            self.rejected = True
+            return ""
+
+        safe_end = len(cleaned) - self.HOLDBACK
+        if safe_end <= self.emitted:
+            return ""
+        chunk = cleaned[self.emitted:safe_end]
+        self.emitted = safe_end
+        return chunk
+
+    def finish(self) -> str:
+        """
+        Akış bittiğinde geri tutulan son kısmı döndürür.
+        """
+        if self.rejected:
+            return ""
+        return self._cleaned()[self.emitted:].rstrip()
+
+
+def generate_answers_batch(items: List[Tuple[str, List[str]]]) -> List[str]:
+    """
+    Birden fazla (soru, bağlamlar) çiftini tek bir padded batch olarak üretir.
+    Tokenizer soldan padding yapar; böylece tüm satırlar aynı konumdan üretmeye başlar.
+    """
+    answers = [NO_ANSWER_MSG] * len(items)
+    active = [i for i, (_, contexts) in enumerate(items) if contexts]
+    if not active:
+        return answers
+
+    if len(active) == 1:
+        # Tek istek: system prompt önekinin KV cache'i yeniden kullanılabilir
+        answers[active[0]] = _generate_single(*items[active[0]])
+        return answers
+
+    tokenizer, model = get_llm()
+    with timed("tokenize"):
+        prompts = [build_prompt_text(*items[i]) for i in active]
+        inputs = tokenizer(
+            prompts,
+            return_tensors="pt",
+            padding=True,
+            truncation=True,
+            max_length=MAX_PROMPT_TOKENS
+        ).to(model.device)
+    for length in inputs.attention_mask.sum(dim=1).tolist():
+        PROMPT_TOKENS.observe(length)
+
+    timer = _FirstTokenTimer()
+    with torch.no_grad():
+        outputs = model.generate(
+            **inputs, **generation_kwargs(), stopping_criteria=StoppingCriteriaList([timer])
+        )
+
+    prompt_length = inputs.input_ids.shape[1]
+    # Erken biten satırların doldurma token'ları (pad = eos) sayılmaz
+    new_tokens = int((outputs[:, prompt_length:] != generation_kwargs()["pad_token_id"]).sum())
+    timer.record("batch", new_tokens)
+    for i, row in zip(active, outputs):
+        answer = tokenizer.decode(row[prompt_length:], skip_special_tokens=True)
+        # --- TEMİZLİK ---
+        answers[i] = clean_answer(answer)
+    return answers
+
+
+class _FirstTokenTimer(StoppingCriteria):
+    """
+    Hiçbir zaman durdurmaz; ilk çağrıldığı an (ilk token üretildi) prefill'in bittiği andır.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+        return False
+
+    def record(self, mode: str, new_tokens: int):
+        # Prefill, decode süreleri ve prefill sonrası token/saniye metrikleri
+        end = time.perf_counter()
+        first_token = self.first_token or end
+        observe_stage("prefill", first_token - self.start)
+        observe_stage("decode", end - first_token)
+        GENERATED_TOKENS.inc(new_tokens, mode=mode)
+        if new_tokens > 1 and end > first_token:
+            DECODE_TOKENS_PER_SECOND.observe((new_tokens - 1) / (end - first_token), mode=mode)
+
+
+def _generate_prepared(prepared: PreparedPrompt, keep=None, **kwargs) -> List[int]:
+    """
+    Hazırlanmış prompt'u (cache'lenmiş önekle) üretir, konuşmayı günceller
+    ve üretilen token ID'lerini döndürür. Spekülatif üretim açıksa taslak model
+    token önerir, ana model doğrular (greedy çıktı birebir aynı kalır).
+    """
+    _, model = get_llm()
+    count_forwards(model)
+    mode = "speculative" if SPECULATIVE_DECODING else "greedy"
+    PROMPT_TOKENS.observe(len(prepared.input_ids))
+    timer = _FirstTokenTimer()
+    stopping_criteria = StoppingCriteriaList([timer] + list(kwargs.pop("stopping_criteria", [])))
+    with torch.no_grad(), DECODE_STATS.track(mode) as tracked:
+        outputs = model.generate(
+            **prepared.generate_kwargs(),
+            **generation_kwargs(),
+            **assisted_kwargs(),
+            return_dict_in_generate=True,
+            stopping_criteria=stopping_criteria,
+            **kwargs
+        )
+        generated = outputs.sequences[0, len(prepared.input_ids):].tolist()
+        tracked["new_tokens"] = len(generated)
+    timer.record(mode, len(generated))
+    if keep is None or keep():
+        PROMPT_CACHE.finish(prepared, generated, outputs.past_key_values)
+    return generated
+
+
+def _generate_single(question: str, contexts: List[str], conversation_id: Optional[str] = None) -> str:
+    tokenizer, _ = get_llm()
+    with timed("tokenize"):
+        prepared = PROMPT_CACHE.prepare(question, contexts, conversation_id)
+    generated = _generate_prepared(prepared)
+    answer = tokenizer.decode(generated, skip_special_tokens=True)
+    # --- TEMİZLİK ---
+    return clean_answer(answer)
+
+
+def generate_answer_from_contexts(
+    question: str,
+    contexts: List[str],
+    conversation_id: Optional[str] = None
+) -> str:
+    """
+    Bulunan bağlamları kullanarak LLM'e (Language Model) cevap ürettirir.
+    conversation_id verilirse önceki turların KV cache'i yeniden kullanılır.
+    """
+    if not contexts:
+        return NO_ANSWER_MSG
+    return _generate_single(question, contexts, conversation_id)
+
+
+class _StopOnEvent(StoppingCriteria):
+    # İstemci bağlantıyı kapattığında veya cevap reddedildiğinde üretimi durdurur
+    def __init__(self, event: threading.Event):
+        self.event = event
+        self.triggered = False
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        self.triggered = self.triggered or self.event.is_set()
+        return self.triggered
+
+
+def stream_answer_from_contexts(
+    question: str,
+    contexts: List[str],
+    conversation_id: Optional[str] = None
+) -> Iterator[Dict]:
+    """
+    Cevabı üretildikçe olay (event) olarak döndürür:
+    {"type": "token", "text"} parçaları, cevap reddedilirse {"type": "replace", "text"},
+    en sonda da temizlenmiş tam cevapla {"type": "done", "answer"}.
+    Üretim hata verirse veya STREAM_TOKEN_TIMEOUT içinde yeni parça gelmezse "done" yerine
+    {"type": "error", "error"} ile biter.
+    """
+    if not contexts:
+        yield {"type": "done", "answer": NO_ANSWER_MSG}
+        return
+
+    tokenizer, _ = get_llm()
+    with timed("tokenize"):
+        prepared = PROMPT_CACHE.prepare(question, contexts, conversation_id)
+    streamer = TextIteratorStreamer(
+        tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=STREAM_TOKEN_TIMEOUT
+    )
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def _generate():
+        stop_criteria = _StopOnEvent(stop)
+        try:
+            _generate_prepared(
+                prepared,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([stop_criteria]),
+                # Yarıda kesilen (istemci koptu / cevap reddedildi) konuşma saklanmaz
+                keep=lambda: not stop_criteria.triggered
+            )
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            # Üretim hata verse de akış sonlanır (okuyan taraf sonsuza kadar beklemez);
+            # normal bitişte fazladan gelen bitiş sinyali yok sayılır
+            streamer.end()
+
+    thread = threading.Thread(target=_generate, daemon=True)
+    thread.start()
+
+    cleaner = StreamingAnswerCleaner()
+    try:
+        try:
+            for text in streamer:
+                chunk = cleaner.feed(text)
+                if cleaner.rejected:
+                    # Cevap geçersiz: istemciye bildir ve gereksiz üretimi durdur
+                    stop.set()
+                    yield {"type": "replace", "text": NO_ANSWER_MSG}
+                    break
+                if chunk:
+                    yield {"type": "token", "text": chunk}
+        except queue.Empty:
+            yield {"type": "error", "error": f"Cevap üretimi {STREAM_TOKEN_TIMEOUT:g} saniye içinde ilerlemedi."}
+            return
+        if errors:
+            yield {"type": "error", "error": f"Cevap üretilemedi: {errors[0]}"}
+            return
+
+        tail = cleaner.finish()
+        if tail:
+            yield {"type": "token", "text": tail}
+
+        answer = NO_ANSWER_MSG if cleaner.rejected else clean_answer(cleaner.raw)
+        yield {"type": "done", "answer": answer}
+    finally:
+        stop.set()
@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+from services.llm_loader import LLM_PRECISION, get_llm, load_llm
+
+# --- AYARLAR ---
+# Küçük bir taslak (draft) modelle spekülatif (assisted) üretim; greedy çıktıyı değiştirmez
+SPECULATIVE_DECODING = os.getenv("DOCSAGE_SPECULATIVE", "0") == "1"
+# Ana modelle aynı tokenizer'ı kullanan taslak model
+DRAFT_MODEL_NAME = os.getenv("DOCSAGE_DRAFT_MODEL", "Qwen/Qwen2.5-0.5B-Instruct")
+
+_DRAFT = None
+_LOCK = threading.Lock()
+
+
+class _Counters(threading.local):
+    # Forward sayaçları thread'e özeldir; böylece eşzamanlı üretimler birbirini saymaz
+    active = False
+    main_forwards = 0
+    draft_forwards = 0
+
+
+_COUNTERS = _Counters()
+
+
+def _count_main(module, args, output):
+    if _COUNTERS.active:
+        _COUNTERS.main_forwards += 1
+
+
+def _count_draft(module, args, output):
+    if _COUNTERS.active:
+        _COUNTERS.draft_forwards += 1
+
+
+def count_forwards(model, draft: bool = False):
+    """
+    Modelin forward çağrılarını DecodeStats.track içinde saydırır (model başına bir kez).
+    """
+    if not getattr(model, "docsage_forward_hook", False):
+        model.register_forward_hook(_count_draft if draft else _count_main)
+        model.docsage_forward_hook = True
+
+
+def get_draft_model():
+    """
+    Taslak modeli (bir kez) yükler. Ana modelle aynı kelime dağarcığına sahip olmalıdır.
+    """
+    global _DRAFT
+    if _DRAFT is not None:
+        return _DRAFT
+
+    with _LOCK:
+        if _DRAFT is None:
+            tokenizer, _ = get_llm()
+            # Hazır quantize checkpoint yalnızca ana model içindir; taslak tam hassasiyette yüklenir
+            precision = "fp32" if LLM_PRECISION == "prequantized" else LLM_PRECISION
+            draft_tokenizer, draft = load_llm(precision, DRAFT_MODEL_NAME, checkpoint=None)
+            if draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+                raise ValueError(f"Taslak model ({DRAFT_MODEL_NAME}) ana modelle aynı tokenizer'ı kullanmıyor.")
+
+            # Kabul oranını ölçmek için taslak modelin forward çağrıları sayılır
+            count_forwards(draft, draft=True)
+            _DRAFT = draft
+    return _DRAFT
+
+
+def draft_loaded() -> bool:
+    return _DRAFT is not None
+
+
+def assisted_kwargs(enabled: bool = SPECULATIVE_DECODING) -> Dict:
+    """
+    Tek dizili generate çağrılarına eklenecek parametreler (kapalıysa boş).
+    """
+    if not enabled:
+        return {}
+    return {"assistant_model": get_draft_model()}
+
+
+class DecodeStats:
+    """
+    Üretim modlarına (greedy / speculative) göre token/saniye ve kabul oranı metrikleri.
+    Kabul oranı forward sayılarından hesaplanır: ana modelin her doğrulama adımı
+    kabul edilen taslak token'larına ek olarak bir token üretir.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modes: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def track(self, mode: str):
+        """
+        Bloğun süresini ve forward sayılarını ölçer; blok içinde
+        result["new_tokens"] üretilen token sayısıyla doldurulmalıdır.
+        """
+        _COUNTERS.active = True
+        _COUNTERS.main_forwards = 0
+        _COUNTERS.draft_forwards = 0
+        result = {"new_tokens": 0}
+        start = time.perf_counter()
+        try:
+            yield result
+        finally:
+            elapsed = time.perf_counter() - start
+            _COUNTERS.active = False
+            if result["new_tokens"]:
+                self._record(mode, result["new_tokens"], elapsed, _COUNTERS.main_forwards, _COUNTERS.draft_forwards)
+
+    def _record(self, mode: str, new_tokens: int, elapsed: float, main_forwards: int, draft_forwards: int):
+        with self._lock:
+            entry = self._modes.setdefault(mode, {
+                "generations": 0, "tokens": 0, "seconds": 0.0,
+                "main_forwards": 0, "draft_tokens": 0, "accepted_tokens": 0,
+            })
+            entry["generations"] += 1
+            entry["tokens"] += new_tokens
+            entry["seconds"] += elapsed
+            entry["main_forwards"] += main_forwards
+            if draft_forwards:
+                entry["draft_tokens"] += draft_forwards
+                entry["accepted_tokens"] += max(0, new_tokens - main_forwards)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            report = {"enabled": SPECULATIVE_DECODING, "draft_model": DRAFT_MODEL_NAME, "modes": {}}
+            for mode, entry in self._modes.items():
+                summary = {
+                    "generations": entry["generations"],
+                    "tokens": entry["tokens"],
+                    "tokens_per_s": round(entry["tokens"] / entry["seconds"], 2) if entry["seconds"] else 0.0,
+                    "tokens_per_forward": round(entry["tokens"] / entry["main_forwards"], 3) if entry["main_forwards"] else None,
+                }
+                if entry["draft_tokens"]:
+                    summary["draft_tokens"] = entry["draft_tokens"]
+                    summary["acceptance_rate"] = round(entry["accepted_tokens"] / entry["draft_tokens"], 4)
+                report["modes"][mode] = summary
+            return report
+
+
+DECODE_STATS = DecodeStats()
+
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, NamedTuple, Optional
+
+# --- AYARLAR ---
+# Tek bir dosyanın en büyük boyutu (MB); aşılırsa yükleme 413 ile reddedilir
+MAX_UPLOAD_MB = float(os.getenv("DOCSAGE_MAX_UPLOAD_MB", "512"))
+# Toplu yükleme isteğinin (tüm dosyalar + zip arşivleri) en büyük toplam boyutu (MB)
+BULK_MAX_UPLOAD_MB = float(os.getenv("DOCSAGE_BULK_MAX_UPLOAD_MB", "2048"))
+# Yüklenen dosyaların işlenene kadar yazıldığı dizin (varsayılan: sistemin geçici dizini)
+UPLOAD_DIR = os.getenv("DOCSAGE_UPLOAD_DIR") or None
+# Diske kopyalama parça boyutu
+COPY_CHUNK_BYTES = 1024 * 1024
+
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+BULK_MAX_UPLOAD_BYTES = int(BULK_MAX_UPLOAD_MB * 1024 * 1024)
+# Tek dosyalık multipart isteğinde dosya dışındaki alanlar (sınırlar, başlıklar) için pay
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """
+    Dosya MAX_UPLOAD_MB sınırını aştığında fırlatılır.
+    """
+
+
+def too_large_message(max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    return f"Dosya {max_bytes / (1024 * 1024):g} MB sınırını aşıyor."
+
+
+def bulk_too_large_message() -> str:
+    return f"Toplu yükleme {BULK_MAX_UPLOAD_MB:g} MB sınırını aşıyor."
+
+
+class SpooledFile(NamedTuple):
+    # Diskteki geçici dosyanın yolu (işi biten sahibi discard ile siler)
+    path: str
+    size: int
+    content_hash: str
+
+
+def spool(stream: BinaryIO, suffix: str = "", max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledFile:
+    """
+    Akışı parça parça geçici bir dosyaya yazar; içerik hash'i yazarken hesaplanır.
+    Dosya hiçbir zaman tamamen belleğe alınmaz. Sınır aşılırsa yazılan kısım silinir.
+
+    Starlette'in UploadFile'ı zaten bir SpooledTemporaryFile'dır, ancak bu kopya gereklidir:
+    o dosya istek bitince kapatılıp silinir (küçükse hiç diske yazılmaz ve yolu yoktur),
+    ingestion ise arka planda ve ayrı süreçlerde bir dosya yoluyla çalışır. Hash aynı
+    geçişte hesaplandığı için içerik yalnızca bir kez okunur.
+    """
+    if UPLOAD_DIR:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="docsage-upload-", suffix=suffix, dir=UPLOAD_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(COPY_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(too_large_message(max_bytes))
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        discard(path)
+        raise
+    return SpooledFile(path, size, digest.hexdigest())
+
+
+def discard(path: Optional[str]):
+    """
+    Geçici yükleme dosyasını siler (yoksa sessizce geçer).
+    """
+    if path is None:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
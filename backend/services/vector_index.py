@@ -0,0 +1,451 @@
+import bisect
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import faiss
+from services.compact_storage import STORAGE_MODE
+from services.model_registry import DEFAULT_EMBEDDING_MODEL
+
+# --- AYARLAR ---
+# İndeks tipi: auto (vektör sayısına göre), flat (kesin), hnsw, ivfpq
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivfpq")
+INDEX_TYPE = os.getenv("DOCSAGE_INDEX_TYPE", "auto").lower()
+# auto modunda geçiş eşikleri (toplam vektör sayısı)
+HNSW_MIN_VECTORS = int(os.getenv("DOCSAGE_HNSW_MIN_VECTORS", "50000"))
+IVFPQ_MIN_VECTORS = int(os.getenv("DOCSAGE_IVFPQ_MIN_VECTORS", "1000000"))
+# HNSW graf parametreleri; efSearch arttıkça recall artar, gecikme de artar
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = int(os.getenv("DOCSAGE_HNSW_EF_SEARCH", "64"))
+# IVF-PQ: aramada taranan küme (liste) sayısı ve PQ kod genişliği
+IVF_NPROBE = int(os.getenv("DOCSAGE_IVF_NPROBE", "16"))
+PQ_BITS = 8
+IVFPQ_MAX_TRAIN = 100000
+# PQ kod kitapları için kod başına ~39 eğitim vektörü gerekir; o zamana kadar flat kullanılır
+IVFPQ_MIN_TRAIN = 39 * 2 ** PQ_BITS
+# Filtreli aramada seçilen vektör sayısı bunun altındaysa ANN yerine kesin (numpy) arama yapılır
+EXACT_SEARCH_MAX = 20000
+# Kesin aramada en iyi adayları birlikte seçilen vektör sayısı (blok)
+EXACT_BLOCK_VECTORS = 8192
+# Sıkıştırılmış kodlarla (sq8 / IVF-PQ) arama yapılırken k'nın bu katı aday alınır ve
+# adaylar doküman vektörleriyle kesin skorlanarak yeniden sıralanır
+RERANK_FACTOR = 2
+# HNSW silme desteklemez; silinen vektör oranı bunu aşınca indeks yeniden kurulur
+COMPACT_DELETED_RATIO = 0.2
+
+# auto modunda yalnızca büyüme yönünde geçiş yapılır
+_ORDER = {"flat": 0, "hnsw": 1, "ivfpq": 2}
+
+
+def choose_index_type(num_vectors: int, configured: str = INDEX_TYPE) -> str:
+    """
+    Yapılandırılmış tipi veya (auto ise) vektör sayısına uygun tipi döndürür.
+    """
+    if configured not in INDEX_TYPES:
+        raise ValueError(f"Desteklenmeyen indeks tipi: {configured} (seçenekler: {', '.join(INDEX_TYPES)})")
+    if configured == "ivfpq" and num_vectors < IVFPQ_MIN_TRAIN:
+        return "flat"
+    if configured != "auto":
+        return configured
+    if num_vectors >= IVFPQ_MIN_VECTORS:
+        return "ivfpq"
+    if num_vectors >= HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+
+def ivf_nlist(num_vectors: int, num_train: int) -> int:
+    # ~4*sqrt(n) küme; her küme için en az ~39 eğitim vektörü olmalı
+    return int(max(1, min(4 * np.sqrt(num_vectors), num_train // 39, 65536)))
+
+
+def pq_subquantizers(dim: int) -> int:
+    # Alt vektör başına ~8 boyut; m boyutu tam bölmeli
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _scalar_quantizer_type(storage: str) -> Optional[int]:
+    # float32 modunda vektörler indekste sıkıştırılmadan tutulur
+    return {
+        "float16": faiss.ScalarQuantizer.QT_fp16,
+        "sq8": faiss.ScalarQuantizer.QT_8bit,
+    }.get(storage)
+
+
+def _train_unit_range(index: faiss.Index, dim: int):
+    # Birim vektörlerin bileşenleri [-1, 1] aralığındadır; sabit aralık sayesinde
+    # korpus büyüdükçe quantizer yeniden eğitilmez
+    if not index.is_trained:
+        index.train(np.vstack([-np.ones(dim), np.ones(dim)]).astype(np.float32))
+
+
+def build_faiss_index(
+    kind: str,
+    dim: int,
+    train_vectors: Optional[np.ndarray] = None,
+    num_vectors: Optional[int] = None,
+    storage: str = STORAGE_MODE
+) -> faiss.Index:
+    """
+    İç çarpım (normalize vektörlerde kosinüs) metrikli, ID destekli boş bir indeks kurar.
+    ivfpq için train_vectors ile eğitilir; küme sayısı toplam vektör sayısına (num_vectors) göre seçilir.
+    storage float16 / sq8 ise flat ve hnsw indeksleri vektörleri scalar quantizer ile sıkıştırır.
+    """
+    qtype = _scalar_quantizer_type(storage)
+    if kind == "flat":
+        if qtype is None:
+            return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+        _train_unit_range(index, dim)
+        return faiss.IndexIDMap2(index)
+    if kind == "hnsw":
+        if qtype is None:
+            hnsw = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            hnsw = faiss.IndexHNSWSQ(dim, qtype, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            _train_unit_range(hnsw, dim)
+        hnsw.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return faiss.IndexIDMap2(hnsw)
+    if kind == "ivfpq":
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError("IVF-PQ indeksi eğitim vektörü olmadan kurulamaz.")
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(
+            quantizer, dim, ivf_nlist(num_vectors or len(train_vectors), len(train_vectors)),
+            pq_subquantizers(dim), PQ_BITS,
+            faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+        return index
+    raise ValueError(f"Desteklenmeyen indeks tipi: {kind}")
+
+
+def search_parameters(
+    kind: str,
+    sel: Optional[faiss.IDSelector] = None,
+    ef_search: int = HNSW_EF_SEARCH,
+    nprobe: int = IVF_NPROBE
+) -> Optional[faiss.SearchParameters]:
+    """
+    İndeks tipine göre arama parametreleri (HNSW efSearch, IVF nprobe) ve ID filtresi.
+    """
+    kwargs = {"sel": sel} if sel is not None else {}
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=ef_search, **kwargs)
+    if kind == "ivfpq":
+        return faiss.SearchParametersIVF(nprobe=nprobe, **kwargs)
+    return faiss.SearchParameters(**kwargs) if kwargs else None
+
+
+class GlobalVectorIndex:
+    """
+    Tüm dokümanların chunk vektörlerini tek bir indekste tutar.
+    Her dokümana ardışık bir ID aralığı verilir; böylece chunk -> doc_id eşlemesi
+    yalnızca aralık başlangıçları üzerinden (bisect) yapılır.
+    flat tipinde ayrı bir Faiss kopyası tutulmaz: arama doğrudan dokümanların kendi
+    (diskten yüklenenlerde memory-map edilmiş) vektör dizileri üzerinde kesin yapılır.
+    hnsw / ivfpq'da aramalar doc_id listesine göre ID-selector ile filtrelenir ve Faiss
+    kendi kodlarını ayrıca tutar (stats()'ta total_bytes ikisinin toplamıdır).
+    İndeks tipi (flat / hnsw / ivfpq) vektör sayısı büyüdükçe otomatik olarak değiştirilir.
+    """
+    def __init__(self, index_type: str = INDEX_TYPE, storage: str = STORAGE_MODE):
+        choose_index_type(0, index_type)
+        self.index_type = index_type
+        self.storage = storage
+        self.kind = None
+        self.index = None
+        self.dim = None
+        self._next_id = 0
+        # doc_id -> (ilk ID, chunk sayısı)
+        self._ranges: Dict[str, Tuple[int, int]] = {}
+        # Sıralı aralık başlangıçları ve karşılık gelen doc_id'ler
+        self._starts: List[int] = []
+        self._start_docs: List[str] = []
+        # Dokümanların vektörleri (dokümanın kendi dizisine referans, kopya değil):
+        # indeks tipi değişirken yeniden kurmak ve küçük filtreli aramaları kesin yapmak için
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._live = 0
+        # HNSW'de silinmiş ama indekste duran ID'ler
+        self._deleted: List[Tuple[int, int]] = []
+        self._deleted_count = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._live
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._ranges
+
+    def add_document(self, doc_id: str, vectors: np.ndarray):
+        """
+        Dokümanın (normalize) vektörlerini indekse ekler. Aynı doc_id tekrar eklenirse
+        eski vektörler önce silinir.
+        """
+        if vectors.ndim != 2 or vectors.shape[0] == 0:
+            raise ValueError("İndekse eklenecek vektör yok.")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vektör boyutu uyumsuz: {vectors.shape[1]} != {self.dim}")
+
+            if doc_id in self._ranges:
+                self.remove_document(doc_id)
+
+            self._vectors[doc_id] = vectors
+            kind = choose_index_type(self._live + vectors.shape[0], self.index_type)
+            if self.kind is None or _ORDER[kind] > _ORDER[self.kind]:
+                # İlk doküman veya eşik aşıldı: tüm vektörlerle yeni tipte yeniden kur
+                self._rebuild(kind)
+            else:
+                self._add(doc_id, vectors)
+
+    def _add(self, doc_id: str, vectors: np.ndarray):
+        start = self._next_id
+        count = vectors.shape[0]
+        if self.index is not None:
+            self.index.add_with_ids(
+                np.ascontiguousarray(vectors, dtype=np.float32),
+                np.arange(start, start + count, dtype=np.int64)
+            )
+        self._next_id += count
+        self._live += count
+
+        # ID'ler hep artan verildiği için listeler sıralı kalır
+        self._ranges[doc_id] = (start, count)
+        self._starts.append(start)
+        self._start_docs.append(doc_id)
+
+    def _rebuild(self, kind: str):
+        # Kayıtlı tüm dokümanları yeni bir indekse ardışık ID'lerle ekler (silinenler atılır)
+        docs = list(self._vectors.items())
+        num_vectors = sum(len(v) for _, v in docs)
+        train = None
+        if kind == "ivfpq":
+            all_vectors = np.concatenate([v for _, v in docs])
+            sample = np.random.default_rng(0).choice(num_vectors, min(num_vectors, IVFPQ_MAX_TRAIN), replace=False)
+            train = all_vectors[np.sort(sample)]
+
+        # flat: arama doküman dizileri üzerinde yapılır, Faiss indeksi kurulmaz
+        self.index = None if kind == "flat" else build_faiss_index(kind, self.dim, train, num_vectors, self.storage)
+        self.kind = kind
+        self._next_id = 0
+        self._live = 0
+        self._ranges, self._starts, self._start_docs = {}, [], []
+        self._deleted, self._deleted_count = [], 0
+        for doc_id, vectors in docs:
+            self._add(doc_id, vectors)
+
+    def remove_document(self, doc_id: str):
+        """
+        Dokümanın vektörlerini siler. flat/ivfpq yerinde siler; HNSW'de ID'ler
+        aramada dışlanır ve silinen oranı eşiği aşınca indeks yeniden kurulur.
+        """
+        with self._lock:
+            if doc_id not in self._ranges:
+                return
+            start, count = self._ranges.pop(doc_id)
+            del self._vectors[doc_id]
+            self._live -= count
+
+            pos = bisect.bisect_left(self._starts, start)
+            del self._starts[pos]
+            del self._start_docs[pos]
+
+            if self.kind == "hnsw":
+                self._deleted.append((start, count))
+                self._deleted_count += count
+                if self._deleted_count > COMPACT_DELETED_RATIO * self.index.ntotal:
+                    self._rebuild(self.kind)
+            elif self.index is not None:
+                self.index.remove_ids(faiss.IDSelectorRange(start, start + count))
+
+    def _locate(self, vector_id: int) -> Tuple[str, int]:
+        # ID'nin ait olduğu dokümanı ve doküman içindeki chunk sırasını bul
+        pos = bisect.bisect_right(self._starts, vector_id) - 1
+        return self._start_docs[pos], vector_id - self._starts[pos]
+
+    def _exact_search(self, q_vecs: np.ndarray, k: int, doc_ids: List[str]) -> List[List[dict]]:
+        # Doküman dizileri üzerinde kesin arama (matris çarpımı). Dokümanlar EXACT_BLOCK_VECTORS'lık
+        # bloklar halinde skorlanır ve her bloğun en iyi k adayı birleştirilir
+        blocks, block, size = [], [], 0
+        for doc_id in doc_ids:
+            block.append(doc_id)
+            size += self._ranges[doc_id][1]
+            if size >= EXACT_BLOCK_VECTORS:
+                blocks.append(block)
+                block, size = [], 0
+        if block:
+            blocks.append(block)
+
+        cand_scores, cand_docs, cand_chunks = [], [], []
+        for block in blocks:
+            arrays = [self._vectors[d] for d in block]
+            lengths = [len(a) for a in arrays]
+            # Vektörler kopyalanmaz; yalnızca (küçük) skor matrisleri birleştirilir
+            scores = np.concatenate([q_vecs @ np.asarray(a, dtype=np.float32).T for a in arrays], axis=1)
+            # Bloktaki her sütunun dokümanı ve doküman içindeki chunk sırası
+            owners = np.repeat(np.arange(len(block)), lengths)
+            chunk_ids = np.arange(scores.shape[1]) - np.repeat(np.cumsum([0] + lengths[:-1]), lengths)
+            top_k = min(k, scores.shape[1])
+            top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            cand_scores.append(np.take_along_axis(scores, top, axis=1))
+            cand_docs.append(np.asarray(block, dtype=object)[owners[top]])
+            cand_chunks.append(chunk_ids[top])
+
+        scores = np.concatenate(cand_scores, axis=1)
+        docs = np.concatenate(cand_docs, axis=1)
+        chunks = np.concatenate(cand_chunks, axis=1)
+        k = min(k, scores.shape[1])
+        results = []
+        for row_scores, row_docs, row_chunks in zip(scores, docs, chunks):
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            top = top[np.argsort(-row_scores[top])]
+            results.append([
+                {"doc_id": row_docs[i], "chunk_id": int(row_chunks[i]), "score": float(row_scores[i])}
+                for i in top
+            ])
+        return results
+
+    def search(
+        self,
+        q_vecs: np.ndarray,
+        k: int = 5,
+        doc_ids: Optional[List[str]] = None,
+        ef_search: int = HNSW_EF_SEARCH,
+        nprobe: int = IVF_NPROBE
+    ) -> List[List[dict]]:
+        """
+        Her sorgu vektörü için (isteğe bağlı olarak yalnızca verilen dokümanlar içinde)
+        en benzer 'k' chunk'ı tek bir arama ile döndürür.
+        Sonuçlar: {"doc_id", "chunk_id", "score"}
+        """
+        q_vecs = np.ascontiguousarray(q_vecs, dtype=np.float32)
+        q_vecs = q_vecs.reshape(-1, q_vecs.shape[-1])
+
+        with self._lock:
+            if self.kind is None or self._live == 0:
+                return [[] for _ in range(len(q_vecs))]
+
+            sel = None
+            total = self._live
+            if doc_ids is not None:
+                selected = [d for d in dict.fromkeys(doc_ids) if d in self._ranges]
+                if not selected:
+                    return [[] for _ in range(len(q_vecs))]
+                total = sum(self._ranges[d][1] for d in selected)
+                if self.kind == "flat" or total <= EXACT_SEARCH_MAX:
+                    return self._exact_search(q_vecs, k, selected)
+                # Tüm indeks seçiliyse filtreye gerek yok
+                if total < self._live:
+                    ranges = [self._ranges[d] for d in selected]
+                    ids = np.concatenate([np.arange(s, s + c, dtype=np.int64) for s, c in ranges])
+                    sel = faiss.IDSelectorBatch(ids)
+            elif self.kind == "flat":
+                return self._exact_search(q_vecs, k, list(self._ranges))
+
+            if sel is None and self._deleted:
+                # HNSW'de silinmiş ID'ler sonuçlardan dışlanır
+                deleted = np.concatenate([np.arange(s, s + c, dtype=np.int64) for s, c in self._deleted])
+                deleted_sel = faiss.IDSelectorBatch(deleted)
+                sel = faiss.IDSelectorNot(deleted_sel)
+
+            rerank = self.kind == "ivfpq" or self.storage == "sq8"
+            params = search_parameters(self.kind, sel, ef_search, nprobe)
+            scores, ids = self.index.search(q_vecs, min(k * RERANK_FACTOR if rerank else k, total), params=params)
+
+            results = []
+            for q_vec, row_scores, row_ids in zip(q_vecs, scores, ids):
+                hits = []
+                for score, vector_id in zip(row_scores, row_ids):
+                    if vector_id < 0:
+                        continue
+                    doc_id, chunk_id = self._locate(int(vector_id))
+                    if rerank:
+                        score = self._vectors[doc_id][chunk_id] @ q_vec
+                    hits.append({"doc_id": doc_id, "chunk_id": chunk_id, "score": float(score)})
+                if rerank:
+                    hits = sorted(hits, key=lambda h: h["score"], reverse=True)[:k]
+                results.append(hits)
+            return results
+
+    def _codes(self) -> Optional[faiss.Index]:
+        # Vektör kodlarını tutan iç indeks (IDMap ve HNSW sarmalayıcıları açılır); flat'te yoktur
+        if self.index is None:
+            return None
+        inner = faiss.downcast_index(self.index.index) if isinstance(self.index, faiss.IndexIDMap2) else self.index
+        if isinstance(inner, faiss.IndexHNSW):
+            inner = faiss.downcast_index(inner.storage)
+        return inner
+
+    def _code_type(self) -> Optional[str]:
+        # Faiss indeksinin vektörleri sakladığı biçim (flat'te indeks olmadığı için None)
+        if self.index is None:
+            return None
+        if self.kind == "ivfpq":
+            return "pq"
+        return self.storage if _scalar_quantizer_type(self.storage) is not None else "float32"
+
+    def _code_bytes(self) -> int:
+        # İndeksin vektör kodları için ayırdığı bellek (HNSW graf bağlantıları hariç)
+        inner = self._codes()
+        return 0 if inner is None else int(inner.ntotal * inner.code_size)
+
+    def document_bytes(self, doc_id: str) -> int:
+        """
+        Dokümanın vektörleri için Faiss'in ayrıca tuttuğu kod belleği (flat'te 0).
+        """
+        with self._lock:
+            inner = self._codes()
+            if inner is None or doc_id not in self._ranges:
+                return 0
+            return int(self._ranges[doc_id][1] * inner.code_size)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            vector_bytes = sum(v.nbytes for v in self._vectors.values())
+            code_bytes = self._code_bytes()
+            return {
+                "configured_type": self.index_type,
+                "type": self.kind,
+                "storage": self.storage,
+                "documents": len(self._ranges),
+                "vectors": self._live,
+                # Doküman vektörlerinin boyutu (memory-map edilenler dahil; dokümanların kendi
+                # dizileridir) ve bunun diskten memory-map edilen, worker'lar arasında
+                # page cache'te paylaşılan kısmı
+                "vector_bytes": vector_bytes,
+                "mapped_vector_bytes": sum(v.nbytes for v in self._vectors.values() if isinstance(v, np.memmap)),
+                # hnsw / ivfpq'da Faiss'in vektörlerin yanında ayrıca tuttuğu kodlar ve kod tipi.
+                # flat'te ayrı kod yoktur (0 / None): arama doküman vektörleri üzerinde yapılır,
+                # bu yüzden sq8 flat'te float16 ile aynı belleği kullanır
+                "index_code_bytes": code_bytes,
+                "index_codes": self._code_type(),
+                "total_bytes": vector_bytes + code_bytes,
+                "deleted_pending": self._deleted_count,
+                "hnsw_ef_search": HNSW_EF_SEARCH if self.kind == "hnsw" else None,
+                "ivf_nprobe": IVF_NPROBE if self.kind == "ivfpq" else None,
+                "ivf_nlist": self.index.nlist if self.kind == "ivfpq" else None,
+            }
+
+
+# Model adı -> o modelin vektörlerini tutan global indeks
+_INDEXES: Dict[str, GlobalVectorIndex] = {}
+_LOCK = threading.Lock()
+
+
+def get_vector_index(model_name: str = DEFAULT_EMBEDDING_MODEL) -> GlobalVectorIndex:
+    """
+    Verilen embedding modeline ait, süreç genelinde paylaşılan vektör indeksini döndürür.
+    """
+    with _LOCK:
+        index = _INDEXES.get(model_name)
+        if index is None:
+            index = GlobalVectorIndex()
+            _INDEXES[model_name] = index
+        return index
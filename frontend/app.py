@@ -1,11 +1,14 @@
+import json
 import streamlit as st
 import requests
 import time
+import uuid
 from PIL import Image
 
 # --- CONFIGURATION & CONSTANTS ---
 BASE_URL = "http://localhost:8000"
 ALLOWED_DOC_TYPES = ["pdf", "docx"]
+ALLOWED_ARCHIVE_TYPES = ["zip"]
 ALLOWED_IMAGE_TYPES = ["jpg", "jpeg", "png"]
 
 st.set_page_config(
@@ -116,16 +119,86 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- SESSION STATE MANAGEMENT ---
-if "doc_id" not in st.session_state:
-    st.session_state.doc_id = None
+if "doc_ids" not in st.session_state:
+    st.session_state.doc_ids = []
 if "messages" not in st.session_state:
     st.session_state.messages = [] 
 if "history" not in st.session_state:
     st.session_state.history = []
+# Backend takip sorularında bu konuşmanın KV cache'ini yeniden kullanır
+if "conversation_id" not in st.session_state:
+    st.session_state.conversation_id = str(uuid.uuid4())
 
-def reset_doc_id():
-    st.session_state.doc_id = None
-    st.session_state.messages = [] 
+def reset_doc_ids():
+    st.session_state.doc_ids = []
+    st.session_state.messages = []
+    st.session_state.conversation_id = str(uuid.uuid4())
+
+def wait_for_ingestion(job, poll_interval=0.5):
+    """
+    Backend'deki yükleme işini tamamlanana kadar yoklar ve ilerlemeyi gösterir.
+    """
+    progress_bar = st.progress(0.0, text="⚙️ Queued...")
+    while job["status"] not in ("done", "failed"):
+        time.sleep(poll_interval)
+        response = requests.get(f"{BASE_URL}/documents/jobs/{job['job_id']}")
+        response.raise_for_status()
+        job = response.json()
+
+        p = job["progress"]
+        if job["status"] == "extracting" and p["pages_total"]:
+            # Sayfalar ayıklandıkça parçalanıp embedding'leri çıkarılır
+            value = 0.9 * p["pages_parsed"] / p["pages_total"]
+            label = (
+                f"📄 Parsing pages {p['pages_parsed']}/{p['pages_total']} · "
+                f"🧠 {p['chunks_embedded']}/~{p['chunks_total']} chunks embedded"
+            )
+        else:
+            value = {"indexing": 0.9, "saving": 1.0, "done": 1.0}.get(job["status"], 0.0)
+            label = f"⚙️ {job['status'].capitalize()}..."
+        progress_bar.progress(min(value, 1.0), text=label)
+
+    progress_bar.empty()
+    return job
+
+def wait_for_bulk_ingestion(batch, poll_interval=1.0):
+    """
+    Toplu yükleme tamamlanana kadar yoklar; dosya bazında ilerlemeyi gösterir.
+    """
+    progress_bar = st.progress(0.0, text="⚙️ Queued...")
+    while batch["status"] != "done":
+        time.sleep(poll_interval)
+        response = requests.get(f"{BASE_URL}/documents/batches/{batch['batch_id']}")
+        response.raise_for_status()
+        batch = response.json()
+
+        counts = batch["counts"]
+        finished = counts["files"] - counts["pending"]
+        progress_bar.progress(
+            finished / max(counts["files"], 1),
+            text=f"📚 {finished}/{counts['files']} files processed · ✅ {counts['done']} ready · ❌ {counts['failed']} failed"
+        )
+
+    progress_bar.empty()
+    return batch
+
+def iter_sse(response):
+    """
+    Server-Sent Events akışını (event, data) çiftleri olarak okur.
+    """
+    response.encoding = response.encoding or "utf-8"
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
 
 # --- SIDEBAR (History & Actions) ---
 with st.sidebar:
@@ -163,6 +236,7 @@ with st.sidebar:
     if st.button("🗑️ Clear Conversation", use_container_width=True):
         st.session_state.messages = []
         st.session_state.history = []
+        st.session_state.conversation_id = str(uuid.uuid4())
         st.rerun()
 
 # --- MAIN PAGE ---
@@ -179,39 +253,63 @@ st.info(
 
 # FILE UPLOAD SECTION
 with st.container():
-    uploaded_file = st.file_uploader(
-        "📄 Upload English Document (PDF, DOCX) or Image",
-        type=ALLOWED_DOC_TYPES + ALLOWED_IMAGE_TYPES,
+    uploaded_files = st.file_uploader(
+        "📄 Upload English Documents (PDF, DOCX, ZIP) or Image",
+        type=ALLOWED_DOC_TYPES + ALLOWED_ARCHIVE_TYPES + ALLOWED_IMAGE_TYPES,
         key="file_upload",
-        on_change=reset_doc_id
+        accept_multiple_files=True,
+        on_change=reset_doc_ids
     )
 
     # Process Button
-    if st.button("🚀 Process File", use_container_width=True):
-        if uploaded_file:
-            with st.spinner("⚙️ Analyzing document... Please wait."):
-                try:
-                    uploaded_file.seek(0)
+    if st.button("🚀 Process Files", use_container_width=True):
+        if uploaded_files:
+            try:
+                single = len(uploaded_files) == 1 and not uploaded_files[0].name.lower().endswith(".zip")
+                if single:
+                    uploaded_file = uploaded_files[0]
                     files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
                     response = requests.post(f"{BASE_URL}/documents/upload", files=files)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        st.session_state.doc_id = data["doc_id"]
-                        st.success(f"✅ Document Ready! ID: {data['doc_id']}")
-                        time.sleep(1) 
-                        st.rerun()
+                else:
+                    # Birden fazla dosya / zip tek istekte yüklenir, parçaları birlikte encode edilir
+                    files = [("files", (f.name, f.getvalue(), f.type)) for f in uploaded_files]
+                    response = requests.post(f"{BASE_URL}/documents/upload/bulk", files=files)
+
+                if response.status_code in (200, 202):
+                    if single:
+                        jobs, failures = [wait_for_ingestion(response.json())], []
                     else:
-                        st.error(f"❌ Upload failed: {response.text}")
-                except Exception as e:
-                    st.error(f"❌ Connection error: {e}")
+                        batch = wait_for_bulk_ingestion(response.json())
+                        jobs, failures = batch["documents"], batch["failures"]
+
+                    ready = [job for job in jobs if job["status"] == "done"]
+                    failures = failures + [
+                        {"filename": job["filename"], "error": job.get("error")}
+                        for job in jobs if job["status"] == "failed"
+                    ]
+                    for failure in failures:
+                        st.error(f"❌ {failure['filename']}: {failure['error']}")
+
+                    if ready:
+                        st.session_state.doc_ids = list(dict.fromkeys(job["doc_id"] for job in ready))
+                        st.session_state.conversation_id = str(uuid.uuid4())
+                        st.success(f"✅ {len(st.session_state.doc_ids)} document(s) ready!")
+                        time.sleep(1)
+                        st.rerun()
+                elif response.status_code == 429:
+                    st.warning("⏳ Server is busy processing other documents. Please try again shortly.")
+                else:
+                    st.error(f"❌ Upload failed: {response.text}")
+            except Exception as e:
+                st.error(f"❌ Connection error: {e}")
         else:
-            st.warning("⚠️ Please select a file first.")
+            st.warning("⚠️ Please select at least one file first.")
 
 # Image Preview
-if uploaded_file and uploaded_file.type.startswith("image"):
-    with st.expander("🖼️ View Uploaded Image"):
-        st.image(uploaded_file, use_column_width=True)
+for uploaded_file in uploaded_files or []:
+    if uploaded_file.type and uploaded_file.type.startswith("image"):
+        with st.expander(f"🖼️ View Uploaded Image: {uploaded_file.name}"):
+            st.image(uploaded_file, use_column_width=True)
 
 st.markdown("---")
 
@@ -228,7 +326,7 @@ for message in st.session_state.messages:
 placeholder_text = "Ask your question here (e.g., 'What is the main topic?')..."
 if prompt := st.chat_input(placeholder_text):
     
-    if not st.session_state.doc_id:
+    if not st.session_state.doc_ids:
         st.warning("⚠️ Please upload a document first to start chatting.")
         st.stop()
 
@@ -242,34 +340,58 @@ if prompt := st.chat_input(placeholder_text):
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
         full_response = ""
+        answer_text = ""
         sources = []
-        
-        with st.spinner("Searching knowledge base..."):
-            try:
-                payload = {"doc_ids": [st.session_state.doc_id], "question": prompt}
-                response = requests.post(f"{BASE_URL}/qa/", json=payload)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    answer_text = result.get("answer", "No answer generated.")
-                    sources = result.get("context_chunks", [])
-                else:
-                    answer_text = f"Error: {response.text}"
-            except Exception as e:
-                answer_text = f"Connection error: {e}"
+        stream_error = None
+
+        try:
+            payload = {
+                "doc_ids": st.session_state.doc_ids,
+                "question": prompt,
+                "conversation_id": st.session_state.conversation_id
+            }
+            with st.spinner("Searching knowledge base..."):
+                response = requests.post(f"{BASE_URL}/qa/stream", json=payload, stream=True)
+
+            if response.status_code == 200:
+                # Token'lar backend'de üretildikçe ekrana yazılır
+                for event, data in iter_sse(response):
+                    if event == "context":
+                        sources = data.get("context_chunks", [])
+                    elif event == "token":
+                        answer_text += data["text"]
+                        message_placeholder.markdown(answer_text + "▌")
+                    elif event == "replace":
+                        answer_text = data["text"]
+                        message_placeholder.markdown(answer_text + "▌")
+                    elif event == "done":
+                        answer_text = data.get("answer", answer_text) or "No answer generated."
+                    elif event == "error":
+                        # Üretim yarıda kaldı; kısmi metin cevap olarak gösterilmez
+                        stream_error = data.get("error", "Answer generation failed.")
+                        response.close()
+                        break
+            else:
+                answer_text = f"Error: {response.text}"
+        except Exception as e:
+            answer_text = f"Connection error: {e}"
+
+        if stream_error is not None:
+            # Yarım kalan tur sohbet geçmişine eklenmez
+            message_placeholder.empty()
+            st.error(f"❌ {stream_error}")
+            st.session_state.messages.pop()
+            st.stop()
 
         error_keywords = ["i am sorry", "could not find", "no information found"]
         is_negative_answer = any(keyword in answer_text.lower() for keyword in error_keywords)
 
         if is_negative_answer:
+            message_placeholder.empty()
             st.warning(f"⚠️ {answer_text}")
             full_response = answer_text 
         else:
-            for chunk in answer_text.split(" "): 
-                full_response += chunk + " "
-                time.sleep(0.05)
-                message_placeholder.markdown(full_response + "▌")
-            
+            full_response = answer_text
             message_placeholder.markdown(full_response)
 
             if sources:
@@ -284,4 +406,4 @@ if prompt := st.chat_input(placeholder_text):
             "sources": sources if not is_negative_answer else []
         })
         
-        st.session_state.history.append({"question": prompt, "answer": full_response})
\ No newline at end of file
+        st.session_state.history.append({"question": prompt, "answer": full_response})